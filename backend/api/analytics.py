@@ -0,0 +1,245 @@
+"""Borrowing statistics per user, department or library, aggregated in SQL and cached per month."""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import RowNumber, TruncMonth
+from django.http import JsonResponse
+from django.utils import timezone
+
+from apps.books.models import Book
+from apps.borrowings.models import Borrowing, analytics_bucket, bucket_label
+from apps.changes.models import TableVersion
+from apps.libraries.models import Library
+from apps.users.models import User
+
+# Group column per dimension, and the tables whose writes can move a borrowing to another group
+ANALYTICS_DIMENSIONS = {
+    'users': ('user_id', ()),
+    'departments': ('user__department', (User,)),
+    # Recorded at checkout; loans taken from storage (or whose library was deleted) are grouped under null
+    'libraries': ('library_id', (Library,)),
+}
+
+_SECONDS_PER_DAY = 86400
+
+
+def _utc(moment):
+    """Return moment as an aware datetime; naive values are taken as UTC."""
+    if moment is not None and timezone.is_naive(moment):
+        return timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def _month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _aggregate(group, where, by_month):
+    """Aggregate the borrowings matching `where` per group (and per month).
+
+    Returns {(bucket or None, key): [total, active, returned_seconds, oldest]}
+    where oldest is (borrow_date, borrowing_id, book_id, user_id) of the
+    longest outstanding loan, picked with ROW_NUMBER() over the active rows.
+    """
+    borrowings = Borrowing.objects.filter(where).order_by()
+    columns = {'key': F(group)}
+    if by_month:
+        columns['month'] = TruncMonth('borrow_date', tzinfo=dt_timezone.utc)
+    duration = ExpressionWrapper(F('return_date') - F('borrow_date'), output_field=DurationField())
+    stats = {}
+    for row in borrowings.values(**columns).annotate(
+        total=Count('id'),
+        active=Count('id', filter=Q(return_date__isnull=True)),
+        returned_duration=Sum(duration, filter=Q(return_date__isnull=False)),
+    ):
+        bucket = analytics_bucket(row['month']) if by_month else None
+        seconds = row['returned_duration'].total_seconds() if row['returned_duration'] else 0.0
+        stats[(bucket, row['key'])] = [row['total'], row['active'], seconds, None]
+
+    fields = ('id', 'book_id', 'user_id', 'borrow_date')
+    # Selecting the same column twice breaks the subquery Django wraps window filters in
+    selected = {name: column for name, column in columns.items() if not (name == 'key' and group in fields)}
+    oldest = (
+        borrowings.filter(return_date__isnull=True)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=list(columns.values()),
+            order_by=[F('borrow_date').asc(), F('id').asc()],
+        ))
+        .filter(rank=1)
+        .values(*fields, **selected)
+    )
+    for row in oldest:
+        bucket = analytics_bucket(row['month']) if by_month else None
+        key = row['key'] if 'key' in selected else row[group]
+        stats[(bucket, key)][3] = (row['borrow_date'], row['id'], row['book_id'], row['user_id'])
+    return stats
+
+
+def _month_runs(months):
+    """Yield (start, end) for each run of consecutive months."""
+    run_start = previous = None
+    for month in months:
+        if previous is not None and month != _next_month(previous):
+            yield run_start, _next_month(previous)
+            run_start = None
+        if run_start is None:
+            run_start = month
+        previous = month
+    if run_start is not None:
+        yield run_start, _next_month(previous)
+
+
+def _merge(current, entry):
+    """Add one partial aggregate into a running [total, active, returned_seconds, oldest]."""
+    total, active, seconds, oldest = entry
+    current[0] += total
+    current[1] += active
+    current[2] += seconds
+    if oldest is not None and (current[3] is None or oldest[:2] < current[3][:2]):
+        current[3] = oldest
+
+
+def _split_range(start, end):
+    """Split [start, end) into whole UTC months and the partial edges around them.
+
+    Missing bounds default to the first and last borrow date. Returns
+    (months, edges) or None when there are no borrowings at all.
+    """
+    bounds = Borrowing.objects.order_by().aggregate(first=Min('borrow_date'), last=Max('borrow_date'))
+    if bounds['first'] is None:
+        return None
+    low = start or _month_start(bounds['first'])
+    high = end or _next_month(_month_start(bounds['last']))
+    first_month = _month_start(low)
+    if first_month < low:
+        first_month = _next_month(first_month)
+    end_month = _month_start(high)
+    months = []
+    month = first_month
+    while month < end_month:
+        months.append(month)
+        month = _next_month(month)
+    if not months:
+        return [], [(low, high)] if low < high else []
+    edges = []
+    if low < months[0]:
+        edges.append((low, months[0]))
+    if end_month < high:
+        edges.append((end_month, high))
+    return months, edges
+
+
+def _monthly_stats(group_by, group, depends, months):
+    """Return per-month stats, served from the cache where the month is unchanged."""
+    buckets = [analytics_bucket(month) for month in months]
+    dependency_labels = [model._meta.label_lower for model in depends]
+    stamps = TableVersion.stamps([bucket_label(bucket) for bucket in buckets] + dependency_labels)
+    dependency_version = '.'.join(str(stamps.get(label, (0,))[0]) for label in dependency_labels)
+    keys = {
+        bucket: f"analytics:{group_by}:{bucket}:{stamps.get(bucket_label(bucket), (0,))[0]}:{dependency_version}"
+        for bucket in buckets
+    }
+    cache = caches[settings.RESPONSE_CACHE_ALIAS]
+    cached = cache.get_many(keys.values())
+    monthly = {bucket: cached[key] for bucket, key in keys.items() if key in cached}
+    missing = [month for month, bucket in zip(months, buckets) if bucket not in monthly]
+    if missing:
+        where = Q()
+        for run_start, run_end in _month_runs(missing):
+            where |= Q(borrow_date__gte=run_start, borrow_date__lt=run_end)
+        computed = {analytics_bucket(month): {} for month in missing}
+        for (bucket, key), entry in _aggregate(group, where, by_month=True).items():
+            computed[bucket][key] = entry
+        cache.set_many({keys[bucket]: entry for bucket, entry in computed.items()}, settings.ANALYTICS_CACHE_TIMEOUT)
+        monthly.update(computed)
+    return monthly, len(months) - len(missing)
+
+
+def _names(group_by, keys):
+    if group_by == 'users':
+        return dict(User.objects.filter(id__in=keys).values_list('id', 'full_name'))
+    if group_by == 'libraries':
+        return dict(Library.objects.filter(id__in=keys).values_list('id', 'name'))
+    return {key: key for key in keys}
+
+
+def _summary(entry, now, titles):
+    total, active, seconds, oldest = entry
+    returned = total - active
+    summary = {
+        "total_loans": total,
+        "active_loans": active,
+        "returned_loans": returned,
+        "average_loan_days": round(seconds / returned / _SECONDS_PER_DAY, 2) if returned else None,
+        "longest_outstanding": None,
+    }
+    if oldest is not None:
+        borrow_date, borrowing_id, book_id, user_id = oldest
+        summary["longest_outstanding"] = {
+            "borrowing_id": borrowing_id,
+            "book_id": book_id,
+            "book_title": titles.get(book_id),
+            "user_id": user_id,
+            "borrow_date": borrow_date.isoformat(),
+            "days_outstanding": round((now - borrow_date).total_seconds() / _SECONDS_PER_DAY, 2),
+        }
+    return summary
+
+
+def borrowing_analytics(group_by, start=None, end=None, limit=100):
+    """Active loans, total loans, average loan duration and longest outstanding loan per group.
+
+    Only borrowings with a borrow date in [start, end) are counted. Whole
+    UTC months are aggregated with one GROUP BY and cached under the month's
+    version, which every write to a borrowing of that month bumps, so
+    repeated requests only rescan changed months and the partial months at
+    the edges of the range.
+    """
+    start, end = _utc(start), _utc(end)
+    if start and end and start >= end:
+        return JsonResponse({"error": "start must be before end"}, status=400)
+    group, depends = ANALYTICS_DIMENSIONS[group_by]
+    now = timezone.now()
+    totals = {}
+    cached_months = computed_months = 0
+    split = _split_range(start, end)
+    if split is not None:
+        months, edges = split
+        monthly, cached_months = _monthly_stats(group_by, group, depends, months)
+        computed_months = len(months) - cached_months
+        for entries in monthly.values():
+            for key, entry in entries.items():
+                _merge(totals.setdefault(key, [0, 0, 0.0, None]), entry)
+        if edges:
+            where = Q()
+            for edge_start, edge_end in edges:
+                where |= Q(borrow_date__gte=edge_start, borrow_date__lt=edge_end)
+            for (_, key), entry in _aggregate(group, where, by_month=False).items():
+                _merge(totals.setdefault(key, [0, 0, 0.0, None]), entry)
+
+    overall = [0, 0, 0.0, None]
+    for entry in totals.values():
+        _merge(overall, entry)
+    ranked = sorted(totals.items(), key=lambda item: (-item[1][0], str(item[0])))[:limit]
+    names = _names(group_by, [key for key, _ in ranked if key is not None])
+    book_ids = [entry[3][2] for _, entry in ranked if entry[3]] + ([overall[3][2]] if overall[3] else [])
+    titles = dict(Book.objects.filter(id__in=book_ids).values_list('id', 'title'))
+    return {
+        "group_by": group_by,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "months": {"cached": cached_months, "computed": computed_months},
+        "totals": _summary(overall, now, titles),
+        "groups": len(totals),
+        "results": [
+            {"key": key, "name": names.get(key), **_summary(entry, now, titles)}
+            for key, entry in ranked
+        ],
+    }
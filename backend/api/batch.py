@@ -0,0 +1,104 @@
+"""Run several read requests against the API in one HTTP round trip."""
+import json
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.db import connection, transaction
+from django.http import HttpRequest, JsonResponse, QueryDict
+from django.urls import Resolver404, resolve
+
+from .cache import ResponseCacheMiddleware
+from .conditional import VersionStampMiddleware
+
+MAX_BATCH_REQUESTS = 20
+
+# Headers of the batch request that must not leak into its sub-requests
+_REQUEST_ONLY_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+def _sub_request(request, path, headers):
+    """Build a request for one batch entry, inheriting the batch request's client metadata."""
+    path, _, query = path.partition('?')
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {key: value for key, value in request.META.items() if key not in _REQUEST_ONLY_META}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query)
+    for name, value in headers.items():
+        sub.META['HTTP_' + name.upper().replace('-', '_')] = value
+    sub.GET = QueryDict(query)
+    sub.COOKIES = request.COOKIES
+    return sub
+
+
+def _dispatch(request):
+    """Call the API view for a sub-request the way the URL resolver would."""
+    match = request.resolver_match
+    if iscoroutinefunction(match.func):
+        return async_to_sync(match.func)(request, *match.args, **match.kwargs)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+# Sub-requests skip the middleware stack except for the ETag and response cache layers
+_handle = VersionStampMiddleware(ResponseCacheMiddleware(_dispatch))
+
+
+def _error(status, message):
+    return {"status": status, "body": {"error": message}}
+
+
+def _result(response):
+    # Not closed: close() would fire request_finished and drop the shared connection
+    if response.streaming:
+        return _error(400, "Streaming responses cannot be batched")
+    result = {"status": response.status_code, "body": None}
+    if response.has_header('ETag'):
+        result["etag"] = response['ETag']
+    if response.content:
+        if response.get('Content-Type', '').startswith('application/json'):
+            result["body"] = json.loads(response.content)
+        else:
+            result["body"] = response.content.decode(response.charset)
+    return result
+
+
+def _resolve(request, sub):
+    """Attach the URL match to a sub-request, returning an error result if it cannot be run."""
+    try:
+        sub.resolver_match = resolve(sub.path_info)
+    except Resolver404:
+        return _error(404, f"No endpoint matches {sub.path}")
+    if sub.resolver_match.namespace != request.resolver_match.namespace:
+        return _error(404, f"No endpoint matches {sub.path}")
+    if sub.resolver_match.func == request.resolver_match.func:
+        return _error(400, "Batches cannot be nested")
+    return None
+
+
+def run_batch(request, items):
+    """Run GET sub-requests in order and return their statuses and bodies.
+
+    Each item is {"method", "path", "headers"} with the path as the client
+    would request it (e.g. "/api/books/?ids=1,2"). All sub-requests share
+    one database connection and transaction; on PostgreSQL it is opened
+    REPEATABLE READ so every sub-request reads the same snapshot. Only GET
+    is accepted, so nothing needs to be rolled back when one sub-request fails.
+    """
+    if not items:
+        return JsonResponse({"error": "No requests given"}, status=400)
+    if len(items) > MAX_BATCH_REQUESTS:
+        return JsonResponse({"error": f"At most {MAX_BATCH_REQUESTS} requests per batch"}, status=400)
+    if any(item.method.upper() != 'GET' for item in items):
+        return JsonResponse({"error": "Only GET requests can be batched"}, status=400)
+    subs = [_sub_request(request, item.path, item.headers) for item in items]
+    errors = [_resolve(request, sub) for sub in subs]
+
+    nested = connection.in_atomic_block
+    responses = []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and not nested:
+            # Must be the first statement of the transaction
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        for sub, error in zip(subs, errors):
+            responses.append(error or _result(_handle(sub)))
+    return JsonResponse({"responses": responses})
@@ -0,0 +1,97 @@
+"""Response cache for read endpoints, keyed by table version stamps."""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .metrics import counter_values, observe_cache_lookup
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def no_response_cache(view):
+    """Opt a route out of the response cache (ETags still apply).
+
+    Place it below @conditional_get.
+    """
+    view.no_response_cache = True
+    return view
+
+
+def _cache_key(route, etag):
+    return 'response:%s:%s' % (route, etag.strip('"'))
+
+
+def _lookup_result(request, route, key, entry):
+    observe_cache_lookup(route, entry is not None)
+    if entry is not None:
+        content, content_type = entry
+        return HttpResponse(content, content_type=content_type)
+    request.response_cache_key = key
+    return None
+
+
+def cached_response(request, route, etag):
+    """Return the cached response for this version stamp, or mark the request to be stored.
+
+    The key is the ETag, which covers the path, query string and the version of
+    every owning table. Any save/delete on those models (including cascades)
+    bumps a version, so stale entries are never served and simply expire.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    key = _cache_key(route, etag)
+    return _lookup_result(request, route, key, _cache().get(key))
+
+
+def cache_stats():
+    """Return hit/miss counters by route.
+
+    They are kept in the request metrics (response_cache_lookups_total), so
+    with METRICS_DIR set they cover every worker; otherwise only this one.
+    """
+    routes = {}
+    for (route, result), count in counter_values('response_cache_lookups_total').items():
+        routes.setdefault(route, {'hits': 0, 'misses': 0})['hits' if result == 'hit' else 'misses'] = int(count)
+    return {
+        "backend": settings.CACHES[settings.RESPONSE_CACHE_ALIAS]['BACKEND'],
+        "all_workers": bool(settings.METRICS_DIR),
+        "routes": dict(sorted(routes.items())),
+    }
+
+
+def _cacheable(request, response):
+    key = getattr(request, 'response_cache_key', None)
+    if key and response.status_code == 200 and not response.streaming:
+        return key, (response.content, response['Content-Type'])
+    return None, None
+
+
+class ResponseCacheMiddleware:
+    """Store successful responses of requests marked by cached_response."""
+    
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        key, entry = _cacheable(request, response)
+        if key:
+            _cache().set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        key, entry = _cacheable(request, response)
+        if key:
+            await _cache().aset(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
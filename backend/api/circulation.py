@@ -0,0 +1,306 @@
+"""Bulk borrow and return of books for checkout desks."""
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from apps.books.models import Book, BookStatusCounter, apply_book_count_deltas, book_count_deltas, counted_shelf
+from apps.borrowings.models import Borrowing, analytics_bucket, bucket_label
+from apps.changes.models import emit_events, mark_changed, mark_labels_changed
+
+# Upper bound on books handled by one bulk request
+MAX_BULK_BOOKS = 200
+
+# Conditional UPDATE attempts on one book before giving up because it keeps moving
+MAX_FLIP_ATTEMPTS = 5
+
+
+def _aware(moment):
+    """Return moment as an aware datetime (naive values are taken as UTC), defaulting to now."""
+    if moment is None:
+        return timezone.now()
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+def _unique(ids):
+    return list(dict.fromkeys(ids))
+
+
+def _lock_books(book_ids):
+    """Lock the requested books and return {id: state} for outcome checks and counters.
+
+    shelf_id and library_id are where the book is counted, which for a book
+    on loan is the shelf it was checked out from.
+    """
+    rows = (
+        Book.objects.select_for_update(of=('self',))
+        .filter(id__in=book_ids)
+        .order_by('id')
+        .values_list('id', 'status', counted_shelf(), counted_shelf('__bookshelf__library_id'), 'borrowed_by_user_id')
+    )
+    return {
+        book_id: {'status': status, 'shelf_id': shelf_id, 'library_id': library_id, 'borrowed_by_user_id': borrowed_by}
+        for book_id, status, shelf_id, library_id, borrowed_by in rows
+    }
+
+
+def _counter_deltas(books, new_status):
+    """Status counter deltas; books being lent stay counted in their library."""
+    deltas = {}
+    for book in books:
+        lent_from = book['library_id'] if new_status == 'borrowed' else None
+        for scope in {None, book['library_id']}:
+            deltas[(scope, book['status'])] = deltas.get((scope, book['status']), 0) - 1
+        for scope in {None, lent_from}:
+            deltas[(scope, new_status)] = deltas.get((scope, new_status), 0) + 1
+    return deltas
+
+
+def _shelf_deltas(books, new_status):
+    """Book count deltas for books leaving their shelves; books being lent stay counted on theirs."""
+    deltas = {}
+    for book in books:
+        lent_from = book['shelf_id'] if new_status == 'borrowed' else None
+        for key, delta in book_count_deltas((book['status'], book['shelf_id']), (new_status, lent_from)).items():
+            deltas[key] = deltas.get(key, 0) + delta
+    return deltas
+
+
+def bulk_borrow(user, book_ids, borrow_time=None, notes=''):
+    """Borrow several books for one user in one transaction.
+
+    Eligible books are flipped with a single conditional UPDATE and their
+    Borrowing rows inserted with bulk_create. Returns per-book outcomes.
+    """
+    book_ids = _unique(book_ids)
+    borrow_date = _aware(borrow_time)
+    outcomes = {}
+    with transaction.atomic():
+        books = _lock_books(book_ids)
+        eligible = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                outcomes[book_id] = {"book_id": book_id, "ok": False, "error": "not found"}
+            elif book['borrowed_by_user_id'] is not None:
+                outcomes[book_id] = {"book_id": book_id, "ok": False, "error": "already borrowed"}
+            else:
+                eligible.append(book_id)
+        if eligible:
+            Book.objects.filter(id__in=eligible, borrowed_by_user__isnull=True).update(
+                status='borrowed',
+                borrowed_by_user=user,
+                borrow_date=borrow_date,
+                borrowed_from_shelf=counted_shelf(),
+                shelf=None,
+                updated_at=timezone.now(),
+            )
+            borrowings = Borrowing.objects.bulk_create([
+                Borrowing(
+                    book_id=book_id, user=user, library_id=books[book_id]['library_id'],
+                    borrow_date=borrow_date, notes=notes,
+                )
+                for book_id in eligible
+            ])
+            moved = [books[book_id] for book_id in eligible]
+            BookStatusCounter.apply_deltas(_counter_deltas(moved, 'borrowed'))
+            apply_book_count_deltas(_shelf_deltas(moved, 'borrowed'))
+            mark_changed(Book, Borrowing)
+            mark_labels_changed(bucket_label(analytics_bucket(borrow_date)))
+            emit_events(Book, 'updated', eligible, 'borrowed')
+            emit_events(Borrowing, 'created', [borrowing.id for borrowing in borrowings], 'active')
+            for borrowing in borrowings:
+                outcomes[borrowing.book_id] = {
+                    "book_id": borrowing.book_id, "ok": True, "borrowing_id": borrowing.id,
+                }
+    return {
+        "user_id": user.id,
+        "user_name": user.full_name,
+        "borrow_date": borrow_date.isoformat(),
+        "borrowed": len(eligible),
+        "failed": len(book_ids) - len(eligible),
+        "results": [outcomes[book_id] for book_id in book_ids],
+    }
+
+
+def bulk_return(book_ids, return_date=None, return_notes='', user_id=None):
+    """Return several borrowed books to storage in one transaction.
+
+    Books are flipped with a single conditional UPDATE and their active
+    Borrowing rows closed with another. When user_id is given, only books
+    borrowed by that user are returned. Returns per-book outcomes.
+    """
+    book_ids = _unique(book_ids)
+    return_date = _aware(return_date)
+    outcomes = {}
+    with transaction.atomic():
+        books = _lock_books(book_ids)
+        eligible = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                outcomes[book_id] = {"book_id": book_id, "ok": False, "error": "not found"}
+            elif book['status'] != 'borrowed':
+                outcomes[book_id] = {"book_id": book_id, "ok": False, "error": "not borrowed"}
+            elif user_id is not None and book['borrowed_by_user_id'] != user_id:
+                outcomes[book_id] = {"book_id": book_id, "ok": False, "error": "borrowed by another user"}
+            else:
+                eligible.append(book_id)
+        if eligible:
+            now = timezone.now()
+            active, buckets = {}, set()
+            for book_id, borrowing_id, borrow_date in (
+                Borrowing.objects.filter(book_id__in=eligible, return_date__isnull=True)
+                .values_list('book_id', 'id', 'borrow_date')
+            ):
+                active[book_id] = borrowing_id
+                buckets.add(bucket_label(analytics_bucket(borrow_date)))
+            Borrowing.objects.filter(id__in=active.values()).update(
+                return_date=return_date,
+                return_notes=return_notes,
+                updated_at=now,
+            )
+            # Keep borrow_date for borrowing history, as return_book_simple does
+            Book.objects.filter(id__in=eligible, status='borrowed').update(
+                status='storage',
+                shelf=None,
+                borrowed_from_shelf=None,
+                borrowed_by_user=None,
+                updated_at=now,
+            )
+            moved = [books[book_id] for book_id in eligible]
+            BookStatusCounter.apply_deltas(_counter_deltas(moved, 'storage'))
+            apply_book_count_deltas(_shelf_deltas(moved, 'storage'))
+            mark_changed(Book, Borrowing)
+            mark_labels_changed(*buckets)
+            emit_events(Book, 'updated', eligible, 'storage')
+            emit_events(Borrowing, 'updated', list(active.values()), 'returned')
+            for book_id in eligible:
+                outcomes[book_id] = {"book_id": book_id, "ok": True, "borrowing_id": active.get(book_id)}
+    return {
+        "return_date": return_date.isoformat(),
+        "returned": len(eligible),
+        "failed": len(book_ids) - len(eligible),
+        "results": [outcomes[book_id] for book_id in book_ids],
+    }
+
+
+def _flip_book(book_id, refuse, **values):
+    """Update one book with a conditional UPDATE instead of a row lock held across reads.
+
+    The book is read without locking; refuse(state) returns an error message
+    when the change is not allowed. The UPDATE repeats the read status, shelf
+    and borrower in its WHERE clause, so of two concurrent requests only one
+    matches, and the state it replaced gives exact counter deltas. If the
+    book moved in between, it is read again. A book taken off its shelf
+    with status 'borrowed' records that shelf as borrowed_from_shelf and
+    stays counted on it. Returns (old_state, error).
+    """
+    for _ in range(MAX_FLIP_ATTEMPTS):
+        state = Book.objects.filter(id=book_id).values(
+            'status', 'shelf_id', 'borrowed_from_shelf_id', 'borrowed_by_user_id', 'borrowed_by_user__full_name',
+            library_id=counted_shelf('__bookshelf__library_id'),
+        ).first()
+        if state is None:
+            return None, JsonResponse({"error": "Book not found"}, status=404)
+        error = refuse(state)
+        if error:
+            return state, JsonResponse({"error": error}, status=400)
+        counted = state['shelf_id'] if state['shelf_id'] is not None else state['borrowed_from_shelf_id']
+        lent_from = counted if values['status'] == 'borrowed' and values['shelf_id'] is None else None
+        flipped = Book.objects.filter(
+            id=book_id,
+            status=state['status'],
+            shelf_id=state['shelf_id'],
+            borrowed_from_shelf_id=state['borrowed_from_shelf_id'],
+            borrowed_by_user_id=state['borrowed_by_user_id'],
+        ).update(updated_at=timezone.now(), borrowed_from_shelf_id=lent_from, **values)
+        if flipped:
+            old_state, new_state = (state['status'], counted), (values['status'], values['shelf_id'] or lent_from)
+            BookStatusCounter.record_change(old_state, new_state)
+            apply_book_count_deltas(book_count_deltas(old_state, new_state))
+            mark_changed(Book)
+            emit_events(Book, 'updated', [book_id], values['status'])
+            return state, None
+    return None, JsonResponse({"error": "Book is being changed by another request, try again"}, status=409)
+
+
+def _refuse_borrowed(state):
+    if state['borrowed_by_user_id'] is not None:
+        return f"Book is already borrowed by {state['borrowed_by_user__full_name']}"
+    return None
+
+
+def _refuse_move(state):
+    if state['borrowed_by_user_id'] is not None:
+        return "Cannot move borrowed book. Please return it first."
+    return None
+
+
+def _refuse_not_borrowed(state):
+    if state['status'] != 'borrowed':
+        return "Book is not borrowed"
+    return None
+
+
+def move_book_to(book_id, shelf_id):
+    """Move a book that is not on loan to a shelf, or to storage when shelf_id is None."""
+    with transaction.atomic():
+        _, error = _flip_book(
+            book_id, _refuse_move,
+            status='library' if shelf_id else 'storage', shelf_id=shelf_id,
+        )
+    return error
+
+
+def checkout_book(book_id, user, borrow_time=None, notes=''):
+    """Borrow one book for a user; safe against concurrent checkouts of the same copy.
+
+    Returns (borrowing, error_response).
+    """
+    borrow_date = _aware(borrow_time)
+    with transaction.atomic():
+        state, error = _flip_book(
+            book_id, _refuse_borrowed,
+            status='borrowed', shelf_id=None, borrowed_by_user_id=user.id, borrow_date=borrow_date,
+        )
+        if error:
+            return None, error
+        try:
+            with transaction.atomic():
+                borrowing = Borrowing.objects.create(
+                    book_id=book_id, user=user, library_id=state['library_id'],
+                    borrow_date=borrow_date, notes=notes,
+                )
+        except IntegrityError:
+            # A stale open borrowing survived a manual edit; undo the flip above
+            transaction.set_rollback(True)
+            return None, JsonResponse({"error": "Book already has an active borrowing"}, status=409)
+    return borrowing, None
+
+
+def checkin_book(book_id, return_date=None, return_notes='', borrowing_id=None):
+    """Return one borrowed book to storage and close its open borrowing.
+
+    With borrowing_id, that borrowing must be the book's open one. The book
+    is flipped before the borrowing is touched, so concurrent returns of the
+    same loan cannot both succeed. Returns (borrowing or None, error_response).
+    """
+    return_date = _aware(return_date)
+    with transaction.atomic():
+        _, error = _flip_book(
+            book_id, _refuse_not_borrowed,
+            status='storage', shelf_id=None, borrowed_by_user_id=None,
+        )
+        if error:
+            return None, error
+        borrowing = Borrowing.objects.filter(book_id=book_id, return_date__isnull=True).first()
+        if borrowing_id is not None and (borrowing is None or borrowing.id != borrowing_id):
+            transaction.set_rollback(True)
+            return None, JsonResponse({"error": "Borrowing is already returned"}, status=400)
+        if borrowing is not None:
+            borrowing.return_date = return_date
+            borrowing.return_notes = return_notes
+            borrowing.save(update_fields=['return_date', 'return_notes', 'updated_at'])
+    return borrowing, None
@@ -0,0 +1,146 @@
+"""Server-Sent Events feed of committed book, borrowing and shelf changes."""
+import asyncio
+import json
+
+from django.http import StreamingHttpResponse
+
+from apps.changes.models import ChangeEvent
+
+# Seconds between polls of the change event table while clients are connected
+POLL_INTERVAL = 0.5
+# Seconds of silence before a heartbeat comment is sent
+HEARTBEAT_INTERVAL = 15
+# Events buffered per client before it is told to resync
+CLIENT_QUEUE_SIZE = 100
+# Events read per poll
+POLL_BATCH_SIZE = 500
+# Reconnect delay advertised to EventSource clients
+RECONNECT_DELAY_MS = 2000
+
+
+class _Overflow:
+    """Put on a client queue that overflowed; the stream then asks the client to reload."""
+    
+    def __init__(self, event_id):
+        self.id = event_id
+
+
+class EventBroker:
+    """Fan out new change events to connected clients of this worker.
+
+    One poll loop per process reads the events table and copies each event
+    into every subscriber's bounded queue, so the database cost does not
+    grow with the number of open dashboards. A client that falls
+    CLIENT_QUEUE_SIZE events behind is dropped with a reset instead of
+    buffering without bound.
+    """
+    
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        self.task = None
+    
+    async def subscribe(self):
+        """Return (queue, start): the client's queue receives every event after id start."""
+        if self.last_id is None:
+            latest = await ChangeEvent.objects.order_by('-id').values_list('id', flat=True).afirst()
+            if self.last_id is None:
+                self.last_id = latest or 0
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._poll())
+        return queue, self.last_id
+    
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+    
+    async def _poll(self):
+        while self.subscribers:
+            events = [
+                event async for event in ChangeEvent.objects.filter(id__gt=self.last_id)[:POLL_BATCH_SIZE]
+            ]
+            for event in events:
+                for queue in list(self.subscribers):
+                    self._offer(queue, event)
+            # Ids follow commit order (see ChangeEvent), so no event below last_id can still appear
+            if events:
+                self.last_id = events[-1].id
+            if len(events) < POLL_BATCH_SIZE:
+                await asyncio.sleep(POLL_INTERVAL)
+        # Idle workers resync from the table on the next subscription
+        self.last_id = None
+    
+    def _offer(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.unsubscribe(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_Overflow(event.id))
+
+
+broker = EventBroker()
+
+
+def _format(event):
+    return f"id: {event.id}\nevent: change\ndata: {json.dumps(event.as_dict())}\n\n"
+
+
+def _reset(last_id):
+    return f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+
+
+async def _backlog(last_event_id):
+    """Return the retained events after last_event_id, or None if some were already pruned.
+    
+    Complete because event ids are committed in order (see ChangeEvent).
+    """
+    oldest = await ChangeEvent.objects.order_by('id').values_list('id', flat=True).afirst()
+    if oldest is not None and oldest > last_event_id + 1:
+        return None
+    return [event async for event in ChangeEvent.objects.filter(id__gt=last_event_id)]
+
+
+async def event_stream(last_event_id=None):
+    """Yield SSE frames: the backlog after last_event_id, then live events and heartbeats.
+
+    A `reset` event tells the client to re-fetch its lists, either because
+    the events it missed are no longer retained or because it fell behind.
+    """
+    queue, start = await broker.subscribe()
+    sent = start
+    try:
+        yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+        if last_event_id is not None:
+            backlog = await _backlog(last_event_id)
+            if backlog is None:
+                yield _reset(start)
+                backlog = []
+            for event in backlog:
+                yield _format(event)
+                sent = max(sent, event.id)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if isinstance(event, _Overflow):
+                yield _reset(event.id)
+                return
+            if event.id > sent:
+                yield _format(event)
+                sent = event.id
+    finally:
+        broker.unsubscribe(queue)
+
+
+def event_stream_response(last_event_id=None):
+    """Return a streaming text/event-stream response; needs an ASGI server."""
+    response = StreamingHttpResponse(event_stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,92 @@
+"""Sparse fieldsets: ?fields= narrows both the selected columns and the serialized rows."""
+from django.db.models import F
+from django.http import Http404, JsonResponse
+
+from apps.libraries.models import BOOK_COUNT_FIELDS
+
+from .pagination import ordering_keys, paginated_response
+from .schemas import BookSchema, BookshelfSchema, LibrarySchema, ShelfSchema, UserSchema
+
+# Schema fields read through a join rather than from the model's own table
+COMPUTED_FIELDS = {
+    BookSchema: {'borrowed_by_user_name': F('borrowed_by_user__full_name')},
+}
+
+# Named presets per schema; `card` is what the card and list views render,
+# leaving out the long text columns that are only shown in detail views
+FIELD_PRESETS = {
+    LibrarySchema: {
+        'card': ('id', 'name', 'short_description', 'address', 'order', *BOOK_COUNT_FIELDS),
+    },
+    BookshelfSchema: {
+        'card': ('id', 'library_id', 'name', 'short_description', 'location', 'order', *BOOK_COUNT_FIELDS),
+    },
+    ShelfSchema: {
+        'card': ('id', 'bookshelf_id', 'name', 'short_description', 'order', *BOOK_COUNT_FIELDS),
+    },
+    BookSchema: {
+        'card': ('id', 'shelf_id', 'title', 'author', 'year', 'date_format', 'short_description',
+                 'status', 'borrowed_by_user_id', 'borrowed_by_user_name', 'borrow_date'),
+    },
+    UserSchema: {
+        'card': ('id', 'full_name', 'dob', 'phone', 'gender', 'department', 'short_description'),
+    },
+}
+
+
+def select_fields(schema, fields):
+    """Resolve a ?fields= value to schema field names, returning (names, error_response).
+
+    The value is a comma-separated mix of field names and preset names
+    (`card`, or `full` for every field). id is always included and names
+    come back in schema order. Returns (None, None) when fields is not given.
+    """
+    if not fields:
+        return None, None
+    available = list(schema.model_fields)
+    presets = {**FIELD_PRESETS.get(schema, {}), 'full': available}
+    selected = {'id'}
+    unknown = []
+    for name in filter(None, (part.strip() for part in fields.split(','))):
+        if name in presets:
+            selected.update(presets[name])
+        elif name in available:
+            selected.add(name)
+        else:
+            unknown.append(name)
+    if unknown:
+        return None, JsonResponse({"error": f"Unknown fields: {', '.join(unknown)}"}, status=400)
+    return tuple(name for name in available if name in selected), None
+
+
+def sparse_values(queryset, schema, names, *extra_fields):
+    """Return a values() queryset selecting only the named schema fields (plus extra_fields)."""
+    computed = COMPUTED_FIELDS.get(schema, {})
+    columns = dict.fromkeys(name for name in (*names, *extra_fields) if name not in computed)
+    return queryset.values(*columns, **{name: computed[name] for name in names if name in computed})
+
+
+def trim_row(row, names):
+    """Drop the columns that were only selected for ordering or grouping."""
+    return {name: row[name] for name in names}
+
+
+def sparse_list_response(queryset, schema, names, limit=None, cursor=None):
+    """Render the named fields of every row, or one page of rows when limit is given."""
+    if limit is None:
+        return JsonResponse(list(sparse_values(queryset, schema, names)), safe=False)
+    # The cursor is read from the ordering columns, so select them even if not requested
+    keys = [key.lstrip('-') for key in ordering_keys(queryset)]
+    return paginated_response(
+        queryset, limit, cursor,
+        serialize=lambda page: list(sparse_values(page, schema, names, *keys)),
+        to_json=lambda row: trim_row(row, names),
+    )
+
+
+def sparse_object_response(queryset, schema, names, **lookup):
+    """Render the named fields of a single object, raising Http404 if it does not exist."""
+    row = sparse_values(queryset.filter(**lookup), schema, names).first()
+    if row is None:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    return JsonResponse(row)
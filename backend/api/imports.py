@@ -0,0 +1,183 @@
+"""Bulk book import from CSV or NDJSON streams."""
+import codecs
+import csv
+import io
+import json
+
+from django.db import transaction
+from pydantic import ValidationError
+
+from apps.books.models import Book, BookStatusCounter, apply_book_count_deltas
+from apps.changes.models import emit_events, mark_changed
+from apps.shelves.models import Shelf
+from .schemas import BookCreateSchema
+
+# Rows validated and inserted per transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Row errors kept in the report; later failures are only counted
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+DATE_FORMATS = {value for value, _ in Book.DATE_FORMAT_CHOICES}
+
+# Bytes read at a time when checking the encoding of an upload
+DECODE_BLOCK_SIZE = 64 * 1024
+
+
+class InvalidImportFile(ValueError):
+    """Raised when an uploaded file cannot be read at all, as opposed to a bad row."""
+
+
+def import_format(fmt, filename=''):
+    """Resolve the import format from an explicit value or the file extension."""
+    if fmt:
+        return fmt if fmt in IMPORT_FORMATS else None
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def _check_encoding(stream):
+    """Raise InvalidImportFile unless the whole seekable stream decodes as UTF-8.
+
+    Checked before any chunk is imported, so a bad byte late in the file does
+    not leave the rows before it committed.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    offset = 0
+    try:
+        for block in iter(lambda: stream.read(DECODE_BLOCK_SIZE), b''):
+            decoder.decode(block)
+            offset += len(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise InvalidImportFile(f"File is not valid UTF-8 (byte {offset + e.start})")
+    stream.seek(0)
+
+
+def _parse(stream, fmt):
+    """Yield (row_number, data, error) for each record of a binary stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            # Empty cells fall back to schema defaults
+            yield number, {key: value for key, value in row.items() if key and value != ''}, None
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(data, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, data, None
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ImportReport:
+    """Running totals and per-row errors for one import."""
+
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _import_chunk(chunk, report):
+    """Validate one chunk, resolve its shelves in one query and insert it in one transaction."""
+    valid = []
+    for number, data, error in chunk:
+        if error:
+            report.fail(number, [error])
+            continue
+        try:
+            payload = BookCreateSchema.model_validate(data)
+        except ValidationError as e:
+            report.fail(number, [
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            ])
+            continue
+        if payload.date_format not in DATE_FORMATS:
+            report.fail(number, [f"date_format: must be one of {sorted(DATE_FORMATS)}"])
+            continue
+        if payload.status == 'borrowed' and not payload.shelf_id:
+            # Imports carry no borrower, so a loan needs the shelf it was lent from
+            report.fail(number, ["status: a borrowed book needs the shelf_id it was lent from"])
+            continue
+        valid.append((number, payload))
+    
+    shelf_ids = {payload.shelf_id for _, payload in valid if payload.shelf_id}
+    libraries = dict(
+        Shelf.objects.filter(id__in=shelf_ids).values_list('id', 'bookshelf__library_id')
+    ) if shelf_ids else {}
+    
+    books = []
+    deltas, shelf_deltas = {}, {}
+    for number, payload in valid:
+        if payload.shelf_id and payload.shelf_id not in libraries:
+            report.fail(number, [f"shelf_id: shelf {payload.shelf_id} does not exist"])
+            continue
+        data = payload.dict(exclude_none=True)
+        data['status'] = Book.derive_status(data.get('status'), payload.shelf_id)
+        if data['status'] == 'borrowed':
+            # Stored like a checkout: off the shelf, still counted on it
+            data['borrowed_from_shelf_id'] = data.pop('shelf_id')
+        books.append(Book(**data))
+        for scope in {None, libraries.get(payload.shelf_id)}:
+            deltas[(scope, data['status'])] = deltas.get((scope, data['status']), 0) + 1
+        if payload.shelf_id:
+            key = (payload.shelf_id, data['status'])
+            shelf_deltas[key] = shelf_deltas.get(key, 0) + 1
+    
+    if books:
+        with transaction.atomic():
+            Book.objects.bulk_create(books, batch_size=IMPORT_CHUNK_SIZE)
+            BookStatusCounter.apply_deltas(deltas)
+            apply_book_count_deltas(shelf_deltas)
+            mark_changed(Book)
+            for status in {book.status for book in books}:
+                emit_events(Book, 'created', [book.id for book in books if book.status == status and book.id], status)
+        report.created += len(books)
+
+
+def import_books(stream, fmt, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import books from a seekable binary CSV/NDJSON stream, one transaction per chunk.
+
+    Raises InvalidImportFile if the file is not UTF-8.
+    """
+    _check_encoding(stream)
+    report = ImportReport()
+    for chunk in _chunks(_parse(stream, fmt), chunk_size):
+        _import_chunk(chunk, report)
+    return report
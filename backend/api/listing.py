@@ -0,0 +1,89 @@
+"""Shared listing helpers for book endpoints."""
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse
+
+from apps.books.models import Book
+from .fields import sparse_values, trim_row
+from .pagination import decode_cursor, ordering_keys, seek_filter, split_page
+from .schemas import BookSchema
+
+BOOK_STATUSES = [status for status, _ in Book.STATUS_CHOICES]
+
+# Columns returned for every listed book, in BookSchema order
+BOOK_LIST_FIELDS = (
+    'id',
+    'shelf_id',
+    'title',
+    'author',
+    'year',
+    'date_format',
+    'short_description',
+    'long_description',
+    'status',
+    'borrowed_by_user_id',
+    'borrow_date',
+    'created_at',
+    'updated_at',
+)
+
+
+def book_rows(books, *extra_fields, fields=None):
+    """Return books as plain dicts with the borrower name joined in the same query.
+
+    `fields` narrows the selected columns to those BookSchema fields (plus extra_fields).
+    """
+    if fields is not None:
+        return list(sparse_values(books, BookSchema, fields, *extra_fields))
+    return list(
+        books.values(*BOOK_LIST_FIELDS, *extra_fields, borrowed_by_user_name=F('borrowed_by_user__full_name'))
+    )
+
+
+def book_list_response(books):
+    """Serialize a book queryset in bulk, bypassing per-row schema validation."""
+    return JsonResponse(book_rows(books), safe=False)
+
+
+def books_by_status(books, statuses=BOOK_STATUSES, limit=None, cursors=None, fields=None):
+    """Group books into status buckets from a single scan ordered by status.
+
+    Without a limit every bucket holds a plain list of rows. With a limit each
+    bucket is {"items": [...], "next_cursor": ...}; rows are ranked per status
+    with ROW_NUMBER() so the per-bucket limits and cursors still take one query.
+    `fields` narrows the rows to those BookSchema fields.
+    Raises InvalidCursor for a cursor that does not decode.
+    """
+    keys = ordering_keys(books)
+    # A sparse row still needs the status to bucket on and the ordering columns for cursors
+    extra_fields = ('status', *(key.lstrip('-') for key in keys)) if fields is not None else ()
+    books = books.filter(status__in=statuses)
+    if limit is None:
+        buckets = {status: [] for status in statuses}
+        for row in book_rows(books.order_by('status', *keys), *extra_fields, fields=fields):
+            buckets[row['status']].append(trim_row(row, fields) if fields is not None else row)
+        return buckets
+    
+    cursors = cursors or {}
+    predicate = Q()
+    for status in statuses:
+        bucket = Q(status=status)
+        if cursors.get(status):
+            bucket &= seek_filter(keys, decode_cursor(cursors[status], Book, keys))
+        predicate |= bucket
+    ranked = (
+        books.filter(predicate)
+        .annotate(bucket_rank=Window(RowNumber(), partition_by=F('status'), order_by=keys))
+        .filter(bucket_rank__lte=limit + 1)
+        .order_by('status', *keys)
+    )
+    rows = {status: [] for status in statuses}
+    for row in book_rows(ranked, *extra_fields, fields=fields):
+        rows[row['status']].append(row)
+    buckets = {}
+    for status, bucket_rows in rows.items():
+        items, next_cursor = split_page(bucket_rows, keys, limit)
+        if fields is not None:
+            items = [trim_row(row, fields) for row in items]
+        buckets[status] = {"items": items, "next_cursor": next_cursor}
+    return buckets
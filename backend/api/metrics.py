@@ -0,0 +1,356 @@
+"""Per-operation request metrics, aggregated per process and exported in Prometheus text format."""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+METRIC_HELP = {
+    'http_request_duration_seconds': ('histogram', "Time from request to response, per operation."),
+    'http_requests_total': ('counter', "Requests served, per operation, method and status code."),
+    'http_response_size_bytes_total': ('counter', "Response body bytes sent (streamed bodies excluded)."),
+    'db_queries_total': ('counter', "Database queries run while serving the operation."),
+    'db_query_duration_seconds_total': ('counter', "Time spent in database queries while serving the operation."),
+    'response_cache_lookups_total': ('counter', "Response cache lookups, per route and result (hit or miss)."),
+}
+
+# [query count, query seconds] of the request being served in this context
+_request_queries = ContextVar('request_queries', default=None)
+
+_INITIAL_FILE_SIZE = 1 << 20
+_HEADER = struct.Struct('i4x')
+_KEY_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+
+class _MmapValues:
+    """Append-only key -> float64 store in a memory-mapped file, written by one process.
+
+    An entry is its key length, the UTF-8 key padded to 8 bytes and the value.
+    Updates are read-modify-writes of the value in place, so they hold the
+    process's lock; each process has its own file, so no lock is shared
+    between workers. Other processes read the file to aggregate.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.offsets = {}
+        with open(path, 'a+b') as f:
+            if os.fstat(f.fileno()).st_size < _INITIAL_FILE_SIZE:
+                f.truncate(_INITIAL_FILE_SIZE)
+            self.capacity = os.fstat(f.fileno()).st_size
+            self.mm = mmap.mmap(f.fileno(), self.capacity)
+        self.used = _HEADER.unpack_from(self.mm, 0)[0] or _HEADER.size
+        for key, value, offset in _read_entries(self.mm, self.used):
+            self.offsets[key] = offset
+
+    def add(self, key, amount):
+        with self.lock:
+            offset = self.offsets.get(key)
+            if offset is None:
+                offset = self._insert(key)
+            _VALUE.pack_into(self.mm, offset, _VALUE.unpack_from(self.mm, offset)[0] + amount)
+
+    def _insert(self, key):
+        """Append a zero entry for key; called with the lock held."""
+        encoded = key.encode()
+        padded = len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        size = _KEY_LENGTH.size + padded + _VALUE.size
+        if self.used + size > self.capacity:
+            self._grow(self.used + size)
+        _KEY_LENGTH.pack_into(self.mm, self.used, len(encoded))
+        self.mm[self.used + _KEY_LENGTH.size:self.used + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self.used + _KEY_LENGTH.size + padded
+        _VALUE.pack_into(self.mm, offset, 0.0)
+        self.used += size
+        # Publish the entry only once it is complete
+        _HEADER.pack_into(self.mm, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        # The old mapping is left for the GC: readers may still hold it, and it
+        # maps the same shared file pages
+        with open(self.path, 'r+b') as f:
+            f.truncate(capacity)
+            self.mm = mmap.mmap(f.fileno(), capacity)
+        self.capacity = capacity
+
+    def items(self):
+        with self.lock:
+            return [(key, value) for key, value, _ in _read_entries(self.mm, self.used)]
+
+
+def _read_entries(buffer, used):
+    """Yield (key, value, value_offset) for each complete entry."""
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length]).decode()
+        offset = position + _KEY_LENGTH.size + length + (-(_KEY_LENGTH.size + length) % 8)
+        yield key, _VALUE.unpack_from(buffer, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return []
+    used = _HEADER.unpack_from(data, 0)[0]
+    return [(key, value) for key, value, _ in _read_entries(data, min(used, len(data)))]
+
+
+class _MemoryValues:
+    """Fallback store for a single process when METRICS_DIR is not set."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def add(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def _values():
+    """Return this process's store, opening a new file after a fork."""
+    global _store, _store_pid
+    if _store_pid != os.getpid():
+        with _store_lock:
+            if _store_pid != os.getpid():
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                    _store = _MmapValues(os.path.join(settings.METRICS_DIR, f'metrics_{os.getpid()}.db'))
+                else:
+                    _store = _MemoryValues()
+                _store_pid = os.getpid()
+    return _store
+
+
+# Cache of (name, labels) -> encoded key so the hot path skips json.dumps
+_keys = {}
+
+
+def _key(name, labels):
+    cache_key = (name, labels)
+    key = _keys.get(cache_key)
+    if key is None:
+        key = _keys[cache_key] = json.dumps([name, list(labels)])
+    return key
+
+
+def observe_request(operation, method, status, duration, size, queries, query_seconds):
+    """Record one served request."""
+    values = _values()
+    bucket = next(i for i, bound in enumerate(DURATION_BUCKETS) if duration <= bound)
+    values.add(_key('http_request_duration_seconds_bucket', (operation, method, bucket)), 1)
+    values.add(_key('http_request_duration_seconds_sum', (operation, method)), duration)
+    values.add(_key('http_requests_total', (operation, method, status)), 1)
+    if size is not None:
+        values.add(_key('http_response_size_bytes_total', (operation,)), size)
+    if queries:
+        values.add(_key('db_queries_total', (operation,)), queries)
+        values.add(_key('db_query_duration_seconds_total', (operation,)), query_seconds)
+
+
+def observe_cache_lookup(route, hit):
+    """Record one response cache lookup."""
+    _values().add(_key('response_cache_lookups_total', (route, 'hit' if hit else 'miss')), 1)
+
+
+def _collect():
+    """Sum the values of every worker process (or of this process without METRICS_DIR)."""
+    if not settings.METRICS_DIR:
+        return dict(_values().items())
+    _values()
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics_*.db')):
+        for key, value in _read_file(path):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def counter_values(name):
+    """Return {labels tuple: value} of one counter, summed like render_metrics()."""
+    values = {}
+    for key, value in _collect().items():
+        key_name, labels = json.loads(key)
+        if key_name == name:
+            values[tuple(labels)] = value
+    return values
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format."""
+    samples = {name: [] for name in METRIC_HELP}
+    histograms = {}
+    for key, value in _collect().items():
+        name, labels = json.loads(key)
+        if name == 'http_request_duration_seconds_bucket':
+            operation, method, bucket = labels
+            series = histograms.setdefault((operation, method), {'buckets': [0.0] * len(DURATION_BUCKETS), 'sum': 0.0})
+            series['buckets'][bucket] += value
+        elif name == 'http_request_duration_seconds_sum':
+            histograms.setdefault(tuple(labels), {'buckets': [0.0] * len(DURATION_BUCKETS), 'sum': 0.0})['sum'] += value
+        elif name == 'http_requests_total':
+            operation, method, status = labels
+            samples[name].append(f'{name}{_labels(operation=operation, method=method, status=status)} {_number(value)}')
+        elif name == 'response_cache_lookups_total':
+            route, result = labels
+            samples[name].append(f'{name}{_labels(route=route, result=result)} {_number(value)}')
+        else:
+            samples[name].append(f'{name}{_labels(operation=labels[0])} {_number(value)}')
+
+    histogram = 'http_request_duration_seconds'
+    for (operation, method), series in sorted(histograms.items()):
+        cumulative = 0.0
+        for bound, count in zip(DURATION_BUCKETS, series['buckets']):
+            cumulative += count
+            labels = _labels(operation=operation, method=method, le=_number(bound))
+            samples[histogram].append(f'{histogram}_bucket{labels} {_number(cumulative)}')
+        labels = _labels(operation=operation, method=method)
+        samples[histogram].append(f'{histogram}_sum{labels} {_number(series["sum"])}')
+        samples[histogram].append(f'{histogram}_count{labels} {_number(cumulative)}')
+
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(sorted(samples[name]) if kind == 'counter' else samples[name])
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_response():
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _record_query(execute, sql, params, many, context):
+    """execute_wrapper adding the query to the current request's totals."""
+    counters = _request_queries.get()
+    if counters is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counters[0] += 1
+        counters[1] += time.perf_counter() - started
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_wrapper, dispatch_uid='api_metrics_query_wrapper')
+
+# (PathView, method) -> operation id
+_operation_ids = {}
+
+
+def _operation_id(request):
+    """Return the ninja operation id serving the request, or a placeholder for other routes."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    path_view = getattr(match.func, '__self__', None)
+    operations = getattr(path_view, 'operations', None)
+    if operations is None:
+        return match.url_name or match.route
+    cache_key = (id(path_view), request.method)
+    operation_id = _operation_ids.get(cache_key)
+    if operation_id is None:
+        operation = next((op for op in operations if request.method in op.methods), None)
+        if operation is None:
+            operation_id = 'method_not_allowed'
+        else:
+            operation_id = operation.operation_id or operation.api.get_openapi_operation_id(operation)
+        _operation_ids[cache_key] = operation_id
+    return operation_id
+
+
+class MetricsMiddleware:
+    """Record latency, status, response size and DB queries for every request.
+
+    Put it first in MIDDLEWARE so the latency covers the other middleware too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Covers connections opened before this module was imported
+        _install_query_wrapper(None, connection)
+        counters = [0, 0.0]
+        token = _request_queries.set(counters)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._observe(request, response, time.perf_counter() - started, counters)
+        return response
+
+    async def __acall__(self, request):
+        counters = [0, 0.0]
+        token = _request_queries.set(counters)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._observe(request, response, time.perf_counter() - started, counters)
+        return response
+
+    def _observe(self, request, response, duration, counters):
+        size = None if response.streaming else len(response.content)
+        observe_request(
+            _operation_id(request), request.method, response.status_code,
+            duration, size, counters[0], counters[1],
+        )
@@ -0,0 +1,160 @@
+"""Keyset (cursor) pagination for list endpoints."""
+import base64
+import json
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the queryset it is applied to."""
+
+
+def _field(opts, name):
+    """Resolve an ordering name ('pk', field name or attname) to its concrete field."""
+    if name == 'pk':
+        return opts.pk
+    for field in opts.concrete_fields:
+        if name in (field.name, field.attname):
+            return field
+    raise ValueError(f"Cannot paginate on '{name}'")
+
+
+def ordering_keys(queryset):
+    """Return the ordering of a queryset as column names, ending with an id tiebreak.
+
+    Uses the explicit order_by() if set, otherwise the model's Meta.ordering.
+    Foreign keys are ordered by their id column. Ordering columns are expected
+    to be non-nullable.
+    """
+    opts = queryset.model._meta
+    keys = []
+    for key in (queryset.query.order_by or opts.ordering):
+        name = _field(opts, key.lstrip('-')).attname
+        keys.append(('-' if key.startswith('-') else '') + name)
+    if not any(key.lstrip('-') == opts.pk.attname for key in keys):
+        keys.append(opts.pk.attname)
+    return keys
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """Encode the ordering values of the last row of a page as an opaque cursor."""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor_values(cursor, count):
+    """Decode a cursor into its raw JSON values, checking there are `count` of them."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def decode_cursor(cursor, model, keys):
+    """Decode a cursor into typed ordering values for the given keys."""
+    values = decode_cursor_values(cursor, len(keys))
+    opts = model._meta
+    try:
+        return [_field(opts, key.lstrip('-')).to_python(value) for key, value in zip(keys, values)]
+    except (ValidationError, TypeError):
+        raise InvalidCursor("Cursor does not match this listing")
+
+
+def seek_filter(keys, values):
+    """Build the predicate selecting rows strictly after the given ordering values.
+
+    For keys (a, b, c) this is a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+    with the comparison flipped for descending keys, so the database can seek
+    on an index instead of skipping rows with OFFSET.
+    """
+    clauses = []
+    for i, key in enumerate(keys):
+        name = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        clause = {keys[j].lstrip('-'): values[j] for j in range(i)}
+        clause[f'{name}__{lookup}'] = values[i]
+        clauses.append(Q(**clause))
+    return reduce(or_, clauses)
+
+
+def paginate(queryset, limit, cursor=None, serialize=list):
+    """Return one page of a queryset and the cursor for the next page.
+
+    `serialize` turns the sliced queryset into a list of rows (model instances
+    or dicts); the next cursor is read from the ordering columns of the last row.
+    """
+    keys = ordering_keys(queryset)
+    queryset = queryset.order_by(*keys)
+    if cursor:
+        queryset = queryset.filter(seek_filter(keys, decode_cursor(cursor, queryset.model, keys)))
+    return split_page(serialize(queryset[:limit + 1]), keys, limit)
+
+
+def split_page(rows, keys, limit):
+    """Trim rows fetched with limit + 1 to one page and build the next cursor, if any."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    names = [key.lstrip('-') for key in keys]
+    if isinstance(last, dict):
+        return rows, encode_cursor([last[name] for name in names])
+    return rows, encode_cursor([getattr(last, name) for name in names])
+
+
+def check_limit(limit):
+    """Return an error response if limit is out of range, else None."""
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return JsonResponse({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, status=400)
+    return None
+
+
+def parse_ids(ids):
+    """Parse an ?ids=1,2,3 value, returning (ids, error_response).
+
+    Returns (None, None) when ids is not given. At most MAX_PAGE_SIZE ids are accepted.
+    """
+    if ids is None:
+        return None, None
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(',') if part.strip()))
+    except ValueError:
+        return None, JsonResponse({"error": "ids must be a comma-separated list of integers"}, status=400)
+    if len(parsed) > MAX_PAGE_SIZE:
+        return None, JsonResponse({"error": f"At most {MAX_PAGE_SIZE} ids per request"}, status=400)
+    return parsed, None
+
+
+def paginated_response(queryset, limit, cursor=None, serialize=list, to_json=None):
+    """Render one page as {"items": [...], "next_cursor": ...}."""
+    error = check_limit(limit)
+    if error:
+        return error
+    try:
+        rows, next_cursor = paginate(queryset, limit, cursor, serialize)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    items = [to_json(row) for row in rows] if to_json else rows
+    return JsonResponse({"items": items, "next_cursor": next_cursor})
+
+
+def schema_serializer(schema):
+    """Return a to_json callable rendering model instances through a ninja schema."""
+    return lambda obj: schema.from_orm(obj).dict()
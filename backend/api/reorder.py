@@ -0,0 +1,205 @@
+"""Gapped ordering and set-based reordering for libraries, bookshelves and shelves."""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from apps.changes.models import emit_events, mark_changed
+from apps.shelves.models import Shelf
+
+# Rows per UPDATE ... CASE statement issued by bulk_update
+REORDER_BATCH_SIZE = 500
+
+# Distance between the order keys of neighbouring siblings. A moved row takes a key
+# between its new neighbours, so about log2(ORDER_GAP) moves into the same spot fit
+# before the list has to be re-spaced.
+ORDER_GAP = 1024
+
+# order columns are PositiveIntegerField, a 32-bit integer on Postgres
+MAX_ORDER = 2 ** 31 - 1
+
+
+def _siblings(model, parent_field, parent_id):
+    rows = model.objects.all()
+    if parent_field:
+        rows = rows.filter(**{parent_field: parent_id})
+    return rows
+
+
+def _last_order(model, parent_field, parent_id):
+    return (
+        _siblings(model, parent_field, parent_id)
+        .order_by('-order').values_list('order', flat=True).first()
+    )
+
+
+def next_order(model, parent_field=None, parent_id=None):
+    """Return the order key for a row appended after its siblings.
+
+    The last key is read through the (parent, order) index rather than with
+    an aggregate. Two concurrent appends may get the same key; listings break
+    the tie by id and the next reorder of the list separates them.
+    """
+    last = _last_order(model, parent_field, parent_id)
+    if last is None:
+        return ORDER_GAP
+    if last + ORDER_GAP > MAX_ORDER:
+        rebalance_order(model, parent_field, parent_id)
+        last = _last_order(model, parent_field, parent_id)
+    return last + ORDER_GAP
+
+
+def _respace(model, rows, now):
+    """Set the keys of rows, in list order, ORDER_GAP apart; return the rows that changed."""
+    changed = []
+    for position, row in enumerate(rows, 1):
+        if row.order != position * ORDER_GAP:
+            row.order = position * ORDER_GAP
+            row.updated_at = now
+            changed.append(row)
+    model.objects.bulk_update(changed, ['order', 'updated_at'], batch_size=REORDER_BATCH_SIZE)
+    return changed
+
+
+def rebalance_order(model, parent_field=None, parent_id=None):
+    """Re-space one sibling list ORDER_GAP apart, keeping its current order.
+
+    Returns the number of rows rewritten.
+    """
+    with transaction.atomic():
+        rows = list(
+            _siblings(model, parent_field, parent_id)
+            .select_for_update().only('id', 'order').order_by('order', 'id')
+        )
+        changed = _respace(model, rows, timezone.now())
+        if changed:
+            mark_changed(model)
+            if model is Shelf:
+                emit_events(model, 'updated', [row.id for row in changed])
+    return len(changed)
+
+
+def _increasing_positions(keys):
+    """Return the positions of a longest strictly increasing run of keys (not necessarily adjacent)."""
+    tails, tail_positions, previous = [], [], [None] * len(keys)
+    for position, key in enumerate(keys):
+        length = bisect_left(tails, key)
+        if length == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[length] = key
+            tail_positions[length] = position
+        previous[position] = tail_positions[length - 1] if length else None
+    kept = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        kept.add(position)
+        position = previous[position]
+    return kept
+
+
+def _fill_keys(keys, kept):
+    """Give every position outside kept a key between its neighbours' keys.
+
+    Returns the new key list, or None when some run of moved rows does not
+    fit between its neighbours.
+    """
+    placed = list(keys)
+    position = 0
+    while position < len(keys):
+        if position in kept:
+            position += 1
+            continue
+        end = position
+        while end < len(keys) and end not in kept:
+            end += 1
+        lower = placed[position - 1] if position else 0
+        count = end - position
+        if end < len(keys):
+            step = (keys[end] - lower) // (count + 1)
+            if step < 1:
+                return None
+        else:
+            step = ORDER_GAP
+            if lower + step * count > MAX_ORDER:
+                return None
+        for offset in range(count):
+            placed[position + offset] = lower + step * (offset + 1)
+        position = end
+    return placed
+
+
+def _parent_error(parent_field):
+    return JsonResponse(
+        {"error": f"All ids must belong to the same {parent_field.removesuffix('_id')}"},
+        status=400
+    )
+
+
+def apply_reorder(model, items, parent_field=None):
+    """Apply a whole reorder payload in one transaction.
+
+    The payload's order values only rank the listed rows. Payloads naming
+    only some siblings reorder those rows among the positions they already
+    hold, leaving the other siblings in place. Keys are then assigned over the
+    whole sibling list: rows whose keys already follow the new order (a
+    longest increasing subsequence) keep them, and each other row gets a key
+    between its new neighbours, so dragging one item rewrites one row. Only
+    when a gap is exhausted is the whole list re-spaced. All ids must exist
+    and, when parent_field is given, share the same parent.
+    Returns (rows_changed, error_response).
+    """
+    new_order = {item.id: item.order for item in items}
+    if len(new_order) != len(items):
+        return 0, JsonResponse({"error": "Duplicate ids in reorder payload"}, status=400)
+    if not new_order:
+        return 0, None
+    
+    fields = ['id', 'order'] + ([parent_field] if parent_field else [])
+    with transaction.atomic():
+        rows = list(model.objects.filter(id__in=new_order).only(*fields).order_by())
+        missing = set(new_order) - {row.id for row in rows}
+        if missing:
+            return 0, JsonResponse(
+                {"error": f"Unknown {model._meta.model_name} ids: {sorted(missing)}"},
+                status=404
+            )
+        if parent_field and len({getattr(row, parent_field) for row in rows}) > 1:
+            return 0, _parent_error(parent_field)
+        parent_id = getattr(rows[0], parent_field) if parent_field else None
+        siblings = list(
+            _siblings(model, parent_field, parent_id)
+            .select_for_update().only('id', 'order').order_by('order', 'id')
+        )
+        slots = [position for position, row in enumerate(siblings) if row.id in new_order]
+        if len(slots) != len(new_order):
+            # A listed row was moved to another parent meanwhile
+            return 0, _parent_error(parent_field)
+        payload_position = {item.id: position for position, item in enumerate(items)}
+        ranked = sorted(
+            (siblings[slot] for slot in slots),
+            key=lambda row: (new_order[row.id], payload_position[row.id]),
+        )
+        sequence = list(siblings)
+        for slot, row in zip(slots, ranked):
+            sequence[slot] = row
+        keys = [row.order for row in sequence]
+        placed = _fill_keys(keys, _increasing_positions(keys))
+        now = timezone.now()
+        if placed is None:
+            changed = _respace(model, sequence, now)
+        else:
+            changed = []
+            for row, key in zip(sequence, placed):
+                if row.order != key:
+                    row.order = key
+                    row.updated_at = now
+                    changed.append(row)
+            model.objects.bulk_update(changed, ['order', 'updated_at'], batch_size=REORDER_BATCH_SIZE)
+        if changed:
+            mark_changed(model)
+            if model is Shelf:
+                emit_events(model, 'updated', [row.id for row in changed])
+    return len(changed), None
@@ -1,13 +1,20 @@
 """API router for all endpoints."""
-from ninja import Router, Query
+import logging
+
+from ninja import Router, Query, File
+from ninja.files import UploadedFile
+from datetime import datetime
 from typing import List
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 
 from apps.libraries.models import Library
 from apps.bookshelves.models import Bookshelf
 from apps.shelves.models import Shelf
-from apps.books.models import Book
+from apps.books.models import Book, BookStatusCounter
 from apps.borrowings.models import Borrowing
 from apps.users.models import User, Department
 
@@ -17,39 +24,77 @@ from .schemas import (
     ShelfSchema, ShelfCreateSchema,
     BookSchema, BookCreateSchema, BookMoveSchema,
     BorrowingSchema, BorrowingCreateSchema, BorrowBookSchema,
+    BulkBorrowSchema, BulkReturnSchema,
     UserSchema, UserCreateSchema,
     DepartmentSchema, DepartmentCreateSchema,
-    ReorderSchema,
+    ReorderSchema, TreeLibrarySchema, BatchSchema,
 )
+from .fields import select_fields, sparse_list_response, sparse_object_response
+from .listing import BOOK_STATUSES, book_list_response, book_rows, books_by_status
+from .pagination import InvalidCursor, check_limit, paginated_response, parse_ids, schema_serializer
+from .export import export_books, export_borrowings
+from .search import search_books
+from .reorder import apply_reorder, next_order
+from .imports import IMPORT_FORMATS, InvalidImportFile, import_books, import_format
+from .circulation import MAX_BULK_BOOKS, bulk_borrow, bulk_return, checkin_book, checkout_book, move_book_to
+from .tree import MAX_TREE_DEPTH, library_tree
+from .conditional import conditional_get
+from .cache import cache_stats, no_response_cache
+from .events import event_stream_response
+from .batch import run_batch
+from .analytics import ANALYTICS_DIMENSIONS, borrowing_analytics
+from .metrics import metrics_response
+from library_monitor.db_pool import database_stats
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
 # ============= LIBRARY ENDPOINTS =============
 
 @router.get("/libraries/", response=List[LibrarySchema])
-def list_libraries(request):
+@conditional_get(Library)
+def list_libraries(request, limit: int = Query(None), cursor: str = Query(None), fields: str = Query(None)):
     """List all libraries ordered by order field."""
-    return Library.objects.all()
+    selected, error = select_fields(LibrarySchema, fields)
+    if error:
+        return error
+    libraries = Library.objects.all()
+    if selected:
+        return sparse_list_response(libraries, LibrarySchema, selected, limit, cursor)
+    if limit is not None:
+        return paginated_response(libraries, limit, cursor, to_json=schema_serializer(LibrarySchema))
+    return list(libraries)
 
 
 @router.post("/libraries/", response=LibrarySchema)
 def create_library(request, payload: LibraryCreateSchema):
     """Create a new library."""
-    library = Library.objects.create(**payload.dict())
+    data = payload.dict()
+    if data['order'] is None:
+        data['order'] = next_order(Library)
+    library = Library.objects.create(**data)
     return library
 
 
 @router.post("/libraries/reorder/")
 def reorder_libraries(request, payload: List[ReorderSchema]):
     """Reorder libraries."""
-    for item in payload:
-        Library.objects.filter(id=item.id).update(order=item.order)
-    return {"message": "Libraries reordered successfully"}
+    updated, error = apply_reorder(Library, payload)
+    if error:
+        return error
+    return {"message": "Libraries reordered successfully", "updated": updated}
 
 
 @router.get("/libraries/{library_id}/", response=LibrarySchema)
-def get_library(request, library_id: int):
+@conditional_get(Library)
+def get_library(request, library_id: int, fields: str = Query(None)):
     """Get a specific library."""
+    selected, error = select_fields(LibrarySchema, fields)
+    if error:
+        return error
+    if selected:
+        return sparse_object_response(Library.objects.all(), LibrarySchema, selected, id=library_id)
     return get_object_or_404(Library, id=library_id)
 
 
@@ -58,6 +103,8 @@ def update_library(request, library_id: int, payload: LibraryCreateSchema):
     """Update a library."""
     library = get_object_or_404(Library, id=library_id)
     for attr, value in payload.dict().items():
+        if attr == 'order' and value is None:
+            continue
         setattr(library, attr, value)
     library.save()
     return library
@@ -83,10 +130,17 @@ def delete_library(request, library_id: int):
 
 
 @router.get("/libraries/{library_id}/bookshelves/", response=List[BookshelfSchema])
-def list_library_bookshelves(request, library_id: int):
+@conditional_get(Library, Bookshelf)
+def list_library_bookshelves(request, library_id: int, fields: str = Query(None)):
     """List all bookshelves for a specific library."""
+    selected, error = select_fields(BookshelfSchema, fields)
+    if error:
+        return error
     library = get_object_or_404(Library, id=library_id)
-    return Bookshelf.objects.filter(library=library).order_by('order')
+    bookshelves = Bookshelf.objects.filter(library=library).order_by('order')
+    if selected:
+        return sparse_list_response(bookshelves, BookshelfSchema, selected)
+    return list(bookshelves)
 
 
 @router.post("/libraries/{library_id}/bookshelves/", response=BookshelfSchema)
@@ -100,6 +154,8 @@ def create_library_bookshelf(request, library_id: int, payload: BookshelfCreateS
     data = {k: v for k, v in data.items() if v is not None and v != ''}
     # Remove library_id if it exists and create with library instead
     data.pop('library_id', None)
+    if 'order' not in data:
+        data['order'] = next_order(Bookshelf, 'library_id', library_id)
     bookshelf = Bookshelf.objects.create(library=library, **data)
     return bookshelf
 
@@ -107,32 +163,51 @@ def create_library_bookshelf(request, library_id: int, payload: BookshelfCreateS
 # ============= BOOKSHELF ENDPOINTS =============
 
 @router.get("/bookshelves/", response=List[BookshelfSchema])
-def list_bookshelves(request, library_id: int = Query(None)):
+@conditional_get(Bookshelf)
+def list_bookshelves(request, library_id: int = Query(None), limit: int = Query(None), cursor: str = Query(None),
+                           fields: str = Query(None)):
     """List all bookshelves, optionally filtered by library."""
+    selected, error = select_fields(BookshelfSchema, fields)
+    if error:
+        return error
     bookshelves = Bookshelf.objects.all().order_by('library_id', 'order')
     if library_id:
         bookshelves = bookshelves.filter(library_id=library_id)
-    return bookshelves
+    if selected:
+        return sparse_list_response(bookshelves, BookshelfSchema, selected, limit, cursor)
+    if limit is not None:
+        return paginated_response(bookshelves, limit, cursor, to_json=schema_serializer(BookshelfSchema))
+    return list(bookshelves)
 
 
 @router.post("/bookshelves/", response=BookshelfSchema)
 def create_bookshelf(request, payload: BookshelfCreateSchema):
     """Create a new bookshelf."""
-    bookshelf = Bookshelf.objects.create(**payload.dict())
+    data = payload.dict()
+    if data['order'] is None:
+        data['order'] = next_order(Bookshelf, 'library_id', data['library_id'])
+    bookshelf = Bookshelf.objects.create(**data)
     return bookshelf
 
 
 @router.post("/bookshelves/reorder/")
 def reorder_bookshelves(request, payload: List[ReorderSchema]):
     """Reorder bookshelves."""
-    for item in payload:
-        Bookshelf.objects.filter(id=item.id).update(order=item.order)
-    return {"message": "Bookshelves reordered successfully"}
+    updated, error = apply_reorder(Bookshelf, payload, parent_field='library_id')
+    if error:
+        return error
+    return {"message": "Bookshelves reordered successfully", "updated": updated}
 
 
 @router.get("/bookshelves/{bookshelf_id}/", response=BookshelfSchema)
-def get_bookshelf(request, bookshelf_id: int):
+@conditional_get(Bookshelf)
+def get_bookshelf(request, bookshelf_id: int, fields: str = Query(None)):
     """Get a specific bookshelf."""
+    selected, error = select_fields(BookshelfSchema, fields)
+    if error:
+        return error
+    if selected:
+        return sparse_object_response(Bookshelf.objects.all(), BookshelfSchema, selected, id=bookshelf_id)
     return get_object_or_404(Bookshelf, id=bookshelf_id)
 
 
@@ -141,6 +216,8 @@ def update_bookshelf(request, bookshelf_id: int, payload: BookshelfUpdateSchema)
     """Update a bookshelf."""
     bookshelf = get_object_or_404(Bookshelf, id=bookshelf_id)
     for attr, value in payload.dict().items():
+        if attr == 'order' and value is None:
+            continue
         setattr(bookshelf, attr, value)
     bookshelf.save()
     return bookshelf
@@ -168,10 +245,17 @@ def delete_bookshelf(request, bookshelf_id: int):
 # ============= NESTED SHELF ENDPOINTS =============
 
 @router.get("/bookshelves/{bookshelf_id}/shelves/", response=List[ShelfSchema])
-def list_bookshelf_shelves(request, bookshelf_id: int):
+@conditional_get(Bookshelf, Shelf)
+def list_bookshelf_shelves(request, bookshelf_id: int, fields: str = Query(None)):
     """List all shelves for a specific bookshelf."""
+    selected, error = select_fields(ShelfSchema, fields)
+    if error:
+        return error
     bookshelf = get_object_or_404(Bookshelf, id=bookshelf_id)
-    return Shelf.objects.filter(bookshelf=bookshelf).order_by('order')
+    shelves = Shelf.objects.filter(bookshelf=bookshelf).order_by('order')
+    if selected:
+        return sparse_list_response(shelves, ShelfSchema, selected)
+    return list(shelves)
 
 
 @router.post("/bookshelves/{bookshelf_id}/shelves/", response=ShelfSchema)
@@ -180,9 +264,8 @@ def create_bookshelf_shelf(request, bookshelf_id: int, payload: ShelfCreateSchem
     bookshelf = get_object_or_404(Bookshelf, id=bookshelf_id)
     data = payload.dict()
     data['bookshelf_id'] = bookshelf_id
-    # Auto-assign order as the next number in sequence
-    max_order = Shelf.objects.filter(bookshelf_id=bookshelf_id).aggregate(models.Max('order'))['order__max']
-    data['order'] = (max_order if max_order is not None else -1) + 1
+    # Append after the current last shelf
+    data['order'] = next_order(Shelf, 'bookshelf_id', bookshelf_id)
     shelf = Shelf.objects.create(**data)
     return shelf
 
@@ -190,21 +273,34 @@ def create_bookshelf_shelf(request, bookshelf_id: int, payload: ShelfCreateSchem
 # ============= SHELF ENDPOINTS =============
 
 @router.get("/shelves/", response=List[ShelfSchema])
-def list_shelves(request, bookshelf_id: int = Query(None)):
-    """List all shelves, optionally filtered by bookshelf."""
+@conditional_get(Shelf)
+def list_shelves(request, bookshelf_id: int = Query(None), ids: str = Query(None), limit: int = Query(None),
+                       cursor: str = Query(None), fields: str = Query(None)):
+    """List all shelves, optionally filtered by bookshelf or by ids."""
+    selected, error = select_fields(ShelfSchema, fields)
+    if error:
+        return error
+    shelf_ids, error = parse_ids(ids)
+    if error:
+        return error
     shelves = Shelf.objects.all().order_by('bookshelf_id', 'order')
     if bookshelf_id:
         shelves = shelves.filter(bookshelf_id=bookshelf_id)
-    return shelves
+    if shelf_ids is not None:
+        shelves = shelves.filter(id__in=shelf_ids)
+    if selected:
+        return sparse_list_response(shelves, ShelfSchema, selected, limit, cursor)
+    if limit is not None:
+        return paginated_response(shelves, limit, cursor, to_json=schema_serializer(ShelfSchema))
+    return list(shelves)
 
 
 @router.post("/shelves/", response=ShelfSchema)
 def create_shelf(request, payload: ShelfCreateSchema):
     """Create a new shelf."""
     data = payload.dict()
-    # Auto-assign order as the next number in sequence for the bookshelf
-    max_order = Shelf.objects.filter(bookshelf_id=data['bookshelf_id']).aggregate(models.Max('order'))['order__max']
-    data['order'] = (max_order if max_order is not None else -1) + 1
+    # Append after the current last shelf of the bookshelf
+    data['order'] = next_order(Shelf, 'bookshelf_id', data['bookshelf_id'])
     shelf = Shelf.objects.create(**data)
     return shelf
 
@@ -212,14 +308,21 @@ def create_shelf(request, payload: ShelfCreateSchema):
 @router.post("/shelves/reorder/")
 def reorder_shelves(request, payload: List[ReorderSchema]):
     """Reorder shelves."""
-    for item in payload:
-        Shelf.objects.filter(id=item.id).update(order=item.order)
-    return {"message": "Shelves reordered successfully"}
+    updated, error = apply_reorder(Shelf, payload, parent_field='bookshelf_id')
+    if error:
+        return error
+    return {"message": "Shelves reordered successfully", "updated": updated}
 
 
 @router.get("/shelves/{shelf_id}/", response=ShelfSchema)
-def get_shelf(request, shelf_id: int):
+@conditional_get(Shelf)
+def get_shelf(request, shelf_id: int, fields: str = Query(None)):
     """Get a specific shelf."""
+    selected, error = select_fields(ShelfSchema, fields)
+    if error:
+        return error
+    if selected:
+        return sparse_object_response(Shelf.objects.all(), ShelfSchema, selected, id=shelf_id)
     return get_object_or_404(Shelf, id=shelf_id)
 
 
@@ -227,7 +330,13 @@ def get_shelf(request, shelf_id: int):
 def update_shelf(request, shelf_id: int, payload: ShelfCreateSchema):
     """Update a shelf."""
     shelf = get_object_or_404(Shelf, id=shelf_id)
-    for attr, value in payload.dict().items():
+    data = payload.dict()
+    if data['order'] is None:
+        # Keep the position, or append when moving to another bookshelf
+        data.pop('order')
+        if data['bookshelf_id'] != shelf.bookshelf_id:
+            data['order'] = next_order(Shelf, 'bookshelf_id', data['bookshelf_id'])
+    for attr, value in data.items():
         setattr(shelf, attr, value)
     shelf.save()
     return shelf
@@ -243,103 +352,102 @@ def delete_shelf(request, shelf_id: int):
 # ============= BOOK ENDPOINTS =============
 
 @router.get("/books/", response=List[BookSchema])
-def list_books(request, shelf_id: int = Query(None), status: str = Query(None)):
-    """List all books, optionally filtered by shelf or status."""
+@conditional_get(Book, User)
+@no_response_cache
+def list_books(request, shelf_id: int = Query(None), status: str = Query(None), ids: str = Query(None),
+                     limit: int = Query(None), cursor: str = Query(None), fields: str = Query(None)):
+    """List all books, optionally filtered by shelf, status or ids."""
+    selected, error = select_fields(BookSchema, fields)
+    if error:
+        return error
+    book_ids, error = parse_ids(ids)
+    if error:
+        return error
     books = Book.objects.all()
     if shelf_id:
         books = books.filter(shelf_id=shelf_id)
     if status:
         books = books.filter(status=status)
-    
-    # Convert to schema and add computed fields
-    result = []
-    for book in books:
-        # Create a dictionary from the model with all fields
-        book_data = {
-            'id': book.id,
-            'shelf_id': book.shelf_id,
-            'title': book.title,
-            'author': book.author,
-            'year': book.year,
-            'date_format': book.date_format,
-            'short_description': book.short_description,
-            'long_description': book.long_description,
-            'status': book.status,
-            'borrow_date': book.borrow_date,
-            'borrowed_by_user_id': book.borrowed_by_user_id,
-            'borrowed_by_user_name': book.borrowed_by_user_name,
-        }
-        schema = BookSchema.model_validate(book_data)
-        result.append(schema)
-    return result
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+    if selected:
+        return sparse_list_response(books, BookSchema, selected, limit, cursor)
+    if limit is not None:
+        return paginated_response(books, limit, cursor, serialize=book_rows)
+    return book_list_response(books)
 
 
 @router.get("/books/stats/")
-def get_book_stats(request):
-    """Get statistics about books by status."""
-    return {
-        "storage": Book.objects.filter(status='storage').count(),
-        "library": Book.objects.filter(status='library').count(),
-        "borrowed": Book.objects.filter(status='borrowed').count(),
-        "total": Book.objects.count(),
-    }
+@conditional_get(Book, BookStatusCounter)
+def get_book_stats(request, library_id: int = Query(None)):
+    """Get statistics about books by status, globally or for one library."""
+    counter = BookStatusCounter.for_scope(library_id) or BookStatusCounter(library_id=library_id)
+    return counter.as_stats()
 
 
 @router.get("/books/by-status/", response=dict)
-def get_books_by_status(request):
-    """Get books grouped by status."""
-    def convert_books(books):
-        result = []
-        for book in books:
-            book_data = {
-                'id': book.id,
-                'shelf_id': book.shelf_id,
-                'title': book.title,
-                'author': book.author,
-                'year': book.year,
-                'date_format': book.date_format,
-                'short_description': book.short_description,
-                'long_description': book.long_description,
-                'status': book.status,
-                'borrow_date': book.borrow_date,
-                'borrowed_by_user_id': book.borrowed_by_user_id,
-                'borrowed_by_user_name': book.borrowed_by_user_name,
-            }
-            schema = BookSchema.model_validate(book_data)
-            result.append(schema)
-        return result
-    
-    return {
-        "storage": convert_books(Book.objects.filter(status='storage')),
-        "library": convert_books(Book.objects.filter(status='library')),
-        "borrowed": convert_books(Book.objects.filter(status='borrowed')),
+@conditional_get(Book, User)
+@no_response_cache
+def get_books_by_status(request, statuses: str = Query(None), limit: int = Query(None),
+                              storage_cursor: str = Query(None), library_cursor: str = Query(None),
+                              borrowed_cursor: str = Query(None), fields: str = Query(None)):
+    """Get books grouped by status, optionally paginated per bucket."""
+    selected_fields, error = select_fields(BookSchema, fields)
+    if error:
+        return error
+    selected = statuses.split(',') if statuses else BOOK_STATUSES
+    unknown = [status for status in selected if status not in BOOK_STATUSES]
+    if unknown:
+        return JsonResponse({"error": f"Unknown status: {', '.join(unknown)}"}, status=400)
+    if limit is not None:
+        error = check_limit(limit)
+        if error:
+            return error
+    cursors = {
+        'storage': storage_cursor,
+        'library': library_cursor,
+        'borrowed': borrowed_cursor,
     }
+    try:
+        buckets = books_by_status(Book.objects.all(), selected, limit, cursors, selected_fields)
+        return JsonResponse(buckets)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+@router.get("/books/search/")
+@conditional_get(Book, User)
+@no_response_cache
+def search_books_endpoint(request, q: str, limit: int = Query(20), cursor: str = Query(None),
+                                fields: str = Query(None)):
+    """Full-text search over title, author and descriptions, ranked by relevance."""
+    if not q.strip():
+        return JsonResponse({"error": "Query must not be empty"}, status=400)
+    selected, error = select_fields(BookSchema, fields)
+    if error:
+        return error
+    error = check_limit(limit)
+    if error:
+        return error
+    try:
+        items, next_cursor = search_books(q, limit, cursor, selected)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"items": items, "next_cursor": next_cursor})
+
 
 @router.get("/books/storage/", response=List[BookSchema])
-def list_storage_books(request):
+@conditional_get(Book, User)
+@no_response_cache
+def list_storage_books(request, fields: str = Query(None)):
     """List all books in storage (not on any shelf)."""
+    selected, error = select_fields(BookSchema, fields)
+    if error:
+        return error
     books = Book.objects.filter(shelf_id__isnull=True)
-    
-    # Convert to schema and add computed fields
-    result = []
-    for book in books:
-        book_data = {
-            'id': book.id,
-            'shelf_id': book.shelf_id,
-            'title': book.title,
-            'author': book.author,
-            'year': book.year,
-            'date_format': book.date_format,
-            'short_description': book.short_description,
-            'long_description': book.long_description,
-            'status': book.status,
-            'borrow_date': book.borrow_date,
-            'borrowed_by_user_id': book.borrowed_by_user_id,
-            'borrowed_by_user_name': book.borrowed_by_user_name,
-        }
-        schema = BookSchema.model_validate(book_data)
-        result.append(schema)
-    return result
+    if selected:
+        return sparse_list_response(books, BookSchema, selected)
+    return book_list_response(books)
 
 
 @router.post("/books/", response=BookSchema)
@@ -353,6 +461,21 @@ def create_book(request, payload: BookCreateSchema):
     return book
 
 
+@router.post("/books/import/")
+def import_books_file(request, file: UploadedFile = File(...), fmt: str = Query(None, alias="format")):
+    """Bulk-import books from an uploaded CSV or NDJSON file."""
+    resolved = import_format(fmt, file.name or '')
+    if resolved is None:
+        return JsonResponse(
+            {"error": f"Unsupported format. Use one of: {', '.join(IMPORT_FORMATS)}"},
+            status=400
+        )
+    try:
+        return import_books(file.file, resolved).as_dict()
+    except InvalidImportFile as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
 @router.post("/shelves/{shelf_id}/books/", response=BookSchema)
 def create_shelf_book(request, shelf_id: int, payload: BookCreateSchema):
     """Create a new book in a specific shelf."""
@@ -365,9 +488,15 @@ def create_shelf_book(request, shelf_id: int, payload: BookCreateSchema):
 
 
 @router.get("/books/{book_id}/", response=BookSchema)
-def get_book(request, book_id: int):
+@conditional_get(Book, User)
+def get_book(request, book_id: int, fields: str = Query(None)):
     """Get a specific book."""
-    return get_object_or_404(Book, id=book_id)
+    selected, error = select_fields(BookSchema, fields)
+    if error:
+        return error
+    if selected:
+        return sparse_object_response(Book.objects.all(), BookSchema, selected, id=book_id)
+    return get_object_or_404(Book.objects.select_related('borrowed_by_user'), id=book_id)
 
 
 @router.put("/books/{book_id}/", response=BookSchema)
@@ -398,34 +527,35 @@ def delete_book(request, book_id: int):
 @router.patch("/books/{book_id}/move/", response=BookSchema)
 def move_book(request, book_id: int, payload: BookMoveSchema):
     """Move a book to a shelf or to storage (shelf_id=None)."""
-    from django.http import JsonResponse
-    
-    book = get_object_or_404(Book, id=book_id)
-    
-    # Prevent moving borrowed books
-    if book.borrowed_by_user is not None:
-        return JsonResponse(
-            {"error": "Cannot move borrowed book. Please return it first."},
-            status=400
-        )
-    
     if payload.shelf_id:
-        shelf = get_object_or_404(Shelf, id=payload.shelf_id)
-        book.shelf = shelf
-        book.status = 'library'
-    else:
-        book.shelf = None
-        book.status = 'storage'
-    book.save()
-    return book
+        get_object_or_404(Shelf, id=payload.shelf_id)
+    error = move_book_to(book_id, payload.shelf_id)
+    if error:
+        return error
+    return Book.objects.select_related('borrowed_by_user').get(id=book_id)
 
 
 # ============= USER ENDPOINTS =============
 
 @router.get("/users/", response=List[UserSchema])
-def list_users(request):
-    """List all users."""
-    return User.objects.all()
+@conditional_get(User)
+def list_users(request, ids: str = Query(None), limit: int = Query(None), cursor: str = Query(None),
+                     fields: str = Query(None)):
+    """List all users, optionally only those with the given ids."""
+    selected, error = select_fields(UserSchema, fields)
+    if error:
+        return error
+    user_ids, error = parse_ids(ids)
+    if error:
+        return error
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    if selected:
+        return sparse_list_response(users, UserSchema, selected, limit, cursor)
+    if limit is not None:
+        return paginated_response(users, limit, cursor, to_json=schema_serializer(UserSchema))
+    return list(users)
 
 
 @router.post("/users/", response=UserSchema)
@@ -436,8 +566,14 @@ def create_user(request, payload: UserCreateSchema):
 
 
 @router.get("/users/{user_id}/", response=UserSchema)
-def get_user(request, user_id: int):
+@conditional_get(User)
+def get_user(request, user_id: int, fields: str = Query(None)):
     """Get a specific user."""
+    selected, error = select_fields(UserSchema, fields)
+    if error:
+        return error
+    if selected:
+        return sparse_object_response(User.objects.all(), UserSchema, selected, id=user_id)
     return get_object_or_404(User, id=user_id)
 
 
@@ -462,9 +598,10 @@ def delete_user(request, user_id: int):
 # ============= DEPARTMENT ENDPOINTS =============
 
 @router.get("/departments/", response=List[DepartmentSchema])
+@conditional_get(Department)
 def list_departments(request):
     """List all departments."""
-    return Department.objects.all()
+    return list(Department.objects.all())
 
 
 @router.post("/departments/", response=DepartmentSchema)
@@ -479,6 +616,7 @@ def create_department(request, payload: DepartmentCreateSchema):
 
 
 @router.get("/departments/{department_id}/", response=DepartmentSchema)
+@conditional_get(Department)
 def get_department(request, department_id: int):
     """Get a specific department."""
     return get_object_or_404(Department, id=department_id)
@@ -488,9 +626,17 @@ def get_department(request, department_id: int):
 
 
 @router.get("/borrowings/", response=List[BorrowingSchema])
-def list_borrowings(request, user_id: int = Query(None), is_returned: bool = Query(None)):
-    """List all borrowings, optionally filtered by user or return status."""
+@conditional_get(Borrowing)
+@no_response_cache
+def list_borrowings(request, user_id: int = Query(None), is_returned: bool = Query(None), ids: str = Query(None),
+                          limit: int = Query(None), cursor: str = Query(None)):
+    """List all borrowings, optionally filtered by user, return status or ids."""
+    borrowing_ids, error = parse_ids(ids)
+    if error:
+        return error
     borrowings = Borrowing.objects.all()
+    if borrowing_ids is not None:
+        borrowings = borrowings.filter(id__in=borrowing_ids)
     if user_id:
         borrowings = borrowings.filter(user_id=user_id)
     if is_returned is not None:
@@ -498,20 +644,45 @@ def list_borrowings(request, user_id: int = Query(None), is_returned: bool = Que
             borrowings = borrowings.exclude(return_date__isnull=True)
         else:
             borrowings = borrowings.filter(return_date__isnull=True)
-    return borrowings
+    if limit is not None:
+        return paginated_response(borrowings, limit, cursor, to_json=schema_serializer(BorrowingSchema))
+    return list(borrowings)
 
 
 @router.post("/borrowings/", response=BorrowingSchema)
 def create_borrowing(request, payload: BorrowingCreateSchema):
     """Create a new borrowing record."""
-    book = get_object_or_404(Book, id=payload.book_id)
+    book = get_object_or_404(Book.objects.select_related('shelf__bookshelf'), id=payload.book_id)
     book.is_available = False
     book.save()
-    borrowing = Borrowing.objects.create(**payload.dict())
+    library_id = book.shelf.bookshelf.library_id if book.shelf else None
+    try:
+        with transaction.atomic():
+            borrowing = Borrowing.objects.create(library_id=library_id, **payload.dict())
+    except IntegrityError:
+        return JsonResponse({"error": "Book already has an active borrowing"}, status=400)
     return borrowing
 
 
+@router.post("/borrowings/bulk-borrow/")
+def bulk_borrow_books(request, payload: BulkBorrowSchema):
+    """Borrow several books for one user in a single transaction."""
+    if len(payload.book_ids) > MAX_BULK_BOOKS:
+        return JsonResponse({"error": f"At most {MAX_BULK_BOOKS} books per request"}, status=400)
+    user = get_object_or_404(User, id=payload.user_id)
+    return bulk_borrow(user, payload.book_ids, payload.borrow_time, payload.notes)
+
+
+@router.post("/borrowings/bulk-return/")
+def bulk_return_books(request, payload: BulkReturnSchema):
+    """Return several books to storage in a single transaction."""
+    if len(payload.book_ids) > MAX_BULK_BOOKS:
+        return JsonResponse({"error": f"At most {MAX_BULK_BOOKS} books per request"}, status=400)
+    return bulk_return(payload.book_ids, payload.return_date, payload.return_notes, payload.user_id)
+
+
 @router.get("/borrowings/{borrowing_id}/", response=BorrowingSchema)
+@conditional_get(Borrowing)
 def get_borrowing(request, borrowing_id: int):
     """Get a specific borrowing record."""
     return get_object_or_404(Borrowing, id=borrowing_id)
@@ -543,6 +714,8 @@ def return_book(request, borrowing_id: int):
     import json
     
     borrowing = get_object_or_404(Borrowing, id=borrowing_id)
+    if borrowing.return_date is not None:
+        return JsonResponse({"error": "Borrowing is already returned"}, status=400)
     
     # Get the request body
     body = {}
@@ -573,17 +746,9 @@ def return_book(request, borrowing_id: int):
     # Get return_notes from request body
     return_notes = body.get('return_notes', '')
     
-    # Update borrowing record
-    borrowing.return_date = return_date
-    borrowing.return_notes = return_notes
-    borrowing.save()
-    
-    # Update book status
-    book = borrowing.book
-    book.status = 'storage'
-    book.shelf_id = None
-    book.borrowed_by_user = None
-    book.save()
+    borrowing, error = checkin_book(borrowing.book_id, return_date, return_notes, borrowing_id=borrowing.id)
+    if error:
+        return error
     
     return {"message": "Book returned successfully", "borrowing": BorrowingSchema.from_orm(borrowing)}
 
@@ -598,16 +763,8 @@ def borrow_book(request, book_id: int, user_id: int):
     from django.http import JsonResponse
     import json
     
-    book = get_object_or_404(Book, id=book_id)
     user = get_object_or_404(User, id=user_id)
     
-    # Check if book is already borrowed
-    if book.borrowed_by_user is not None:
-        return JsonResponse(
-            {"error": f"Book is already borrowed by {book.borrowed_by_user.full_name}"},
-            status=400
-        )
-    
     # Get the request body
     body = {}
     try:
@@ -631,7 +788,7 @@ def borrow_book(request, book_id: int, user_id: int):
             if timezone.is_naive(borrow_date):
                 borrow_date = timezone.make_aware(borrow_date, timezone.utc)
         except (ValueError, AttributeError, TypeError) as e:
-            print(f"DEBUG Backend: Error parsing datetime '{borrow_time_str}': {e}")
+            logger.debug("Unparseable borrow_time %r, using now: %s", borrow_time_str, e)
             borrow_date = timezone.now()
     else:
         borrow_date = timezone.now()
@@ -639,20 +796,10 @@ def borrow_book(request, book_id: int, user_id: int):
     # Get notes from request body, default to empty string
     notes = body.get('notes', '')
     
-    # Create a Borrowing record to track this borrowing session
-    borrowing = Borrowing.objects.create(
-        book=book,
-        user=user,
-        borrow_date=borrow_date,
-        notes=notes
-    )
-    
-    # Update book status to borrowed and set the user
-    book.status = 'borrowed'
-    book.borrowed_by_user = user
-    book.borrow_date = borrowing.borrow_date
-    book.shelf = None  # Remove from shelf when borrowed
-    book.save()
+    borrowing, error = checkout_book(book_id, user, borrow_date, notes)
+    if error:
+        return error
+    book = Book.objects.select_related('borrowed_by_user').get(id=book_id)
     
     return {
         "message": f"Book '{book.title}' borrowed by {user.full_name}",
@@ -667,25 +814,11 @@ def borrow_book(request, book_id: int, user_id: int):
 @router.post("/books/{book_id}/return/")
 def return_book_simple(request, book_id: int):
     """Return a borrowed book to storage."""
-    from django.utils import timezone
-    book = get_object_or_404(Book, id=book_id)
-    
-    # Find and update the active Borrowing record
-    active_borrowing = Borrowing.objects.filter(
-        book=book,
-        return_date__isnull=True
-    ).first()
-    
-    if active_borrowing:
-        active_borrowing.return_date = timezone.now()
-        active_borrowing.save()
-    
-    # Update book status back to storage and clear the borrowed user
-    book.status = 'storage'
-    book.shelf_id = None
-    book.borrowed_by_user = None
-    # Keep borrow_date for borrowing history - do not clear it
-    book.save()
+    # Keeps borrow_date for borrowing history
+    active_borrowing, error = checkin_book(book_id)
+    if error:
+        return error
+    book = Book.objects.get(id=book_id)
     
     return {
         "message": f"Book '{book.title}' returned to storage",
@@ -695,6 +828,7 @@ def return_book_simple(request, book_id: int):
 
 
 @router.get("/books/{book_id}/borrowing-info/")
+@conditional_get(Book)
 def get_book_borrowing_info(request, book_id: int):
     """Get borrowing information for a book."""
     book = get_object_or_404(Book, id=book_id)
@@ -717,3 +851,104 @@ def get_book_borrowing_info(request, book_id: int):
         "status": book.status,
         "borrowing": active_borrowing,
     }
+
+
+# ============= EXPORT ENDPOINTS =============
+
+@router.get("/export/books/")
+def export_books_catalog(request, fmt: str = Query("ndjson", alias="format")):
+    """Stream every book with its shelf/bookshelf/library path as NDJSON or CSV."""
+    return export_books(fmt, asynchronous=isinstance(request, ASGIRequest))
+
+
+@router.get("/export/borrowings/")
+def export_borrowings_history(request, fmt: str = Query("ndjson", alias="format")):
+    """Stream every borrowing record as NDJSON or CSV."""
+    return export_borrowings(fmt, asynchronous=isinstance(request, ASGIRequest))
+
+
+# ============= TREE ENDPOINTS =============
+
+@router.get("/tree/", response=List[TreeLibrarySchema])
+@conditional_get(Library, Bookshelf, Shelf, Book)
+def get_tree(request, library_id: int = Query(None), depth: int = Query(MAX_TREE_DEPTH)):
+    """Get libraries with their bookshelves and shelves, each with book counts by status."""
+    if depth < 1 or depth > MAX_TREE_DEPTH:
+        return JsonResponse({"error": f"depth must be between 1 and {MAX_TREE_DEPTH}"}, status=400)
+    return library_tree(library_id, depth)
+
+
+# ============= ANALYTICS ENDPOINTS =============
+
+@router.get("/analytics/borrowings/{group_by}/")
+def get_borrowing_analytics(
+    request,
+    group_by: str,
+    start: datetime = Query(None),
+    end: datetime = Query(None),
+    limit: int = Query(100),
+):
+    """Get loan statistics per user, department or library for borrowings made in [start, end)."""
+    if group_by not in ANALYTICS_DIMENSIONS:
+        return JsonResponse(
+            {"error": f"group_by must be one of: {', '.join(ANALYTICS_DIMENSIONS)}"},
+            status=400
+        )
+    error = check_limit(limit)
+    if error:
+        return error
+    return borrowing_analytics(group_by, start, end, limit)
+
+
+# ============= CACHE ENDPOINTS =============
+
+@router.get("/cache/stats/")
+def get_cache_stats(request):
+    """Get response cache hit/miss counters, of all workers when METRICS_DIR is set."""
+    return cache_stats()
+
+
+# ============= METRICS ENDPOINTS =============
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics(request):
+    """Export per-operation request metrics in Prometheus text format."""
+    return metrics_response()
+
+
+# ============= DATABASE ENDPOINTS =============
+
+@router.get("/db/stats/")
+def get_database_stats(request):
+    """Get connection settings and pool usage of the worker serving the request."""
+    return database_stats()
+
+
+# ============= EVENT ENDPOINTS =============
+
+@router.get("/events/")
+async def stream_events(request, last_event_id: int = Query(None)):
+    """Stream book, borrowing and shelf changes as Server-Sent Events.
+
+    Resumes after the Last-Event-ID header (or ?last_event_id=) when given.
+    Needs CHANGE_EVENTS_ENABLED and SERVER_PROFILE=asgi.
+    """
+    if not settings.CHANGE_EVENTS_ENABLED:
+        return JsonResponse({"error": "Change events are disabled (CHANGE_EVENTS_ENABLED)"}, status=404)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "The event stream requires an ASGI server"}, status=501)
+    header = request.headers.get('Last-Event-ID')
+    if header is not None:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            return JsonResponse({"error": "Last-Event-ID must be an integer"}, status=400)
+    return event_stream_response(last_event_id)
+
+
+# ============= BATCH ENDPOINTS =============
+
+@router.post("/batch/")
+def batch(request, payload: BatchSchema):
+    """Run several GET requests in one round trip against one database snapshot."""
+    return run_batch(request, payload.requests)
@@ -1,7 +1,7 @@
 """Schemas for serializing models."""
 from ninja import Schema
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class LibrarySchema(Schema):
@@ -15,6 +15,9 @@ class LibrarySchema(Schema):
     phone: str
     email: str
     order: int
+    book_count: int
+    library_book_count: int
+    borrowed_book_count: int
     created_at: datetime
     updated_at: datetime
 
@@ -28,7 +31,7 @@ class LibraryCreateSchema(Schema):
     address: str = ""
     phone: str = ""
     email: str = ""
-    order: int = 0
+    order: Optional[int] = None
 
 
 class BookshelfSchema(Schema):
@@ -40,6 +43,9 @@ class BookshelfSchema(Schema):
     long_description: str
     location: str
     order: int
+    book_count: int
+    library_book_count: int
+    borrowed_book_count: int
     created_at: datetime
     updated_at: datetime
 
@@ -52,7 +58,7 @@ class BookshelfCreateSchema(Schema):
     long_description: str = ""
     description: str = ""
     location: str = ""
-    order: int = 0
+    order: Optional[int] = None
 
 
 class BookshelfUpdateSchema(Schema):
@@ -62,7 +68,7 @@ class BookshelfUpdateSchema(Schema):
     long_description: str = ""
     description: str = ""
     location: str = ""
-    order: int = 0
+    order: Optional[int] = None
 
 
 class ShelfSchema(Schema):
@@ -74,6 +80,9 @@ class ShelfSchema(Schema):
     long_description: str
     description: str
     order: int
+    book_count: int
+    library_book_count: int
+    borrowed_book_count: int
     created_at: datetime
     updated_at: datetime
 
@@ -84,7 +93,7 @@ class ShelfCreateSchema(Schema):
     short_description: str = ""
     long_description: str = ""
     description: str = ""
-    order: int = 0
+    order: Optional[int] = None
     bookshelf_id: Optional[int] = None
 
 
@@ -102,6 +111,8 @@ class BookSchema(Schema):
     borrowed_by_user_id: Optional[int] = None
     borrowed_by_user_name: Optional[str] = None
     borrow_date: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
     
     class Config:
         from_attributes = True
@@ -154,6 +165,7 @@ class BorrowingSchema(Schema):
     id: int
     book_id: int
     user_id: Optional[int]
+    library_id: Optional[int]
     borrow_date: datetime
     return_date: Optional[datetime]
     notes: str
@@ -175,6 +187,22 @@ class BorrowBookSchema(Schema):
     notes: str = ""
 
 
+class BulkBorrowSchema(Schema):
+    """Schema for borrowing several books for one user."""
+    user_id: int
+    book_ids: List[int]
+    borrow_time: Optional[datetime] = None
+    notes: str = ""
+
+
+class BulkReturnSchema(Schema):
+    """Schema for returning several books at once."""
+    book_ids: List[int]
+    user_id: Optional[int] = None
+    return_date: Optional[datetime] = None
+    return_notes: str = ""
+
+
 class UserSchema(Schema):
     """Schema for User model."""
     id: int
@@ -213,8 +241,57 @@ class DepartmentCreateSchema(Schema):
     name: str
 
 
+class BookCountsSchema(Schema):
+    """Schema for book counts by status (loans count where they were checked out from)."""
+    library: int
+    borrowed: int
+    total: int
+
+
+class TreeShelfSchema(Schema):
+    """Schema for a shelf node in the hierarchy tree."""
+    id: int
+    name: Optional[str]
+    short_description: str
+    order: int
+    book_counts: BookCountsSchema
+
+
+class TreeBookshelfSchema(Schema):
+    """Schema for a bookshelf node in the hierarchy tree."""
+    id: int
+    name: str
+    short_description: str
+    location: str
+    order: int
+    book_counts: BookCountsSchema
+    shelves: Optional[List[TreeShelfSchema]] = None
+
+
+class TreeLibrarySchema(Schema):
+    """Schema for a library node in the hierarchy tree."""
+    id: int
+    name: str
+    short_description: str
+    address: str
+    order: int
+    book_counts: BookCountsSchema
+    bookshelves: Optional[List[TreeBookshelfSchema]] = None
+
+
 class ReorderSchema(Schema):
     """Schema for reordering items."""
     id: int
     order: int
 
+
+class BatchItemSchema(Schema):
+    """Schema for one sub-request of a batch."""
+    method: str = "GET"
+    path: str
+    headers: Dict[str, str] = {}
+
+
+class BatchSchema(Schema):
+    """Schema for running several requests at once."""
+    requests: List[BatchItemSchema]
@@ -0,0 +1,60 @@
+"""Ranked full-text search over books."""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from apps.books.models import Book
+from .fields import trim_row
+from .listing import book_rows
+from .pagination import InvalidCursor, decode_cursor_values, seek_filter, split_page
+
+# Results are ordered by relevance, then id for a stable tiebreak
+SEARCH_KEYS = ['-rank', 'id']
+
+# FTS5 column weights for title, author, short_description, long_description
+SQLITE_BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+
+def _fts5_query(q):
+    """Quote every term so user input is matched literally (implicit AND)."""
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in q.split())
+
+
+def _ranked_books(q):
+    """Return books matching q annotated with `rank` (higher is more relevant)."""
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(q)
+        weights = ', '.join(str(weight) for weight in SQLITE_BM25_WEIGHTS)
+        return Book.objects.filter(
+            id__in=RawSQL("SELECT rowid FROM books_book_fts WHERE books_book_fts MATCH %s", (match,))
+        ).annotate(rank=RawSQL(
+            f"SELECT -bm25(books_book_fts, {weights}) FROM books_book_fts "
+            "WHERE books_book_fts MATCH %s AND books_book_fts.rowid = books_book.id",
+            (match,),
+            output_field=FloatField(),
+        ))
+    query = SearchQuery(q, config='english', search_type='websearch')
+    # ts_rank returns real; compare as double so cursor values round-trip exactly
+    return Book.objects.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+    )
+
+
+def search_books(q, limit, cursor=None, fields=None):
+    """Return one page of ranked matches for q and the cursor for the next page.
+
+    `fields` narrows the rows to those BookSchema fields, dropping the rank.
+    """
+    books = _ranked_books(q)
+    if cursor:
+        rank, book_id = decode_cursor_values(cursor, len(SEARCH_KEYS))
+        if not isinstance(rank, (int, float)) or not isinstance(book_id, int):
+            raise InvalidCursor("Cursor does not match this listing")
+        books = books.filter(seek_filter(SEARCH_KEYS, [rank, book_id]))
+    rows = book_rows(books.order_by(*SEARCH_KEYS)[:limit + 1], 'rank', fields=fields)
+    items, next_cursor = split_page(rows, SEARCH_KEYS, limit)
+    if fields is not None:
+        items = [trim_row(row, fields) for row in items]
+    return items, next_cursor
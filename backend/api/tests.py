@@ -0,0 +1,724 @@
+"""Tests for the API."""
+import base64
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from threading import Barrier
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.books.models import Book, BookStatusCounter, rebuild_book_counts
+from apps.bookshelves.models import Bookshelf
+from apps.borrowings.models import Borrowing
+from apps.libraries.models import BOOK_COUNT_FIELDS, Library
+from apps.shelves.models import Shelf
+from apps.users.models import User
+from . import batch as batch_module
+from .batch import MAX_BATCH_REQUESTS
+from .circulation import MAX_BULK_BOOKS, _flip_book, checkout_book
+from .fields import FIELD_PRESETS
+from .listing import book_list_response, book_rows
+from .metrics import _MemoryValues, _MmapValues, _read_file
+from .pagination import MAX_PAGE_SIZE, encode_cursor, paginate
+from .reorder import ORDER_GAP
+from .schemas import BookSchema, LibrarySchema
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class BookListingQueryCountTests(TestCase):
+    """Listing books with their borrowers must not issue a query per book."""
+
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        bookshelf = Bookshelf.objects.create(library=library, name="A")
+        cls.shelf = Shelf.objects.create(bookshelf=bookshelf, name="A1")
+        cls.users = [User.objects.create(full_name=f"Reader {i}", phone=f"555-000{i}") for i in range(3)]
+
+    def add_books(self, count):
+        """Add count books: on loan to a rotating borrower, on the shelf and in storage, in turn."""
+        for i in range(count):
+            book = Book(title=f"Book {Book.objects.count()}")
+            if i % 3 == 0:
+                book.status = 'borrowed'
+                book.borrowed_by_user = self.users[i % len(self.users)]
+                book.borrow_date = timezone.now()
+            elif i % 3 == 1:
+                book.shelf = self.shelf
+            book.save()
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_book_rows_joins_borrower_names(self):
+        self.add_books(12)
+        with self.assertNumQueries(1):
+            rows = book_rows(Book.objects.all())
+        self.assertEqual(len(rows), 12)
+        borrowed = [row for row in rows if row['status'] == 'borrowed']
+        self.assertEqual(len(borrowed), 4)
+        self.assertTrue(all(row['borrowed_by_user_name'].startswith("Reader") for row in borrowed))
+
+    def test_book_list_response_query_count_is_constant(self):
+        self.add_books(3)
+        few = self.count_queries(lambda: book_list_response(Book.objects.all()))
+        self.add_books(30)
+        with self.assertNumQueries(few):
+            book_list_response(Book.objects.all())
+
+    def test_endpoints_query_count_is_constant(self):
+        for path in ('/api/books/', '/api/books/?limit=50', '/api/books/by-status/',
+                     f'/api/books/?shelf_id={self.shelf.id}', '/api/books/storage/'):
+            with self.subTest(path=path):
+                Book.objects.all().delete()
+                self.add_books(3)
+                few = self.count_queries(lambda: self.assertEqual(self.client.get(path).status_code, 200))
+                self.add_books(30)
+                with self.assertNumQueries(few):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PaginationTests(TestCase):
+    """Cursor pages must cover a listing exactly once, including rows that tie on the ordering."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.bulk_create([
+            Book(title=f"Book {i % 3}", status=('storage', 'borrowed')[i % 2]) for i in range(40)
+        ])
+        # Four creation times shared by ten books each, so pages end inside runs of ties
+        start = timezone.now()
+        for i, book_id in enumerate(Book.objects.order_by('id').values_list('id', flat=True)):
+            Book.objects.filter(id=book_id).update(created_at=start - timedelta(hours=i % 4))
+
+    def walk(self, path, limit):
+        ids, cursor = [], None
+        while True:
+            separator = '&' if '?' in path else '?'
+            response = self.client.get(f"{path}{separator}limit={limit}" + (f"&cursor={cursor}" if cursor else ""))
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['items']), limit)
+            ids += [row['id'] for row in page['items']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_walk_has_no_duplicates_or_gaps(self):
+        cases = (
+            ('/api/books/', Book.objects.all()),
+            ('/api/books/?status=borrowed', Book.objects.filter(status='borrowed')),
+        )
+        for path, books in cases:
+            expected = list(books.order_by('-created_at', 'title', 'id').values_list('id', flat=True))
+            for limit in (1, 7, 10, 40, 41):
+                with self.subTest(path=path, limit=limit):
+                    self.assertEqual(self.walk(path, limit), expected)
+
+    def test_limit_out_of_range_is_rejected(self):
+        for path in ('/api/books/?limit=0', '/api/books/?limit=-1', f'/api/books/?limit={MAX_PAGE_SIZE + 1}',
+                     '/api/books/by-status/?limit=0', '/api/books/search/?q=book&limit=0'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 400)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.client.get('/api/books/?limit=5').json()['next_cursor']
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        tampered = (
+            'not a cursor',
+            cursor[:-2],
+            encode_cursor(values[:-1]),
+            encode_cursor(['yesterday', *values[1:]]),
+            encode_cursor([values[0], values[1], 'seven']),
+            encode_cursor({'id': values[-1]}),
+        )
+        for bad in tampered:
+            with self.subTest(cursor=bad):
+                response = self.client.get('/api/books/', {'limit': 5, 'cursor': bad})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.get('/api/books/by-status/', {'limit': 5, 'borrowed_cursor': bad})
+                self.assertEqual(response.status_code, 400)
+
+
+class ReorderTests(TestCase):
+    """Reorders rewrite as few rows as possible and keep every sibling's key distinct."""
+
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        cls.bookshelf = Bookshelf.objects.create(library=library, name="A")
+        cls.other = Bookshelf.objects.create(library=library, name="B")
+        cls.shelves = [
+            Shelf.objects.create(bookshelf=cls.bookshelf, name=f"A{i}", order=(i + 1) * ORDER_GAP) for i in range(5)
+        ]
+        cls.stranger = Shelf.objects.create(bookshelf=cls.other, name="B0", order=ORDER_GAP)
+
+    def reorder(self, shelves):
+        return self.client.post(
+            '/api/shelves/reorder/', [{"id": shelf.id, "order": i} for i, shelf in enumerate(shelves)],
+            content_type='application/json',
+        )
+
+    def sibling_ids(self):
+        orders = list(Shelf.objects.filter(bookshelf=self.bookshelf).order_by('order', 'id').values_list('order', 'id'))
+        self.assertEqual(len({order for order, _ in orders}), len(orders))
+        return [shelf_id for _, shelf_id in orders]
+
+    def updates(self, queries):
+        return [query for query in queries if query['sql'].startswith('UPDATE')]
+
+    def test_moving_one_row_issues_one_update(self):
+        a, b, c, d, e = self.shelves
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reorder([a, d, b, c, e])
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(len(self.updates(queries)), 1)
+        self.assertEqual(self.sibling_ids(), [a.id, d.id, b.id, c.id, e.id])
+
+    def test_exhausted_gap_respaces_all_siblings(self):
+        a, b, c, d, e = self.shelves
+        for i, shelf in enumerate(self.shelves):
+            Shelf.objects.filter(id=shelf.id).update(order=i + 1)
+        self.assertEqual(self.reorder([a, c, b, d, e]).status_code, 200)
+        self.assertEqual(self.sibling_ids(), [a.id, c.id, b.id, d.id, e.id])
+        self.assertEqual(
+            list(Shelf.objects.filter(bookshelf=self.bookshelf).order_by('order').values_list('order', flat=True)),
+            [i * ORDER_GAP for i in range(1, 6)],
+        )
+
+    def test_partial_payload_keeps_unlisted_siblings_in_place(self):
+        a, b, c, d, e = self.shelves
+        # Only the last two are listed, swapped: they must not land after or on top of unlisted keys
+        self.assertEqual(self.reorder([e, d]).status_code, 200)
+        self.assertEqual(self.sibling_ids(), [a.id, b.id, c.id, e.id, d.id])
+        self.assertEqual(self.reorder([e, a]).status_code, 200)
+        self.assertEqual(self.sibling_ids(), [e.id, b.id, c.id, a.id, d.id])
+        # Listed rows whose neighbours leave no gap re-space the whole list, unlisted rows included
+        Shelf.objects.filter(id=b.id).update(order=Shelf.objects.get(id=e.id).order + 1)
+        Shelf.objects.filter(id=c.id).update(order=Shelf.objects.get(id=e.id).order + 2)
+        self.assertEqual(self.reorder([c, b]).status_code, 200)
+        self.assertEqual(self.sibling_ids(), [e.id, c.id, b.id, a.id, d.id])
+
+    def test_payload_is_validated(self):
+        a, b = self.shelves[:2]
+        response = self.reorder([a, self.stranger])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("same bookshelf", response.json()['error'])
+        self.assertEqual(self.reorder([a, a]).status_code, 400)
+        response = self.client.post(
+            '/api/shelves/reorder/', [{"id": a.id, "order": 0}, {"id": 0, "order": 1}], content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.sibling_ids(), [shelf.id for shelf in self.shelves])
+
+
+class BookImportTests(TestCase):
+    """Uploads that cannot be decoded are refused as a whole; bad rows are reported one by one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        cls.shelf = Shelf.objects.create(bookshelf=Bookshelf.objects.create(library=library, name="A"), name="A1")
+
+    def upload(self, name, content):
+        return self.client.post('/api/books/import/', {'file': SimpleUploadedFile(name, content)})
+
+    def test_undecodable_file_is_rejected(self):
+        content = b"title,author\n" + b"Fine,Someone\n" * 2000 + b"Caf\xe9,Someone\n"
+        response = self.upload('books.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.json()['error'])
+        self.assertFalse(Book.objects.exists())
+
+    def test_borrowed_rows_need_a_lending_shelf(self):
+        rows = [
+            {"title": "On loan", "status": "borrowed"},
+            {"title": "Lent", "status": "borrowed", "shelf_id": self.shelf.id},
+            {"title": "Shelved", "shelf_id": self.shelf.id},
+        ]
+        response = self.upload('books.ndjson', '\n'.join(json.dumps(row) for row in rows).encode())
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['row'], 1)
+        lent = Book.objects.get(title="Lent")
+        self.assertEqual((lent.status, lent.shelf_id, lent.borrowed_from_shelf_id), ('borrowed', None, self.shelf.id))
+        self.shelf.refresh_from_db()
+        self.assertEqual((self.shelf.library_book_count, self.shelf.borrowed_book_count), (1, 1))
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsAndIdsTests(TestCase):
+    """?fields= narrows rows to known fields and presets; ?ids= selects rows by id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.library = Library.objects.create(name="Central", address="1 Main Street")
+        shelf = Shelf.objects.create(bookshelf=Bookshelf.objects.create(library=cls.library, name="A"), name="A1")
+        cls.user = User.objects.create(full_name="Reader", phone="555-0000")
+        cls.books = [Book.objects.create(title=f"Book {i}", shelf=shelf) for i in range(3)]
+        cls.books[0].shelf = None
+        cls.books[0].borrowed_from_shelf = shelf
+        cls.books[0].status = 'borrowed'
+        cls.books[0].borrowed_by_user = cls.user
+        cls.books[0].save()
+
+    def test_unknown_field_is_rejected(self):
+        for path in ('/api/books/?fields=title,nope', '/api/books/?fields=nope&limit=2',
+                     f'/api/books/{self.books[0].id}/?fields=nope', '/api/libraries/?fields=nope',
+                     '/api/books/by-status/?fields=nope'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Unknown fields: nope"})
+
+    def test_card_preset_and_field_shapes(self):
+        card = set(FIELD_PRESETS[BookSchema]['card'])
+        rows = self.client.get('/api/books/?fields=card').json()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(set(row) == card for row in rows))
+        borrowed = next(row for row in rows if row['id'] == self.books[0].id)
+        self.assertEqual(borrowed['borrowed_by_user_name'], "Reader")
+        page = self.client.get('/api/books/?fields=title&limit=2').json()
+        self.assertEqual([set(row) for row in page['items']], [{'id', 'title'}] * 2)
+        self.assertIsNotNone(page['next_cursor'])
+        book = self.client.get(f'/api/books/{self.books[1].id}/?fields=card,long_description').json()
+        self.assertEqual(set(book), card | {'long_description'})
+        libraries = self.client.get('/api/libraries/?fields=card').json()
+        self.assertEqual(set(libraries[0]), set(FIELD_PRESETS[LibrarySchema]['card']))
+        self.assertEqual(libraries[0]['book_count'], 3)
+
+    def test_ids_selects_rows(self):
+        a, b, c = (book.id for book in self.books)
+        rows = self.client.get(f'/api/books/?ids={b},{a},{b},999999').json()
+        self.assertEqual(sorted(row['id'] for row in rows), [a, b])
+        self.assertEqual(self.client.get('/api/books/?ids=999999').json(), [])
+        self.assertEqual(len(self.client.get(f'/api/users/?ids={self.user.id},{self.user.id}').json()), 1)
+        for ids in (f'{a},x', f'{a};{b}', '1.5', ','.join(str(i) for i in range(MAX_PAGE_SIZE + 1))):
+            with self.subTest(ids=ids[:20]):
+                self.assertEqual(self.client.get('/api/books/', {'ids': ids}).status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class BatchTests(TestCase):
+    """Each batch entry reports its own status, body and ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.library = Library.objects.create(name="Central", address="1 Main Street")
+        cls.book = Book.objects.create(title="Book")
+
+    def batch(self, *requests):
+        return self.client.post('/api/batch/', {"requests": list(requests)}, content_type='application/json')
+
+    def test_entries_report_status_body_and_etag(self):
+        direct = self.client.get(f'/api/books/{self.book.id}/')
+        response = self.batch(
+            {"path": f"/api/books/{self.book.id}/"},
+            {"path": "/api/books/999999/"},
+            {"path": "/api/nowhere/"},
+            {"path": "/api/books/?ids=x"},
+            {"path": "/api/batch/"},
+            {"path": f"/api/books/{self.book.id}/", "headers": {"If-None-Match": direct['ETag']}},
+            {"path": "/api/books/stats/"},
+        )
+        self.assertEqual(response.status_code, 200)
+        found, missing, unrouted, invalid, nested, unchanged, stats = response.json()['responses']
+        self.assertEqual([entry['status'] for entry in response.json()['responses']], [200, 404, 404, 400, 400, 304, 200])
+        self.assertEqual(found['body'], direct.json())
+        self.assertEqual(found['etag'], direct['ETag'])
+        self.assertIsNone(unchanged['body'])
+        self.assertEqual(unchanged['etag'], direct['ETag'])
+        self.assertNotIn('etag', invalid)
+        self.assertEqual(stats['body']['total'], 1)
+
+    def test_batch_is_validated(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch({"method": "POST", "path": "/api/books/"}).status_code, 400)
+        self.assertEqual(self.batch(*[{"path": "/api/books/"}] * (MAX_BATCH_REQUESTS + 1)).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Needs REPEATABLE READ and concurrent connections")
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class BatchSnapshotTests(TransactionTestCase):
+    """A batch mixing resources reads them all from one snapshot."""
+
+    def test_write_between_entries_is_not_seen(self):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        shelf = Shelf.objects.create(bookshelf=Bookshelf.objects.create(library=library, name="A"), name="A1")
+        Book.objects.create(title="Before", shelf=shelf)
+        handle = batch_module._handle
+        written = []
+
+        def handle_then_write(sub):
+            response = handle(sub)
+            if not written:
+                # Commit a new book from another connection once the snapshot is taken
+                def write():
+                    try:
+                        written.append(Book.objects.create(title="During", shelf=shelf))
+                    finally:
+                        connections.close_all()
+                with ThreadPoolExecutor(1) as pool:
+                    pool.submit(write).result()
+            return response
+        with patch.object(batch_module, '_handle', handle_then_write):
+            response = self.client.post('/api/batch/', {"requests": [
+                {"path": "/api/books/"},
+                {"path": "/api/books/stats/"},
+                {"path": f"/api/libraries/{library.id}/"},
+                {"path": "/api/tree/"},
+            ]}, content_type='application/json')
+        books, stats, library_entry, tree = (entry['body'] for entry in response.json()['responses'])
+        self.assertEqual(len(written), 1)
+        self.assertEqual([book['title'] for book in books], ["Before"])
+        self.assertEqual(stats['total'], 1)
+        self.assertEqual(library_entry['book_count'], 1)
+        self.assertEqual(tree[0]['book_counts']['total'], 1)
+        self.assertEqual(self.client.get('/api/books/stats/').json()['total'], 2)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(TransactionTestCase):
+    """A write bumps the version stamp, so the next GET misses the cache instead of serving stale data."""
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.library = Library.objects.create(name="Central", address="1 Main Street")
+
+    def lookups(self):
+        routes = self.client.get('/api/cache/stats/').json()['routes']
+        return routes.get('list_libraries', {'hits': 0, 'misses': 0})
+
+    def test_write_invalidates_cached_get(self):
+        before = self.lookups()
+        first = self.client.get('/api/libraries/')
+        self.assertEqual(self.client.get('/api/libraries/').content, first.content)
+        cached = self.lookups()
+        self.assertEqual((cached['hits'] - before['hits'], cached['misses'] - before['misses']), (1, 1))
+        self.library.name = "Renamed"
+        self.library.save()
+        response = self.client.get('/api/libraries/')
+        self.assertEqual([library['name'] for library in response.json()], ["Renamed"])
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        after = self.lookups()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (1, 2))
+        self.assertIn('response_cache_lookups_total{route="list_libraries",result="hit"}',
+                      self.client.get('/api/metrics').content.decode())
+
+
+class MetricsStoreTests(SimpleTestCase):
+    """Concurrent request threads of one worker must not lose metric increments."""
+
+    THREADS = 8
+    ADDS = 20000
+
+    def assertNoLostIncrements(self, store):
+        def add(_):
+            for i in range(self.ADDS):
+                store.add('requests', 1)
+                store.add(f'key {i % 50}', 1)
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            list(pool.map(add, range(self.THREADS)))
+        values = dict(store.items())
+        self.assertEqual(values['requests'], self.THREADS * self.ADDS)
+        self.assertEqual(sum(value for key, value in values.items() if key != 'requests'), self.THREADS * self.ADDS)
+
+    def test_mmap_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.db')
+            self.assertNoLostIncrements(_MmapValues(path))
+            self.assertEqual(dict(_read_file(path))['requests'], self.THREADS * self.ADDS)
+
+    def test_memory_store(self):
+        self.assertNoLostIncrements(_MemoryValues())
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class BookCounterTests(TransactionTestCase):
+    """Container writes must keep /books/stats/ and its ETag current.
+
+    Table versions are bumped on commit, so these run outside a test transaction.
+    """
+
+    def setUp(self):
+        self.library = Library.objects.create(name="Central", address="1 Main Street")
+        self.bookshelf = Bookshelf.objects.create(library=self.library, name="A")
+        self.shelf = Shelf.objects.create(bookshelf=self.bookshelf, name="A1")
+        self.user = User.objects.create(full_name="Reader", phone="555-0000")
+
+    def stats(self, library_id=None, etag=None):
+        path = '/api/books/stats/' + (f'?library_id={library_id}' if library_id else '')
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_deleting_shelf_with_lent_book_changes_etag(self):
+        Book.objects.create(title="Lent", status='borrowed', borrowed_from_shelf=self.shelf, borrowed_by_user=self.user)
+        before = self.stats(self.library.id)
+        self.assertEqual(before.json()['borrowed'], 1)
+        self.shelf.delete()
+        after = self.stats(self.library.id, before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()['borrowed'], 0)
+        self.assertEqual(Book.objects.get().borrowed_from_shelf_id, None)
+
+
+    def test_moving_containers_moves_library_counters(self):
+        other = Library.objects.create(name="Branch", address="2 Side Street")
+        Book.objects.create(title="Shelved", shelf=self.shelf)
+        Book.objects.create(title="Lent", status='borrowed', borrowed_from_shelf=self.shelf, borrowed_by_user=self.user)
+        before = self.stats(other.id)
+        # A shelf moved to a bookshelf in another library
+        self.shelf.bookshelf = Bookshelf.objects.create(library=other, name="B")
+        self.shelf.save()
+        self.assertEqual(self.stats(self.library.id).json(), {"storage": 0, "library": 0, "borrowed": 0, "total": 0})
+        after = self.stats(other.id, before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json(), {"storage": 0, "library": 1, "borrowed": 1, "total": 2})
+        # A bookshelf moved back to the first library
+        self.shelf.bookshelf.library = self.library
+        self.shelf.bookshelf.save()
+        self.assertEqual(self.stats(self.library.id).json()['total'], 2)
+        self.assertEqual(self.stats(other.id).json()['total'], 0)
+        self.assertEqual(self.stats().json()['total'], 2)
+
+    def test_verify_reports_drifted_status_counters(self):
+        Book.objects.create(title="Shelved", shelf=self.shelf)
+        call_command('reconcile_book_counters', '--verify', stdout=StringIO())
+        BookStatusCounter.objects.filter(library=self.library).update(library_count=F('library_count') + 1)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_book_counters', '--verify', stdout=out)
+        self.assertIn(f"stored library {self.library.id}: storage=0 library=2", out.getvalue())
+        self.assertEqual(BookStatusCounter.for_scope(self.library.id).library_count, 2)
+
+class CirculationConflictTests(TransactionTestCase):
+    """Conflicting checkouts and returns must leave the counters exact."""
+
+    def setUp(self):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        self.shelf = Shelf.objects.create(bookshelf=Bookshelf.objects.create(library=library, name="A"), name="A1")
+        self.users = [User.objects.create(full_name=f"Reader {i}", phone=f"555-000{i}") for i in range(2)]
+        self.book = Book.objects.create(title="Shelved", shelf=self.shelf)
+
+    def counts(self):
+        """Return every status counter and container count, checked against a recount."""
+        self.assertEqual(BookStatusCounter.drifted(), [])
+        self.assertEqual(rebuild_book_counts(fix=False), {model: [] for model in (Shelf, Bookshelf, Library)})
+        return (
+            {counter.library_id: counter.as_stats() for counter in BookStatusCounter.objects.all()},
+            [list(model.objects.values_list('id', *BOOK_COUNT_FIELDS)) for model in (Shelf, Bookshelf, Library)],
+        )
+
+    def borrow(self, user):
+        return self.client.post(f'/api/books/{self.book.id}/borrow/{user.id}/')
+
+    def test_double_borrow_is_refused(self):
+        self.assertEqual(self.borrow(self.users[0]).status_code, 200)
+        borrowed = self.counts()
+        response = self.borrow(self.users[1])
+        self.assertIn(response.status_code, (400, 409))
+        self.assertEqual(self.counts(), borrowed)
+        self.assertEqual(Borrowing.objects.filter(return_date__isnull=True).count(), 1)
+
+    def test_borrow_then_return_restores_counts(self):
+        self.book.shelf = None
+        self.book.save()
+        before = self.counts()
+        self.assertEqual(self.borrow(self.users[0]).status_code, 200)
+        self.assertNotEqual(self.counts(), before)
+        self.assertEqual(self.client.post(f'/api/books/{self.book.id}/return/').status_code, 200)
+        self.assertEqual(self.counts(), before)
+
+    def test_book_changing_under_every_attempt_returns_409(self):
+        before = self.counts()
+
+        def interfere(state):
+            # Another request changes the borrower between the read and the UPDATE
+            user = None if state['borrowed_by_user_id'] else self.users[1]
+            Book.objects.filter(id=self.book.id).update(borrowed_by_user=user)
+            return None
+        with transaction.atomic():
+            _, error = _flip_book(self.book.id, interfere, status='borrowed', shelf_id=None,
+                                  borrowed_by_user_id=self.users[0].id)
+        self.assertEqual(error.status_code, 409)
+        self.assertEqual(self.counts(), before)
+
+    def test_bulk_borrow_and_return_report_each_book(self):
+        stored = Book.objects.create(title="Stored")
+        a, b, missing = self.book.id, stored.id, 999999
+
+        def post(action, **payload):
+            return self.client.post(f'/api/borrowings/bulk-{action}/', payload, content_type='application/json')
+        response = post('borrow', user_id=self.users[0].id, book_ids=[a, a, missing, b])
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['borrowed'], result['failed']), (2, 1))
+        self.assertEqual([(entry['book_id'], entry['ok']) for entry in result['results']],
+                         [(a, True), (missing, False), (b, True)])
+        borrowed = self.counts()
+        self.assertEqual(post('borrow', user_id=self.users[1].id, book_ids=[a]).json()['results'][0]['error'],
+                         "already borrowed")
+        self.assertEqual(post('return', book_ids=[a], user_id=self.users[1].id).json()['results'][0]['error'],
+                         "borrowed by another user")
+        self.assertEqual(self.counts(), borrowed)
+        result = post('return', book_ids=[b, a, b, missing]).json()
+        self.assertEqual((result['returned'], result['failed']), (2, 1))
+        self.assertEqual(Borrowing.objects.filter(return_date__isnull=True).count(), 0)
+        self.counts()
+        self.assertEqual(post('borrow', user_id=self.users[0].id, book_ids=['x']).status_code, 422)
+        self.assertEqual(post('return', book_ids=list(range(1, MAX_BULK_BOOKS + 2))).status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', "Needs concurrent connections")
+    def test_concurrent_borrows_check_out_once(self):
+        before = self.counts()
+        barrier = Barrier(len(self.users))
+
+        def borrow(user):
+            barrier.wait()
+            try:
+                return checkout_book(self.book.id, user)[1]
+            finally:
+                connections.close_all()
+        with ThreadPoolExecutor(len(self.users)) as pool:
+            errors = list(pool.map(borrow, self.users))
+        self.assertEqual(sum(error is None for error in errors), 1)
+        self.assertIn(max(error.status_code for error in errors if error), (400, 409))
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.assertEqual(self.client.post(f'/api/books/{self.book.id}/return/').status_code, 200)
+        self.book.refresh_from_db()
+        self.book.shelf = self.shelf
+        self.book.save()
+        self.assertEqual(self.counts(), before)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Checks PostgreSQL query plans")
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class HotQueryIndexTests(TestCase):
+    """The listing and active-borrowing queries must be served by the hot_query_indexes indexes."""
+
+    BOOKS = 20000
+    USERS = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Central", address="1 Main Street")
+        bookshelf = Bookshelf.objects.create(library=library, name="A")
+        shelves = Shelf.objects.bulk_create([Shelf(bookshelf=bookshelf, name=f"A{i}") for i in range(50)])
+        users = User.objects.bulk_create([User(full_name=f"Reader {i}") for i in range(cls.USERS)])
+        now = timezone.now()
+        # Every fifth book is on loan, every fifth is in storage, the rest are shelved
+        books = Book.objects.bulk_create([
+            Book(
+                title=f"Book {i}",
+                status=('borrowed', 'storage', 'library', 'library', 'library')[i % 5],
+                shelf=shelves[i % len(shelves)] if i % 5 > 1 else None,
+                borrowed_by_user=users[i % cls.USERS] if i % 5 == 0 else None,
+            )
+            for i in range(cls.BOOKS)
+        ], batch_size=2000)
+        # Returned loans for every book, plus the open loan of each borrowed book
+        Borrowing.objects.bulk_create([
+            Borrowing(
+                book=book, user=users[(i * 7) % cls.USERS],
+                borrow_date=now - timedelta(days=60, minutes=i), return_date=now - timedelta(days=30, minutes=i),
+            )
+            for i, book in enumerate(books)
+        ] + [
+            Borrowing(book=book, user=book.borrowed_by_user, borrow_date=now - timedelta(minutes=i))
+            for i, book in enumerate(books) if book.status == 'borrowed'
+        ], batch_size=2000)
+        cls.shelf = shelves[0]
+        cls.user = users[0]
+        cls.book = books[0]
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Book._meta.db_table}, {Borrowing._meta.db_table}")
+
+    def endpoint_plans(self, method, path, table):
+        """Return the plans of the queries on table that a request runs, as the endpoint issues them."""
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        for query in queries.captured_queries:
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN {query['sql']}")
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans, f"{path} ran no query on {table}")
+        return plans
+
+    def page_plans(self, queryset):
+        """Return the plans of the first page and of the page after it, as paginate() runs them."""
+        plans = []
+
+        def explain(page):
+            plans.append(page.explain())
+            return list(page)
+        _, cursor = paginate(queryset, 50, serialize=explain)
+        paginate(queryset, 50, cursor, serialize=explain)
+        return plans
+
+    def assertUsesIndex(self, plan, *indexes):
+        self.assertTrue(any(index in plan for index in indexes), f"None of {indexes} in:\n{plan}")
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_default_book_listings(self):
+        cases = (
+            ('/api/books/', 'book_listing_order_idx'),
+            (f'/api/books/?shelf_id={self.shelf.id}', 'book_shelf_listing_idx'),
+            ('/api/books/storage/', 'book_storage_listing_idx'),
+            ('/api/books/by-status/', 'book_status_listing_idx'),
+        )
+        for path, index in cases:
+            with self.subTest(path=path):
+                for plan in self.endpoint_plans('get', path, Book._meta.db_table):
+                    self.assertUsesIndex(plan, index)
+
+    def test_default_borrowing_listings(self):
+        # Unpaginated reads of a user's or of the open loans may bitmap-scan the
+        # narrower partial index and sort; either index keeps them off a seq scan
+        cases = (
+            ('/api/borrowings/', ('borrowing_listing_order_idx',)),
+            ('/api/borrowings/?is_returned=false', ('borrowing_active_listing_idx', 'unique_active_borrowing_per_book')),
+            (f'/api/borrowings/?user_id={self.user.id}', ('borrowing_user_listing_idx', 'borrowing_user_return_idx')),
+        )
+        for path, indexes in cases:
+            with self.subTest(path=path):
+                for plan in self.endpoint_plans('get', path, Borrowing._meta.db_table):
+                    self.assertUsesIndex(plan, *indexes)
+
+    def test_return_finds_the_open_loan_by_index(self):
+        for plan in self.endpoint_plans('post', f'/api/books/{self.book.id}/return/', Borrowing._meta.db_table):
+            self.assertUsesIndex(plan, 'unique_active_borrowing_per_book')
+
+    def test_keyset_pages(self):
+        cases = (
+            (Book.objects.all(), 'book_listing_order_idx'),
+            (Book.objects.filter(status='borrowed'), 'book_status_listing_idx'),
+            (Book.objects.filter(shelf=self.shelf), 'book_shelf_listing_idx'),
+            (Book.objects.filter(shelf__isnull=True), 'book_storage_listing_idx'),
+            (Borrowing.objects.filter(return_date__isnull=True), 'borrowing_active_listing_idx'),
+            (Borrowing.objects.filter(user=self.user), 'borrowing_user_listing_idx'),
+        )
+        for queryset, index in cases:
+            for plan in self.page_plans(queryset):
+                with self.subTest(index=index):
+                    self.assertUsesIndex(plan, index)
@@ -0,0 +1,71 @@
+"""Library -> Bookshelf -> Shelf tree with per-node book counts."""
+from django.db.models import Prefetch
+
+from apps.bookshelves.models import Bookshelf
+from apps.libraries.models import COUNTED_STATUSES, Library
+from apps.shelves.models import Shelf
+
+MAX_TREE_DEPTH = 3
+
+
+def _book_counts(node):
+    """Read the stored counts kept in step with book writes (see BookCounts)."""
+    counts = {status: getattr(node, f'{status}_book_count') for status in COUNTED_STATUSES}
+    counts['total'] = node.book_count
+    return counts
+
+
+def _shelf_node(shelf):
+    return {
+        'id': shelf.id,
+        'name': shelf.name,
+        'short_description': shelf.short_description,
+        'order': shelf.order,
+        'book_counts': _book_counts(shelf),
+    }
+
+
+def _bookshelf_node(bookshelf, depth):
+    node = {
+        'id': bookshelf.id,
+        'name': bookshelf.name,
+        'short_description': bookshelf.short_description,
+        'location': bookshelf.location,
+        'order': bookshelf.order,
+        'book_counts': _book_counts(bookshelf),
+    }
+    if depth > 2:
+        node['shelves'] = [_shelf_node(shelf) for shelf in bookshelf.shelves.all()]
+    return node
+
+
+def _library_node(library, depth):
+    node = {
+        'id': library.id,
+        'name': library.name,
+        'short_description': library.short_description,
+        'address': library.address,
+        'order': library.order,
+        'book_counts': _book_counts(library),
+    }
+    if depth > 1:
+        node['bookshelves'] = [_bookshelf_node(bookshelf, depth) for bookshelf in library.bookshelves.all()]
+    return node
+
+
+def _tree_queryset(library_id, depth):
+    libraries = Library.objects.all()
+    if library_id:
+        libraries = libraries.filter(id=library_id)
+    if depth > 1:
+        bookshelves = Bookshelf.objects.order_by('order', 'id')
+        libraries = libraries.prefetch_related(Prefetch('bookshelves', queryset=bookshelves))
+    if depth > 2:
+        shelves = Shelf.objects.order_by('order', 'id')
+        libraries = libraries.prefetch_related(Prefetch('bookshelves__shelves', queryset=shelves))
+    return libraries
+
+
+def library_tree(library_id=None, depth=MAX_TREE_DEPTH):
+    """Build the hierarchy down to `depth` levels in one query per level, without joining books."""
+    return [_library_node(library, depth) for library in _tree_queryset(library_id, depth)]
@@ -0,0 +1,275 @@
+"""Benchmark every API endpoint through the Django test client."""
+import json
+import logging
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from apps.books.models import Book
+from apps.bookshelves.models import Bookshelf
+from apps.borrowings.models import Borrowing
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+from apps.users.models import Department, User
+
+API_PREFIX = '/api'
+
+# Query string per read operation that needs one, keyed by view name
+READ_QUERIES = {
+    'search_books_endpoint': {'q': 'history'},
+}
+
+# Request body (and path parameter overrides) per write operation, keyed by view name.
+# Every write runs in a transaction that is rolled back, so each repeat sees the same data.
+WRITE_CASES = {
+    'create_library': lambda s: {'json': {'name': 'Benchmark Library', 'address': '1 Bench Street'}},
+    'reorder_libraries': lambda s: {'json': [{'id': s['library_id'], 'order': 0}]},
+    'update_library': lambda s: {'json': {'name': 'Benchmark Library', 'address': '1 Bench Street'}},
+    'partial_update_library': lambda s: {'json': {'phone': '0123'}},
+    'delete_library': lambda s: {},
+    'create_library_bookshelf': lambda s: {'json': {'library_id': s['library_id'], 'name': 'Benchmark'}},
+    'create_bookshelf': lambda s: {'json': {'library_id': s['library_id'], 'name': 'Benchmark'}},
+    'reorder_bookshelves': lambda s: {'json': [{'id': s['bookshelf_id'], 'order': 0}]},
+    'update_bookshelf': lambda s: {'json': {'name': 'Benchmark'}},
+    'partial_update_bookshelf': lambda s: {'json': {'location': 'Aisle 0'}},
+    'delete_bookshelf': lambda s: {},
+    'create_bookshelf_shelf': lambda s: {'json': {'name': 'Benchmark'}},
+    'create_shelf': lambda s: {'json': {'name': 'Benchmark', 'bookshelf_id': s['bookshelf_id']}},
+    'reorder_shelves': lambda s: {'json': [{'id': s['shelf_id'], 'order': 0}]},
+    'update_shelf': lambda s: {'json': {'name': 'Benchmark', 'bookshelf_id': s['bookshelf_id']}},
+    'delete_shelf': lambda s: {},
+    'create_book': lambda s: {'json': {'title': 'Benchmark', 'shelf_id': s['shelf_id']}},
+    'import_books_file': lambda s: {'files': {'file': SimpleUploadedFile(
+        'books.ndjson', b''.join(b'{"title": "Benchmark %d"}\n' % i for i in range(100)),
+    )}},
+    'create_shelf_book': lambda s: {'json': {'title': 'Benchmark'}},
+    'update_book': lambda s: {'json': {'title': 'Benchmark', 'shelf_id': s['shelf_id']}},
+    'delete_book': lambda s: {},
+    'move_book': lambda s: {'json': {'shelf_id': None, 'status': 'storage'}},
+    'create_user': lambda s: {'json': {'full_name': 'Benchmark User'}},
+    'update_user': lambda s: {'json': {'full_name': 'Benchmark User'}},
+    'delete_user': lambda s: {},
+    'create_department': lambda s: {'json': {'name': 'Benchmark Department'}},
+    'create_borrowing': lambda s: {'json': {'book_id': s['book_id'], 'user_id': s['user_id']}},
+    'bulk_borrow_books': lambda s: {'json': {'user_id': s['user_id'], 'book_ids': s['library_book_ids']}},
+    'bulk_return_books': lambda s: {'json': {'book_ids': s['borrowed_book_ids']}},
+    'update_borrowing': lambda s: {'json': {'book_id': s['borrowed_book_id'], 'user_id': s['user_id']}},
+    'delete_borrowing': lambda s: {},
+    'return_book': lambda s: {'json': {}},
+    'borrow_book': lambda s: {'json': {}},
+    'return_book_simple': lambda s: {'params': {'book_id': s['borrowed_book_id']}, 'json': {}},
+}
+
+
+def sample_ids():
+    """Pick representative rows to fill path parameters and payloads."""
+    shelf = Shelf.objects.filter(books__status='library').select_related('bookshelf').order_by('id').first()
+    open_borrowings = list(
+        Borrowing.objects.filter(return_date__isnull=True).order_by('id').values_list('id', 'book_id')[:20]
+    )
+    samples = {
+        'library_id': shelf and shelf.bookshelf.library_id,
+        'bookshelf_id': shelf and shelf.bookshelf_id,
+        'shelf_id': shelf and shelf.id,
+        'book_id': Book.objects.filter(shelf=shelf, status='library').order_by('id').values_list('id', flat=True).first(),
+        'library_book_ids': list(Book.objects.filter(status='library').order_by('id').values_list('id', flat=True)[:20]),
+        'user_id': User.objects.order_by('id').values_list('id', flat=True).first(),
+        'department_id': Department.objects.order_by('id').values_list('id', flat=True).first(),
+        'borrowing_id': open_borrowings[0][0] if open_borrowings else None,
+        'borrowed_book_id': open_borrowings[0][1] if open_borrowings else None,
+        'borrowed_book_ids': [book_id for _, book_id in open_borrowings],
+    }
+    missing = [name for name, value in samples.items() if not value]
+    if missing:
+        raise CommandError(f"Not enough data to benchmark ({', '.join(missing)}); run generate_dataset first")
+    return samples
+
+
+def discover_operations():
+    """Yield (method, path template, view name) for every API operation."""
+    from library_monitor.urls import api
+
+    for prefix, router in api._routers:
+        for path, path_view in router.path_operations.items():
+            for operation in path_view.operations:
+                for method in operation.methods:
+                    yield method, API_PREFIX + prefix + path, operation.view_func.__name__
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Call every API endpoint through the Django test client and record latency, "
+        "query count and peak memory as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help="Timed calls per endpoint")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed calls per endpoint")
+        parser.add_argument('--only', action='append', default=[], metavar='VIEW',
+                            help="Benchmark only these view names (repeatable)")
+        parser.add_argument('--skip', action='append', default=[], metavar='VIEW',
+                            help="Skip these view names (repeatable)")
+        parser.add_argument('--reads-only', action='store_true', help="Skip write endpoints")
+        parser.add_argument('--response-cache', action='store_true',
+                            help="Keep the response cache on (off by default so every call hits the view)")
+        parser.add_argument('--output', help="Write results to this JSON file")
+        parser.add_argument('--compare', help="Baseline JSON file to compare the results with")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        baseline = None
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+
+        # Error responses are recorded in the results; the per-call log lines are noise
+        for name in ('django', 'django.request'):
+            logging.getLogger(name).setLevel(logging.CRITICAL)
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            RESPONSE_CACHE_ENABLED=options['response_cache'],
+        ):
+            samples = sample_ids()
+            client = Client()
+            results, skipped = {}, {}
+            for method, template, view in discover_operations():
+                if (options['only'] and view not in options['only']) or view in options['skip']:
+                    continue
+                name = f"{method} {template}"
+                if method != 'GET':
+                    if options['reads_only']:
+                        continue
+                    if view not in WRITE_CASES:
+                        skipped[name] = "no payload defined"
+                        continue
+                results[name] = self.benchmark(client, method, template, view, samples, options)
+                self.stdout.write(self.format_row(name, results[name]))
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "repeat": options['repeat'],
+                "response_cache": options['response_cache'],
+                "rows": {
+                    model.__name__: model.objects.count()
+                    for model in (Library, Bookshelf, Shelf, Book, User, Borrowing)
+                },
+            },
+            "results": results,
+            "skipped": skipped,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        for name, reason in skipped.items():
+            self.stdout.write(self.style.WARNING(f"Skipped {name}: {reason}"))
+        if baseline:
+            self.compare(baseline, report)
+
+    def request(self, client, method, template, view, samples):
+        """Issue one request; writes are rolled back afterwards."""
+        case = WRITE_CASES[view](samples) if method != 'GET' else {}
+        path = template.format(**{**samples, **case.get('params', {})})
+        if 'files' in case:
+            kwargs = {'data': case['files']}
+        elif 'json' in case:
+            kwargs = {'data': json.dumps(case['json']), 'content_type': 'application/json'}
+        else:
+            kwargs = {}
+        if method == 'GET':
+            return self.consume(client.get(path, READ_QUERIES.get(view)))
+        with transaction.atomic():
+            response = self.consume(getattr(client, method.lower())(path, **kwargs))
+            transaction.set_rollback(True)
+        return response
+
+    def consume(self, response):
+        """Read the full body so streamed responses are timed end to end."""
+        if response.streaming:
+            response.body_size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            response.body_size = len(response.content)
+        return response
+
+    def benchmark(self, client, method, template, view, samples, options):
+        for _ in range(options['warmup']):
+            self.request(client, method, template, view, samples)
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            self.request(client, method, template, view, samples)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        # Queries and memory come from one extra call so tracing does not skew the timings
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.request(client, method, template, view, samples)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        ms = lambda value: round(value * 1000, 3)
+        return {
+            "view": view,
+            "status": response.status_code,
+            "response_bytes": response.body_size,
+            "queries": len(queries),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "latency_ms": {
+                "min": ms(timings[0]),
+                "median": ms(statistics.median(timings)),
+                "p95": ms(_percentile(timings, 0.95)),
+                "max": ms(timings[-1]),
+            },
+        }
+
+    def format_row(self, name, result):
+        return (
+            f"{name:<55} {result['status']:>4} {result['latency_ms']['median']:>10.2f} ms "
+            f"{result['queries']:>4} q {result['peak_memory_kb']:>10.1f} KiB"
+        )
+
+    def compare(self, baseline, report):
+        """Print the change in median latency and query count against a baseline run."""
+        self.stdout.write(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+        for name, result in report['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<55} new")
+                continue
+            old, new = before['latency_ms']['median'], result['latency_ms']['median']
+            change = (new - old) / old * 100 if old else 0.0
+            line = f"{name:<55} {old:>10.2f} -> {new:>10.2f} ms ({change:+.0f}%)"
+            if before['queries'] != result['queries']:
+                line += f"  queries {before['queries']} -> {result['queries']}"
+            style = self.style.ERROR if change > 20 else self.style.SUCCESS if change < -20 else str
+            self.stdout.write(style(line))
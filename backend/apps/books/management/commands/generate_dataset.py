@@ -0,0 +1,198 @@
+"""Generate a large synthetic catalog for performance work."""
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.reorder import ORDER_GAP, next_order
+from apps.books.models import Book, BookStatusCounter, rebuild_book_counts
+from apps.bookshelves.models import Bookshelf
+from apps.borrowings.models import Borrowing, analytics_bucket, bucket_label
+from apps.changes.models import mark_changed, mark_labels_changed
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+from apps.users.models import Department, User
+
+WORDS = (
+    "history science garden river mountain silent shadow winter summer ocean city night "
+    "empire machine language music theory journey forest island secret letter kingdom "
+    "modern ancient world light stone glass memory future dream storm harbor map atlas "
+    "python data design network economy medicine poetry philosophy art war peace family"
+).split()
+FIRST_NAMES = "Anna Minh Lan Huy John Maria Kenji Sofia Omar Linh Peter Chen Ava Lucas Mai Tuan".split()
+LAST_NAMES = "Nguyen Tran Le Pham Smith Garcia Tanaka Rossi Khan Brown Wang Muller Hoang Vu".split()
+DEPARTMENTS = ["Engineering", "Sales", "Finance", "Research", "Operations", "Marketing", "Legal", "Support"]
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights where item i is 1/(i+1)**exponent as likely as the first."""
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def spread(total, weights, minimum=1):
+    """Split total into len(weights) integer parts proportional to the weights."""
+    ranked = [b - a for a, b in zip([0] + weights[:-1], weights)]
+    scale = sum(ranked)
+    parts = [max(minimum, int(total * weight / scale)) for weight in ranked]
+    parts[0] += total - sum(parts) if total > sum(parts) else 0
+    return parts
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate libraries, bookshelves, shelves, books, users and borrowings with "
+        "skewed (Zipf) distributions using bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--libraries', type=int, default=10)
+        parser.add_argument('--bookshelves', type=int, default=200, help="Total, skewed towards the first libraries")
+        parser.add_argument('--shelves', type=int, default=1000, help="Total, spread over bookshelves")
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--borrowings', type=int, default=200_000, help="Returned borrowings (history)")
+        parser.add_argument('--storage-ratio', type=float, default=0.15, help="Share of books in storage")
+        parser.add_argument('--borrowed-ratio', type=float, default=0.10, help="Share of books currently borrowed")
+        parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent for popularity skew")
+        parser.add_argument('--batch-size', type=int, default=5_000, help="Rows per bulk insert transaction")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='Synthetic', help="Library name prefix, must be unused")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.buckets = set()
+        if Library.objects.filter(name__startswith=f"{options['prefix']} Library ").exists():
+            raise CommandError(f"Libraries prefixed '{options['prefix']}' already exist; pass another --prefix")
+        if options['storage_ratio'] + options['borrowed_ratio'] > 1:
+            raise CommandError("--storage-ratio and --borrowed-ratio must add up to at most 1")
+
+        shelf_ids = self.create_structure(options)
+        user_ids = self.create_users(options)
+        books = self.create_books(options, shelf_ids, user_ids)
+        self.create_history(options, books, user_ids)
+
+        BookStatusCounter.rebuild()
+        rebuild_book_counts()
+        with transaction.atomic():
+            mark_changed(Library, Bookshelf, Shelf, Book, Borrowing, User, Department)
+            mark_labels_changed(*(bucket_label(bucket) for bucket in self.buckets))
+        self.stdout.write(self.style.SUCCESS("Dataset generated"))
+
+    def create_structure(self, options):
+        first_order = next_order(Library)
+        libraries = Library.objects.bulk_create([
+            Library(name=f"{options['prefix']} Library {i + 1}", address=f"{i + 1} {self.rng.choice(WORDS).title()} Street", order=first_order + i * ORDER_GAP)
+            for i in range(options['libraries'])
+        ])
+        per_library = spread(options['bookshelves'], zipf_weights(len(libraries), options['skew']))
+        bookshelves = Bookshelf.objects.bulk_create([
+            Bookshelf(library=library, name=f"Bookshelf {j + 1}", location=f"Aisle {j // 4 + 1}", order=(j + 1) * ORDER_GAP)
+            for library, count in zip(libraries, per_library)
+            for j in range(count)
+        ], batch_size=self.batch_size)
+        per_bookshelf = spread(options['shelves'], zipf_weights(len(bookshelves), 0))
+        shelves = Shelf.objects.bulk_create([
+            Shelf(bookshelf=bookshelf, name=f"Shelf {k + 1}", order=(k + 1) * ORDER_GAP)
+            for bookshelf, count in zip(bookshelves, per_bookshelf)
+            for k in range(count)
+        ], batch_size=self.batch_size)
+        self.stdout.write(f"{len(libraries)} libraries, {len(bookshelves)} bookshelves, {len(shelves)} shelves")
+        self.shelf_libraries = {shelf.id: shelf.bookshelf.library_id for shelf in shelves}
+        return [shelf.id for shelf in shelves]
+
+    def create_users(self, options):
+        Department.objects.bulk_create([Department(name=name) for name in DEPARTMENTS], ignore_conflicts=True)
+        user_ids = []
+        for start in range(0, options['users'], self.batch_size):
+            count = min(self.batch_size, options['users'] - start)
+            users = User.objects.bulk_create([
+                User(
+                    full_name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {start + i + 1}",
+                    dob=date(1960, 1, 1) + timedelta(days=self.rng.randrange(365 * 45)),
+                    gender=self.rng.choice('MFO'),
+                    department=self.rng.choice(DEPARTMENTS),
+                )
+                for i in range(count)
+            ])
+            user_ids.extend(user.id for user in users)
+        self.stdout.write(f"{len(user_ids)} users")
+        return user_ids
+
+    def create_books(self, options, shelf_ids, user_ids):
+        rng = self.rng
+        # Shelves hold a bounded number of books, so placement is skewed less than popularity
+        shelf_weights = zipf_weights(len(shelf_ids), options['skew'] / 2)
+        rng.shuffle(shelf_ids)
+        user_weights = zipf_weights(len(user_ids), options['skew'])
+        now = timezone.now()
+        # (book id, library of the shelf it was placed on or checked out from)
+        created = []
+        while len(created) < options['books']:
+            count = min(self.batch_size, options['books'] - len(created))
+            shelves = rng.choices(shelf_ids, cum_weights=shelf_weights, k=count)
+            books, libraries = [], []
+            for shelf_id in shelves:
+                roll = rng.random()
+                book = Book(
+                    title=' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+                    author=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    year=date(rng.randint(1900, 2025), 1, 1),
+                    date_format='year',
+                    short_description=' '.join(rng.choices(WORDS, k=8)),
+                )
+                if roll < options['borrowed_ratio']:
+                    book.status = 'borrowed'
+                    book.borrowed_from_shelf_id = shelf_id
+                    book.borrowed_by_user_id = rng.choices(user_ids, cum_weights=user_weights)[0]
+                    book.borrow_date = now - timedelta(days=rng.randrange(60), seconds=rng.randrange(86400))
+                elif roll < options['borrowed_ratio'] + options['storage_ratio']:
+                    book.status = 'storage'
+                else:
+                    book.status = 'library'
+                    book.shelf_id = shelf_id
+                books.append(book)
+                libraries.append(None if book.status == 'storage' else self.shelf_libraries[shelf_id])
+            with transaction.atomic():
+                Book.objects.bulk_create(books)
+                borrowings = Borrowing.objects.bulk_create([
+                    Borrowing(
+                        book_id=book.id, user_id=book.borrowed_by_user_id, library_id=library_id,
+                        borrow_date=book.borrow_date,
+                    )
+                    for book, library_id in zip(books, libraries) if book.status == 'borrowed'
+                ])
+            self.buckets.update(analytics_bucket(borrowing.borrow_date) for borrowing in borrowings)
+            created.extend((book.id, library_id) for book, library_id in zip(books, libraries))
+            self.stdout.write(f"{len(created)} books")
+        return created
+
+    def create_history(self, options, books, user_ids):
+        rng = self.rng
+        if not books or not user_ids:
+            return
+        user_weights = zipf_weights(len(user_ids), options['skew'])
+        now = timezone.now()
+        created = 0
+        while created < options['borrowings']:
+            count = min(self.batch_size, options['borrowings'] - created)
+            borrowings = []
+            for _ in range(count):
+                borrowed = now - timedelta(days=rng.randrange(60, 3 * 365), seconds=rng.randrange(86400))
+                # Books created first are the popular titles
+                book_id, library_id = books[int((len(books) - 1) * rng.random() ** (1 + options['skew']))]
+                borrowings.append(Borrowing(
+                    book_id=book_id,
+                    library_id=library_id,
+                    user_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+                    borrow_date=borrowed,
+                    return_date=borrowed + timedelta(days=rng.randint(1, 45)),
+                ))
+            with transaction.atomic():
+                Borrowing.objects.bulk_create(borrowings)
+            self.buckets.update(analytics_bucket(borrowing.borrow_date) for borrowing in borrowings)
+            created += count
+            self.stdout.write(f"{created} returned borrowings")
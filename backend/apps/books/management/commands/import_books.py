@@ -0,0 +1,28 @@
+"""Bulk-import books from a CSV or NDJSON file."""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, InvalidImportFile, import_books, import_format
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or NDJSON file using chunked bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file to import")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="Rows per transaction")
+
+    def handle(self, *args, **options):
+        fmt = import_format(options['format'], options['path'])
+        if fmt is None:
+            raise CommandError("Cannot infer the format from the file name; pass --format")
+        with open(options['path'], 'rb') as stream:
+            try:
+                report = import_books(stream, fmt, chunk_size=options['chunk_size'])
+            except InvalidImportFile as e:
+                raise CommandError(str(e))
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {'; '.join(error['errors'])}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... {report.failed - len(report.errors)} more failed rows not shown")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report.created} books, {report.failed} failed"))
@@ -0,0 +1,51 @@
+"""Rebuild book status counters and container book counts from the Book table."""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.books.models import BookStatusCounter, rebuild_book_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild global and per-library book status counters and the book counts of "
+        "shelves, bookshelves and libraries, each with a single GROUP BY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Only report status counters and shelves, bookshelves and libraries whose counts drifted")
+
+    @staticmethod
+    def describe(counter):
+        scope = f"library {counter.library_id}" if counter.library_id else "global"
+        stats = counter.as_stats()
+        return (
+            f"{scope}: storage={stats['storage']} library={stats['library']} "
+            f"borrowed={stats['borrowed']} total={stats['total']}"
+        )
+
+    def handle(self, *args, **options):
+        drifted = 0
+        if options['verify']:
+            for stored, expected in BookStatusCounter.drifted():
+                drifted += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Status counter drifted: stored {self.describe(stored)}, expected {self.describe(expected)}"
+                ))
+        else:
+            counters = BookStatusCounter.rebuild()
+            for counter in counters:
+                self.stdout.write(self.describe(counter))
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(counters)} counter rows"))
+
+        drift = rebuild_book_counts(fix=not options['verify'])
+        for model, ids in drift.items():
+            drifted += len(ids)
+            if ids:
+                shown = ', '.join(str(row_id) for row_id in ids[:20]) + (' ...' if len(ids) > 20 else '')
+                self.stdout.write(self.style.WARNING(f"{model.__name__}: {len(ids)} drifted ({shown})"))
+        if options['verify']:
+            if drifted:
+                raise CommandError(f"{drifted} rows with drifted counts")
+            self.stdout.write(self.style.SUCCESS("Book counts match the Book table"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed book counts of {drifted} rows"))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.8 on 2026-10-17 03:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+
+
+def populate_counters(apps, schema_editor):
+    """Seed counters from existing books with a single GROUP BY."""
+    Book = apps.get_model('books', 'Book')
+    BookStatusCounter = apps.get_model('books', 'BookStatusCounter')
+    grouped = (
+        Book.objects.order_by()
+        .values_list('shelf__bookshelf__library_id', 'status')
+        .annotate(count=models.Count('id'))
+    )
+    counters = {None: BookStatusCounter(library_id=None)}
+    for library_id, status, count in grouped:
+        for scope in {None, library_id}:
+            counter = counters.setdefault(scope, BookStatusCounter(library_id=scope))
+            field = f'{status}_count'
+            setattr(counter, field, getattr(counter, field) + count)
+    BookStatusCounter.objects.bulk_create(counters.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0001_initial'),
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage_count', models.IntegerField(default=0)),
+                ('library_count', models.IntegerField(default=0)),
+                ('borrowed_count', models.IntegerField(default=0)),
+                ('library', models.ForeignKey(blank=True, help_text='Library these counts belong to (empty for the global row)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='book_status_counters', to='libraries.library')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bookstatuscounter',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('library', models.Value(0)), name='unique_book_status_counter_scope'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Full-text search backend for books
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    CREATE OR REPLACE FUNCTION books_book_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.author, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.short_description, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(NEW.long_description, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER books_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, author, short_description, long_description
+    ON books_book FOR EACH ROW EXECUTE FUNCTION books_book_search_vector_update();
+    """,
+    # Fire the trigger once for existing rows
+    "UPDATE books_book SET title = title;",
+    "CREATE INDEX books_book_search_vector_gin ON books_book USING gin (search_vector);",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS books_book_search_vector_gin;",
+    "DROP TRIGGER IF EXISTS books_book_search_vector_trigger ON books_book;",
+    "DROP FUNCTION IF EXISTS books_book_search_vector_update();",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE books_book_fts USING fts5(
+        title, author, short_description, long_description,
+        content='books_book', content_rowid='id'
+    );
+    """,
+    """
+    CREATE TRIGGER books_book_fts_insert AFTER INSERT ON books_book BEGIN
+        INSERT INTO books_book_fts(rowid, title, author, short_description, long_description)
+        VALUES (new.id, new.title, new.author, new.short_description, new.long_description);
+    END;
+    """,
+    """
+    CREATE TRIGGER books_book_fts_delete AFTER DELETE ON books_book BEGIN
+        INSERT INTO books_book_fts(books_book_fts, rowid, title, author, short_description, long_description)
+        VALUES ('delete', old.id, old.title, old.author, old.short_description, old.long_description);
+    END;
+    """,
+    """
+    CREATE TRIGGER books_book_fts_update
+    AFTER UPDATE OF title, author, short_description, long_description ON books_book BEGIN
+        INSERT INTO books_book_fts(books_book_fts, rowid, title, author, short_description, long_description)
+        VALUES ('delete', old.id, old.title, old.author, old.short_description, old.long_description);
+        INSERT INTO books_book_fts(rowid, title, author, short_description, long_description)
+        VALUES (new.id, new.title, new.author, new.short_description, new.long_description);
+    END;
+    """,
+    "INSERT INTO books_book_fts(books_book_fts) VALUES ('rebuild');",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS books_book_fts_update;",
+    "DROP TRIGGER IF EXISTS books_book_fts_delete;",
+    "DROP TRIGGER IF EXISTS books_book_fts_insert;",
+    "DROP TABLE IF EXISTS books_book_fts;",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_backend(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def drop_search_backend(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_status_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.8 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-created_at', 'title', 'id'], name='book_listing_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status', '-created_at', 'title', 'id'], name='book_status_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['shelf', '-created_at', 'title', 'id'], name='book_shelf_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('shelf__isnull', True)), fields=['-created_at', 'title', 'id'], name='book_storage_listing_idx'),
+        ),
+    ]
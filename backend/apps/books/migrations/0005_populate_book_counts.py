@@ -0,0 +1,44 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:05
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+COUNT_FIELDS = ('book_count', 'storage_book_count', 'library_book_count', 'borrowed_book_count')
+
+
+def populate_book_counts(apps, schema_editor):
+    """Seed shelf, bookshelf and library book counts with a single GROUP BY."""
+    Book = apps.get_model('books', 'Book')
+    containers = [apps.get_model(*label) for label in (
+        ('shelves', 'Shelf'), ('bookshelves', 'Bookshelf'), ('libraries', 'Library'),
+    )]
+    per_shelf = defaultdict(dict)
+    for shelf_id, status, count in (
+        Book.objects.filter(shelf__isnull=False).order_by()
+        .values_list('shelf_id', 'status').annotate(count=models.Count('id'))
+    ):
+        per_shelf[shelf_id][status] = count
+    counts = [defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0)) for _ in containers]
+    for chain in containers[0].objects.values_list('id', 'bookshelf_id', 'bookshelf__library_id'):
+        for level, row_id in enumerate(chain):
+            for status, count in per_shelf.get(chain[0], {}).items():
+                counts[level][row_id][f'{status}_book_count'] += count
+                counts[level][row_id]['book_count'] += count
+    for model, rows in zip(containers, counts):
+        objs = [model(id=row_id, **values) for row_id, values in rows.items()]
+        model.objects.bulk_update(objs, COUNT_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_hot_query_indexes'),
+        ('libraries', '0003_book_counts'),
+        ('bookshelves', '0003_book_counts'),
+        ('shelves', '0003_book_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_book_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0005_remove_shelf_storage_book_count'),
+        ('books', '0005_populate_book_counts'),
+    ]
+
+    # Loans made before this field existed have no recorded shelf; they stay
+    # uncounted on containers (as before) until they are returned
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='borrowed_from_shelf',
+            field=models.ForeignKey(blank=True, help_text='Shelf the book was checked out from, while it is on loan', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lent_books', to='shelves.shelf'),
+        ),
+    ]
@@ -1,5 +1,13 @@
 """Models for books app."""
-from django.db import models
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from apps.bookshelves.models import Bookshelf
+from apps.changes.models import mark_changed
+from apps.libraries.models import BOOK_COUNT_FIELDS, Library
 from apps.shelves.models import Shelf
 from apps.users.models import User
 
@@ -30,11 +38,50 @@ class Book(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='storage', help_text="Book status/location")
     borrowed_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='borrowed_books', null=True, blank=True, help_text="User who borrowed the book")
     borrow_date = models.DateTimeField(blank=True, null=True, help_text="Date when the book was borrowed")
+    borrowed_from_shelf = models.ForeignKey(Shelf, on_delete=models.SET_NULL, related_name='lent_books', null=True, blank=True, help_text="Shelf the book was checked out from, while it is on loan")
+    # Weighted tsvector over title/author/descriptions. On Postgres a trigger and a GIN
+    # index from migration 0003 maintain it; on SQLite an FTS5 table is used instead.
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at', 'title']
+        indexes = [
+            # Default listing order, with the id tiebreak used by keyset pagination
+            models.Index(fields=['-created_at', 'title', 'id'], name='book_listing_order_idx'),
+            models.Index(fields=['status', '-created_at', 'title', 'id'], name='book_status_listing_idx'),
+            models.Index(fields=['shelf', '-created_at', 'title', 'id'], name='book_shelf_listing_idx'),
+            # list_storage_books: books not on any shelf
+            models.Index(
+                fields=['-created_at', 'title', 'id'],
+                condition=models.Q(shelf__isnull=True),
+                name='book_storage_listing_idx',
+            ),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded status/counted shelf so save() can update the status counters."""
+        instance = super().from_db(db, field_names, values)
+        instance._counted_state = instance._current_counted_state()
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """Reload, and forget the loaded counted state if it may have changed."""
+        super().refresh_from_db(using, fields, **kwargs)
+        self._counted_state = self._current_counted_state() if fields is None else None
+    
+    def _current_counted_state(self):
+        """Return (status, counted shelf id) if the fields are loaded, else None."""
+        if any(name not in self.__dict__ for name in ('status', 'shelf_id', 'borrowed_from_shelf_id')):
+            return None
+        return (self.status, self.counted_shelf_id)
+    
+    @property
+    def counted_shelf_id(self):
+        """Return the shelf this book is counted on: its own, or the one it was lent from."""
+        return self.shelf_id if self.shelf_id is not None else self.borrowed_from_shelf_id
     
     @property
     def borrowed_by_user_id(self):
@@ -46,12 +93,251 @@ class Book(models.Model):
         """Return the name of the user who borrowed this book."""
         return self.borrowed_by_user.full_name if self.borrowed_by_user else None
     
+    @staticmethod
+    def derive_status(status, shelf_id):
+        """Return the stored status: 'borrowed' is kept, otherwise it follows the shelf."""
+        if status == 'borrowed':
+            return status
+        return 'library' if shelf_id else 'storage'
+    
     def save(self, *args, **kwargs):
         """Override save to automatically set status based on shelf_id."""
-        # If status is not 'borrowed', determine it based on shelf
+        self.status = self.derive_status(self.status, self.shelf_id)
         if self.status != 'borrowed':
-            self.status = 'library' if self.shelf_id else 'storage'
-        super().save(*args, **kwargs)
+            self.borrowed_from_shelf_id = None
+        with transaction.atomic():
+            if self._state.adding:
+                old_state = None
+            else:
+                old_state = getattr(self, '_counted_state', None)
+                if old_state is None:
+                    old_state = Book.objects.filter(pk=self.pk).values_list('status', counted_shelf()).first()
+            super().save(*args, **kwargs)
+            new_state = (self.status, self.counted_shelf_id)
+            BookStatusCounter.record_change(old_state, new_state)
+            apply_book_count_deltas(book_count_deltas(old_state, new_state))
+        self._counted_state = new_state
     
     def __str__(self):
         return f"{self.title} by {self.author}"
+
+
+class BookStatusCounter(models.Model):
+    """Book counts by status, globally (library=None) and per library.
+    
+    Loans count in the library they were checked out from, as on BookCounts.
+    Kept in step with Book writes so /books/stats/ reads one row instead of
+    counting the Book table. Rebuild with `manage.py reconcile_book_counters`.
+    """
+    
+    library = models.ForeignKey(Library, on_delete=models.CASCADE, related_name='book_status_counters', null=True, blank=True, help_text="Library these counts belong to (empty for the global row)")
+    storage_count = models.IntegerField(default=0)
+    library_count = models.IntegerField(default=0)
+    borrowed_count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Coalesce('library', Value(0)), name='unique_book_status_counter_scope'),
+        ]
+    
+    @property
+    def total_count(self):
+        return self.storage_count + self.library_count + self.borrowed_count
+    
+    def as_stats(self):
+        """Return counts in the /books/stats/ response shape."""
+        return {
+            "storage": self.storage_count,
+            "library": self.library_count,
+            "borrowed": self.borrowed_count,
+            "total": self.total_count,
+        }
+    
+    @classmethod
+    def for_scope(cls, library_id=None):
+        """Return the counter row for a library (or the global row), or None if absent."""
+        return cls.objects.filter(library_id=library_id).first()
+    
+    @staticmethod
+    def _library_id(shelf_id):
+        if shelf_id is None:
+            return None
+        return Shelf.objects.filter(id=shelf_id).values_list('bookshelf__library_id', flat=True).first()
+    
+    @classmethod
+    def record_change(cls, old_state, new_state):
+        """Apply a book moving from old_state to new_state, each (status, counted shelf id) or None."""
+        if old_state == new_state:
+            return
+        deltas = {}
+        for state, delta in ((old_state, -1), (new_state, 1)):
+            if state is None:
+                continue
+            status, shelf_id = state
+            for library_id in {None, cls._library_id(shelf_id)}:
+                key = (library_id, status)
+                deltas[key] = deltas.get(key, 0) + delta
+        cls.apply_deltas(deltas)
+    
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Increment counters by {(library_id or None, status): delta} using F() updates."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        for (library_id, status), delta in deltas.items():
+            field = f'{status}_count'
+            rows = cls.objects.filter(library_id=library_id)
+            if not rows.update(**{field: F(field) + delta}):
+                cls.objects.get_or_create(library_id=library_id)
+                rows.update(**{field: F(field) + delta})
+        mark_changed(cls)
+    
+    @classmethod
+    def expected(cls):
+        """Return unsaved counter rows recounted from the Book table with a single GROUP BY."""
+        grouped = (
+            Book.objects.order_by()
+            .values_list(counted_shelf('__bookshelf__library_id'), 'status')
+            .annotate(count=models.Count('id'))
+        )
+        counters = {None: cls(library_id=None)}
+        for library_id, status, count in grouped:
+            for scope in {None, library_id}:
+                counter = counters.setdefault(scope, cls(library_id=scope))
+                field = f'{status}_count'
+                setattr(counter, field, getattr(counter, field) + count)
+        return counters
+    
+    @classmethod
+    def drifted(cls):
+        """Return [(stored, expected)] for scopes whose stored row differs from a recount.
+        
+        Both are counter rows; a missing row on either side is all zeros.
+        Nothing is written.
+        """
+        with transaction.atomic():
+            stored = {counter.library_id: counter for counter in cls.objects.select_for_update()}
+            expected = cls.expected()
+        drift = []
+        for scope in sorted(stored.keys() | expected.keys(), key=lambda scope: (scope is not None, scope)):
+            have = stored.get(scope) or cls(library_id=scope)
+            want = expected.get(scope) or cls(library_id=scope)
+            if have.as_stats() != want.as_stats():
+                drift.append((have, want))
+        return drift
+    
+    @classmethod
+    def rebuild(cls):
+        """Recount every scope from the Book table with a single GROUP BY."""
+        counters = cls.expected()
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(counters.values())
+            mark_changed(cls)
+        return list(counters.values())
+
+
+def counted_shelf(path='_id'):
+    """Follow path from a book's counted shelf: its own, or the one it was lent from."""
+    return Coalesce(f'shelf{path}', f'borrowed_from_shelf{path}')
+
+
+# Models carrying BookCounts columns, each with its id column on a (shelf, bookshelf, library) chain
+BOOK_COUNT_MODELS = (Shelf, Bookshelf, Library)
+
+
+def book_count_deltas(old_state, new_state):
+    """Return {(shelf_id, status): delta} for a book moving from old_state to new_state.
+    
+    States are (status, counted shelf id) or None; books without one are not counted.
+    """
+    deltas = {}
+    if old_state == new_state:
+        return deltas
+    for state, delta in ((old_state, -1), (new_state, 1)):
+        if state is not None and state[1] is not None:
+            key = (state[1], state[0])
+            deltas[key] = deltas.get(key, 0) + delta
+    return deltas
+
+
+def apply_book_count_deltas(deltas, levels=BOOK_COUNT_MODELS):
+    """Increment the book counts of shelves and their bookshelves and libraries.
+    
+    Deltas are {(shelf_id, status): delta}; only the models in levels are
+    updated. Rows getting the same increments share one F() UPDATE, so a bulk
+    move costs a few statements per level.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    chains = {
+        shelf_id: (shelf_id, bookshelf_id, library_id)
+        for shelf_id, bookshelf_id, library_id in Shelf.objects.filter(
+            id__in={shelf_id for shelf_id, _ in deltas}
+        ).values_list('id', 'bookshelf_id', 'bookshelf__library_id')
+    }
+    per_row = [defaultdict(dict) for _ in BOOK_COUNT_MODELS]
+    for (shelf_id, status), delta in deltas.items():
+        for level, row_id in enumerate(chains.get(shelf_id, ())):
+            row = per_row[level][row_id]
+            row[status] = row.get(status, 0) + delta
+    for model, rows in zip(BOOK_COUNT_MODELS, per_row):
+        if model not in levels:
+            continue
+        batches = defaultdict(list)
+        for row_id, by_status in rows.items():
+            increments = tuple(sorted((status, delta) for status, delta in by_status.items() if delta))
+            if increments:
+                batches[increments].append(row_id)
+        for increments, row_ids in batches.items():
+            values = {f'{status}_book_count': F(f'{status}_book_count') + delta for status, delta in increments}
+            total = sum(delta for _, delta in increments)
+            if total:
+                values['book_count'] = F('book_count') + total
+            model.objects.filter(id__in=sorted(row_ids)).update(**values)
+    mark_changed(*levels)
+
+
+def rebuild_book_counts(fix=True):
+    """Recount shelves, bookshelves and libraries from the Book table with one GROUP BY.
+    
+    The counter rows are locked before books are counted, so moves committed
+    meanwhile are either seen by the count or applied on top of it afterwards.
+    Returns {model: [ids whose stored counts were wrong]}; with fix=True those
+    rows are corrected with bulk_update.
+    """
+    drift = {}
+    with transaction.atomic():
+        stored = [
+            list(model.objects.select_for_update().only('id', *BOOK_COUNT_FIELDS).order_by('id'))
+            for model in BOOK_COUNT_MODELS
+        ]
+        per_shelf = defaultdict(dict)
+        for shelf_id, status, count in (
+            Book.objects.annotate(counted_shelf_id=counted_shelf()).filter(counted_shelf_id__isnull=False)
+            .order_by().values_list('counted_shelf_id', 'status').annotate(count=models.Count('id'))
+        ):
+            per_shelf[shelf_id][status] = count
+        expected = [defaultdict(lambda: dict.fromkeys(BOOK_COUNT_FIELDS, 0)) for _ in BOOK_COUNT_MODELS]
+        for chain in Shelf.objects.values_list('id', 'bookshelf_id', 'bookshelf__library_id'):
+            for level, row_id in enumerate(chain):
+                counts = expected[level][row_id]
+                for status, count in per_shelf.get(chain[0], {}).items():
+                    counts[f'{status}_book_count'] += count
+                    counts['book_count'] += count
+        
+        for model, rows, counts in zip(BOOK_COUNT_MODELS, stored, expected):
+            wrong = []
+            for row in rows:
+                values = counts[row.id]
+                if any(getattr(row, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(row, field, value)
+                    wrong.append(row)
+            drift[model] = [row.id for row in wrong]
+            if fix and wrong:
+                model.objects.bulk_update(wrong, BOOK_COUNT_FIELDS, batch_size=1000)
+                mark_changed(model)
+    return drift
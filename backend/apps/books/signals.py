@@ -0,0 +1,127 @@
+"""Signal handlers keeping book status counters and container book counts in step."""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.bookshelves.models import Bookshelf
+from apps.changes.models import mark_changed
+from apps.libraries.models import BOOK_COUNT_FIELDS, COUNTED_STATUSES, Library
+from apps.shelves.models import Shelf
+from .models import Book, BookStatusCounter, apply_book_count_deltas, book_count_deltas
+
+# Containers whose deletion cascades to their books
+BOOK_CONTAINERS = {
+    Shelf: 'shelf',
+    Bookshelf: 'shelf__bookshelf',
+    Library: 'shelf__bookshelf__library',
+}
+
+# The same paths through the shelf a book on loan was checked out from
+LENT_FROM_CONTAINERS = {
+    model: path.replace('shelf', 'borrowed_from_shelf', 1) for model, path in BOOK_CONTAINERS.items()
+}
+
+# Containers above each container whose book counts include its books
+CONTAINER_ANCESTORS = {
+    Shelf: (Bookshelf, Library),
+    Bookshelf: (Library,),
+    Library: (),
+}
+
+# Parent id lookups for containers that can be moved, as (model, lookup) from nearest
+CONTAINER_PARENTS = {
+    Shelf: ((Bookshelf, 'bookshelf_id'), (Library, 'bookshelf__library_id')),
+    Bookshelf: ((Library, 'library_id'),),
+}
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, origin=None, **kwargs):
+    """Decrement counters for a directly deleted book."""
+    if isinstance(origin, tuple(BOOK_CONTAINERS)):
+        # Handled in bulk by container_deleted
+        return
+    state = (instance.status, instance.counted_shelf_id)
+    BookStatusCounter.record_change(state, None)
+    apply_book_count_deltas(book_count_deltas(state, None))
+
+
+def _counted_books(shelf, filters):
+    """Group matching books by (shelf, library, status), following the given shelf relation."""
+    return (
+        Book.objects.filter(**filters)
+        .order_by()
+        .values_list(f'{shelf}_id', f'{shelf}__bookshelf__library_id', 'status')
+        .annotate(count=Count('id'))
+    )
+
+
+@receiver(pre_delete)
+def container_deleted(sender, instance, origin=None, **kwargs):
+    """Decrement counters once for all books cascaded from a shelf, bookshelf or library.
+    
+    Books on loan from the container are kept (their borrowed_from_shelf is
+    cleared), but no longer count in its library or on its ancestors.
+    """
+    if sender not in BOOK_CONTAINERS or instance is not origin:
+        return
+    deltas, shelf_deltas = {}, {}
+    for shelf_id, library_id, status, count in _counted_books('shelf', {BOOK_CONTAINERS[sender]: instance}):
+        scopes = {None} if sender is Library else {None, library_id}
+        for scope in scopes:
+            deltas[(scope, status)] = deltas.get((scope, status), 0) - count
+        shelf_deltas[(shelf_id, status)] = -count
+    lent = _counted_books('borrowed_from_shelf', {LENT_FROM_CONTAINERS[sender]: instance, 'shelf__isnull': True})
+    for shelf_id, library_id, status, count in lent:
+        if sender is not Library:
+            deltas[(library_id, status)] = deltas.get((library_id, status), 0) - count
+        shelf_deltas[(shelf_id, status)] = shelf_deltas.get((shelf_id, status), 0) - count
+    if lent:
+        # Their borrowed_from_shelf is cleared by an UPDATE, which sends no signals
+        mark_changed(Book)
+    BookStatusCounter.apply_deltas(deltas)
+    # The container's own counts (and those below it) are deleted with it
+    apply_book_count_deltas(shelf_deltas, levels=CONTAINER_ANCESTORS[sender])
+
+
+@receiver(pre_save)
+def container_moving(sender, instance, raw=False, **kwargs):
+    """Remember the stored parents and counts of a shelf or bookshelf about to be saved."""
+    if sender not in CONTAINER_PARENTS or raw or instance._state.adding:
+        return
+    lookups = [lookup for _, lookup in CONTAINER_PARENTS[sender]]
+    instance._book_count_origin = (
+        sender.objects.filter(pk=instance.pk).values_list(*lookups, *BOOK_COUNT_FIELDS).first()
+    )
+
+
+@receiver(post_save)
+def container_moved(sender, instance, created=False, raw=False, **kwargs):
+    """Move a shelf's or bookshelf's book counts from its old parents to its new ones.
+    
+    Moving it to another library also moves its books between that
+    library's status counters.
+    """
+    origin = instance.__dict__.pop('_book_count_origin', None)
+    if sender not in CONTAINER_PARENTS or raw or created or origin is None:
+        return
+    parents = CONTAINER_PARENTS[sender]
+    old_ids = origin[:len(parents)]
+    counts = dict(zip(BOOK_COUNT_FIELDS, origin[len(parents):]))
+    if old_ids[0] == getattr(instance, parents[0][1]) or not counts['book_count']:
+        return
+    new_ids = sender.objects.filter(pk=instance.pk).values_list(*[lookup for _, lookup in parents]).first()
+    with transaction.atomic():
+        for (model, _), old_id, new_id in zip(parents, old_ids, new_ids):
+            if old_id == new_id:
+                continue
+            model.objects.filter(id=old_id).update(**{field: F(field) - count for field, count in counts.items()})
+            model.objects.filter(id=new_id).update(**{field: F(field) + count for field, count in counts.items()})
+            mark_changed(model)
+            if model is Library:
+                deltas = {}
+                for status in COUNTED_STATUSES:
+                    deltas[(old_id, status)] = -counts[f'{status}_book_count']
+                    deltas[(new_id, status)] = counts[f'{status}_book_count']
+                BookStatusCounter.apply_deltas(deltas)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelves', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookshelf',
+            index=models.Index(fields=['library', 'order', 'id'], name='bookshelf_listing_order_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+# Matches api.reorder.ORDER_GAP when this migration was written
+ORDER_GAP = 1024
+
+
+def space_order_keys(apps, schema_editor):
+    """Space each library's bookshelf order keys ORDER_GAP apart, keeping their order."""
+    Bookshelf = apps.get_model('bookshelves', 'Bookshelf')
+    rows = list(Bookshelf.objects.order_by('library_id', 'order', 'id').only('id', 'library_id', 'order'))
+    position, parent = 0, None
+    for row in rows:
+        position = position + 1 if row.library_id == parent else 1
+        parent = row.library_id
+        row.order = position * ORDER_GAP
+    Bookshelf.objects.bulk_update(rows, ['order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelves', '0003_book_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookshelf',
+            name='order',
+            field=models.PositiveIntegerField(default=0, help_text='Sort key for display; siblings are spaced apart so a move rewrites one row'),
+        ),
+        migrations.RunPython(space_order_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelves', '0004_gapped_order'),
+        # Runs after the counts, including this column, were first populated
+        ('books', '0005_populate_book_counts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='bookshelf',
+            name='storage_book_count',
+        ),
+    ]
@@ -1,9 +1,9 @@
 """Models for bookshelves app."""
 from django.db import models
-from apps.libraries.models import Library
+from apps.libraries.models import BookCounts, Library
 
 
-class Bookshelf(models.Model):
+class Bookshelf(BookCounts):
     """Model for bookshelf."""
     
     library = models.ForeignKey(Library, on_delete=models.CASCADE, related_name='bookshelves')
@@ -11,12 +11,15 @@ class Bookshelf(models.Model):
     short_description = models.CharField(max_length=255, blank=True, help_text="Brief description shown on cards")
     long_description = models.TextField(blank=True, help_text="Detailed description shown in detail view")
     location = models.CharField(max_length=255, blank=True)
-    order = models.PositiveIntegerField(default=0, help_text="Order for display")
+    order = models.PositiveIntegerField(default=0, help_text="Sort key for display; siblings are spaced apart so a move rewrites one row")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['library', 'order', 'created_at']
+        indexes = [
+            models.Index(fields=['library', 'order', 'id'], name='bookshelf_listing_order_idx'),
+        ]
         unique_together = ['library', 'name']
         verbose_name_plural = "Bookshelves"
     
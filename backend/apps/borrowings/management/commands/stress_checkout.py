@@ -0,0 +1,165 @@
+"""Borrow and return a few books from many threads and check no copy is lent twice."""
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from api.circulation import checkin_book, checkout_book
+from apps.books.models import Book
+from apps.bookshelves.models import Bookshelf
+from apps.borrowings.models import Borrowing
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+from apps.users.models import User
+
+STRESS_PREFIX = 'Stress checkout'
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkouts and returns of a small pool of books from many threads, "
+        "verify that no book was ever lent to two users at once and report throughput. "
+        "Creates its own library, books and users and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--books', type=int, default=8, help="Pool size; fewer books means more contention")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run")
+        parser.add_argument('--hold-ms', type=float, default=0.0, help="Time a borrower keeps a book before returning it")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated rows for inspection")
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['books'] < 1:
+            raise CommandError("--threads and --books must be at least 1")
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING("SQLite serialises writers; run against PostgreSQL for real contention"))
+
+        library, book_ids, users = self.create_fixture(options)
+        try:
+            report = self.run(book_ids, users, options)
+            problems = report['violations'] + self.verify(library, book_ids, report['borrowed'])
+        finally:
+            if not options['keep']:
+                library.delete()
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        outcomes = report['outcomes']
+        elapsed = report['elapsed']
+        latencies = sorted(report['latencies'])
+        self.stdout.write(
+            f"{options['threads']} threads, {options['books']} books, {elapsed:.1f} s: "
+            f"{report['borrowed']} borrowed and returned, {outcomes['already borrowed']} refused as already borrowed, "
+            f"{outcomes['retry']} gave up after retries, {outcomes['error']} errors"
+        )
+        if latencies:
+            self.stdout.write(
+                f"{len(latencies) / elapsed:.0f} checkout attempts/s, {report['borrowed'] / elapsed:.0f} loans/s, "
+                f"checkout latency median {statistics.median(latencies) * 1000:.2f} ms, "
+                f"max {latencies[-1] * 1000:.2f} ms"
+            )
+        for problem in problems[:20]:
+            self.stdout.write(self.style.ERROR(problem))
+        if problems:
+            raise CommandError(f"{len(problems)} consistency violations")
+        self.stdout.write(self.style.SUCCESS("No book was lent twice"))
+
+    def create_fixture(self, options):
+        stamp = time.strftime('%Y%m%d%H%M%S')
+        library = Library.objects.create(name=f"{STRESS_PREFIX} {stamp}")
+        shelf = Shelf.objects.create(bookshelf=Bookshelf.objects.create(library=library, name="Stress"))
+        book_ids = [
+            Book.objects.create(title=f"{STRESS_PREFIX} book {i + 1}", shelf=shelf).id
+            for i in range(options['books'])
+        ]
+        users = [
+            User.objects.create(full_name=f"{STRESS_PREFIX} user {i + 1} {stamp}")
+            for i in range(options['threads'])
+        ]
+        return library, book_ids, users
+
+    def run(self, book_ids, users, options):
+        lock = threading.Lock()
+        holders, violations = {}, []
+        outcomes, latencies = Counter(), []
+        borrowed = [0]
+        deadline = time.monotonic() + options['duration']
+        hold = options['hold_ms'] / 1000
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            user = users[index]
+            local_outcomes, local_latencies, local_borrowed = Counter(), [], 0
+            try:
+                while time.monotonic() < deadline:
+                    book_id = rng.choice(book_ids)
+                    started = time.perf_counter()
+                    try:
+                        _, error = checkout_book(book_id, user)
+                    except Exception as e:
+                        local_outcomes['error'] += 1
+                        with lock:
+                            violations.append(f"checkout of book {book_id} raised {e!r}")
+                        continue
+                    local_latencies.append(time.perf_counter() - started)
+                    if error:
+                        local_outcomes['retry' if error.status_code == 409 else 'already borrowed'] += 1
+                        continue
+                    # The holder is recorded after the checkout commits and cleared
+                    # before the return starts, so an overlap means a double lend
+                    with lock:
+                        if book_id in holders:
+                            violations.append(f"book {book_id} lent to user {user.id} while held by {holders[book_id]}")
+                        holders[book_id] = user.id
+                    if hold:
+                        time.sleep(hold)
+                    with lock:
+                        holders.pop(book_id, None)
+                    _, error = checkin_book(book_id)
+                    if error:
+                        with lock:
+                            violations.append(f"return of book {book_id} failed: {error.content.decode()}")
+                    local_borrowed += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    outcomes.update(local_outcomes)
+                    latencies.extend(local_latencies)
+                    borrowed[0] += local_borrowed
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'elapsed': time.monotonic() - started,
+            'outcomes': outcomes,
+            'latencies': latencies,
+            'borrowed': borrowed[0],
+            'violations': violations,
+        }
+
+    def verify(self, library, book_ids, borrowed):
+        """Cross-check the database against the loans the threads observed."""
+        problems = []
+        recorded = Borrowing.objects.filter(book_id__in=book_ids).count()
+        if recorded != borrowed:
+            problems.append(f"{recorded} borrowings recorded for {borrowed} successful checkouts")
+        open_loans = Borrowing.objects.filter(book_id__in=book_ids, return_date__isnull=True).count()
+        if open_loans:
+            problems.append(f"{open_loans} borrowings left open after every book was returned")
+        lent = Book.objects.filter(id__in=book_ids, status='borrowed').count()
+        if lent:
+            problems.append(f"{lent} books still marked as borrowed")
+        library.refresh_from_db()
+        shelved = Book.objects.filter(shelf__bookshelf__library=library).count()
+        if library.book_count != shelved or library.borrowed_book_count:
+            problems.append(f"library book counts drifted: {library.book_count} stored, {shelved} on its shelves")
+        return problems
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.8 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+def close_duplicate_active_borrowings(apps, schema_editor):
+    """Keep only the newest open borrowing per book so the unique constraint can be added."""
+    Borrowing = apps.get_model('borrowings', 'Borrowing')
+    duplicated = (
+        Borrowing.objects.filter(return_date__isnull=True)
+        .values('book_id')
+        .annotate(open_count=models.Count('id'))
+        .filter(open_count__gt=1)
+        .values_list('book_id', flat=True)
+    )
+    for book_id in duplicated:
+        open_borrowings = list(
+            Borrowing.objects.filter(book_id=book_id, return_date__isnull=True).order_by('-borrow_date', '-id')
+        )
+        newest = open_borrowings[0]
+        Borrowing.objects.filter(id__in=[b.id for b in open_borrowings[1:]]).update(
+            return_date=newest.borrow_date,
+            return_notes='Closed automatically: superseded by a newer borrowing',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['-borrow_date', 'id'], name='borrowing_listing_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['user', 'return_date'], name='borrowing_user_return_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['user', '-borrow_date', 'id'], name='borrowing_user_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['-borrow_date', 'id'], name='borrowing_active_listing_idx'),
+        ),
+        migrations.RunPython(close_duplicate_active_borrowings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('book',), name='unique_active_borrowing_per_book'),
+        ),
+    ]
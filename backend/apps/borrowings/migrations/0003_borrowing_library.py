@@ -0,0 +1,36 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:24
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_library(apps, schema_editor):
+    """Attribute past borrowings to the library of the book's current shelf.
+
+    The shelf a book was checked out from was never stored, so this is a
+    best effort: loans of books now in storage or on loan stay unattributed.
+    """
+    Book = apps.get_model('books', 'Book')
+    Borrowing = apps.get_model('borrowings', 'Borrowing')
+    Borrowing.objects.filter(book__shelf__isnull=False).update(library_id=Subquery(
+        Book.objects.filter(id=OuterRef('book_id')).values('shelf__bookshelf__library_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0004_gapped_order'),
+        ('books', '0005_populate_book_counts'),
+        ('borrowings', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowing',
+            name='library',
+            field=models.ForeignKey(blank=True, help_text='Library the book was checked out from (empty if it was taken from storage)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrowing_records', to='libraries.library'),
+        ),
+        migrations.RunPython(backfill_library, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,29 @@
 """Models for borrowings app."""
+from datetime import timezone as dt_timezone
+
 from django.db import models
 from django.utils import timezone
 from apps.books.models import Book
+from apps.libraries.models import Library
 from apps.users.models import User
 
 
+def analytics_bucket(borrow_date):
+    """Return the UTC month ('YYYY-MM') a borrowing is aggregated under in analytics."""
+    return borrow_date.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def bucket_label(bucket):
+    """Version label of one analytics bucket, bumped when a borrowing in it changes."""
+    return f"borrowings.borrowing@{bucket}"
+
+
 class Borrowing(models.Model):
     """Model for book borrowing record."""
     
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrowing_records')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrowing_records', null=True, blank=True)
+    library = models.ForeignKey(Library, on_delete=models.SET_NULL, related_name='borrowing_records', null=True, blank=True, help_text="Library the book was checked out from (empty if it was taken from storage)")
     borrow_date = models.DateTimeField(default=timezone.now)
     return_date = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(blank=True, help_text="Notes about the borrowing")
@@ -19,6 +33,25 @@ class Borrowing(models.Model):
     
     class Meta:
         ordering = ['-borrow_date']
+        indexes = [
+            models.Index(fields=['-borrow_date', 'id'], name='borrowing_listing_order_idx'),
+            models.Index(fields=['user', 'return_date'], name='borrowing_user_return_idx'),
+            models.Index(fields=['user', '-borrow_date', 'id'], name='borrowing_user_listing_idx'),
+            # Active loans, newest first
+            models.Index(
+                fields=['-borrow_date', 'id'],
+                condition=models.Q(return_date__isnull=True),
+                name='borrowing_active_listing_idx',
+            ),
+        ]
+        constraints = [
+            # At most one open borrowing per book; also serves active-borrowing lookups by book
+            models.UniqueConstraint(
+                fields=['book'],
+                condition=models.Q(return_date__isnull=True),
+                name='unique_active_borrowing_per_book',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.full_name} - {self.book.title} ({self.borrow_date.date()})"
@@ -0,0 +1,161 @@
+"""Models for changes app."""
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Newest change events kept for Last-Event-ID resume
+CHANGE_EVENT_RETENTION = 1000
+
+# PostgreSQL advisory lock serializing change event inserts (any constant unused elsewhere)
+CHANGE_EVENT_LOCK_ID = 0x6c6d6576
+
+
+class TableVersion(models.Model):
+    """Version stamp for one model's table, bumped after every committed write to it."""
+    
+    label = models.CharField(max_length=100, unique=True, help_text="Model label, e.g. 'books.book'")
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.label} v{self.version}"
+    
+    @classmethod
+    def bump(cls, labels):
+        """Increment the version of each label, creating missing rows."""
+        labels = set(labels)
+        now = timezone.now()
+        updated = cls.objects.filter(label__in=labels).update(version=F('version') + 1, updated_at=now)
+        if updated < len(labels):
+            existing = set(cls.objects.filter(label__in=labels).values_list('label', flat=True))
+            cls.objects.bulk_create(
+                [cls(label=label, version=1, updated_at=now) for label in labels - existing],
+                ignore_conflicts=True,
+            )
+    
+    @classmethod
+    def stamps(cls, labels):
+        """Return {label: (version, updated_at)} for the given labels in one query."""
+        return {
+            label: (version, updated_at)
+            for label, version, updated_at in cls.objects.filter(label__in=labels).values_list('label', 'version', 'updated_at')
+        }
+    
+class _PendingBump:
+    """on_commit callback bumping every table marked during one transaction."""
+    
+    def __init__(self):
+        self.labels = set()
+    
+    def __call__(self):
+        TableVersion.bump(self.labels)
+
+
+def mark_changed(*models_changed):
+    """Schedule a version bump for the given models once the current transaction commits.
+    
+    Marks made during one transaction share a single bump, so cascades and
+    bulk writes cost one UPDATE. The bump runs after commit to keep the
+    version rows out of the writers' locks.
+    """
+    mark_labels_changed(*(model._meta.label_lower for model in models_changed))
+
+
+def mark_labels_changed(*labels):
+    """mark_changed() for arbitrary version labels, e.g. one slice of a table."""
+    labels = set(labels)
+    pending = getattr(connection, '_pending_table_bump', None)
+    if (
+        connection.in_atomic_block
+        and pending is not None
+        and any(callback is pending for _, callback, _ in connection.run_on_commit)
+    ):
+        pending.labels.update(labels)
+        return
+    pending = _PendingBump()
+    pending.labels.update(labels)
+    connection._pending_table_bump = pending
+    transaction.on_commit(pending)
+
+
+class ChangeEvent(models.Model):
+    """One committed write to a book, borrowing or shelf, pushed to /events/ subscribers.
+
+    The table is a ring buffer: only the newest CHANGE_EVENT_RETENTION rows are kept.
+    Ids are handed out in commit order (see _PendingEvents), so once a reader
+    sees an event every earlier one is visible too and readers can resume
+    with id > last seen id.
+    """
+    
+    OP_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=50, help_text="Model name, e.g. 'book'")
+    entity_id = models.BigIntegerField()
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    status = models.CharField(max_length=20, blank=True, help_text="New status of the entity, if it has one")
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"#{self.id} {self.entity} {self.entity_id} {self.op}"
+    
+    def as_dict(self):
+        return {"entity": self.entity, "id": self.entity_id, "op": self.op, "status": self.status}
+
+
+class _PendingEvents:
+    """on_commit callback inserting every event emitted during one transaction.
+    
+    On PostgreSQL concurrent inserts could commit out of id order (11 before
+    10), and a reader polling id > 10 after seeing 11 would never see 10.
+    The insert therefore takes a transaction-level advisory lock before
+    drawing ids, so the previous insert has committed by the time the next
+    one gets a larger id. SQLite serializes writers by itself.
+    """
+    
+    def __init__(self):
+        self.events = []
+    
+    def __call__(self):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CHANGE_EVENT_LOCK_ID])
+            created = ChangeEvent.objects.bulk_create(self.events)
+            if created and created[-1].id:
+                ChangeEvent.objects.filter(id__lte=created[-1].id - CHANGE_EVENT_RETENTION).delete()
+
+
+def emit_events(model, op, ids, status=''):
+    """Schedule change events for rows of `model` once the current transaction commits.
+    
+    Events emitted during one transaction are inserted with a single
+    bulk_create after commit, so rolled back writes never reach subscribers.
+    Does nothing unless settings.CHANGE_EVENTS_ENABLED.
+    """
+    if not settings.CHANGE_EVENTS_ENABLED:
+        return
+    entity = model._meta.model_name
+    events = [ChangeEvent(entity=entity, entity_id=entity_id, op=op, status=status or '') for entity_id in ids]
+    if not events:
+        return
+    pending = getattr(connection, '_pending_change_events', None)
+    if (
+        connection.in_atomic_block
+        and pending is not None
+        and any(callback is pending for _, callback, _ in connection.run_on_commit)
+    ):
+        pending.events.extend(events)
+        return
+    pending = _PendingEvents()
+    pending.events.extend(events)
+    connection._pending_change_events = pending
+    transaction.on_commit(pending)
@@ -0,0 +1,55 @@
+"""Signal handlers bumping table versions and emitting change events on model writes."""
+from django.db.models.signals import post_delete, post_save
+
+from apps.bookshelves.models import Bookshelf
+from apps.books.models import Book
+from apps.borrowings.models import Borrowing, analytics_bucket, bucket_label
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+from apps.users.models import Department, User
+from .models import emit_events, mark_changed, mark_labels_changed
+
+TRACKED_MODELS = (Library, Bookshelf, Shelf, Book, Borrowing, User, Department)
+
+# Models whose writes are pushed to /events/ subscribers
+EVENT_MODELS = (Shelf, Book, Borrowing)
+
+
+def table_changed(sender, **kwargs):
+    mark_changed(sender)
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(table_changed, sender=model, dispatch_uid=f'table_version_save_{model._meta.label_lower}')
+    post_delete.connect(table_changed, sender=model, dispatch_uid=f'table_version_delete_{model._meta.label_lower}')
+
+
+def borrowing_bucket_changed(sender, instance, **kwargs):
+    """Invalidate the cached analytics of the borrowing's month."""
+    mark_labels_changed(bucket_label(analytics_bucket(instance.borrow_date)))
+
+
+post_save.connect(borrowing_bucket_changed, sender=Borrowing, dispatch_uid='analytics_bucket_save')
+post_delete.connect(borrowing_bucket_changed, sender=Borrowing, dispatch_uid='analytics_bucket_delete')
+
+
+def event_status(instance):
+    """Return the status reported in change events for a book or borrowing."""
+    if isinstance(instance, Book):
+        return instance.status
+    if isinstance(instance, Borrowing):
+        return 'returned' if instance.return_date else 'active'
+    return ''
+
+
+def row_saved(sender, instance, created, **kwargs):
+    emit_events(sender, 'created' if created else 'updated', [instance.pk], event_status(instance))
+
+
+def row_deleted(sender, instance, **kwargs):
+    emit_events(sender, 'deleted', [instance.pk], event_status(instance))
+
+
+for model in EVENT_MODELS:
+    post_save.connect(row_saved, sender=model, dispatch_uid=f'change_event_save_{model._meta.label_lower}')
+    post_delete.connect(row_deleted, sender=model, dispatch_uid=f'change_event_delete_{model._meta.label_lower}')
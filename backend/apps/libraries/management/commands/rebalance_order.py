@@ -0,0 +1,25 @@
+"""Re-space the order keys of every library, bookshelf and shelf list."""
+from django.core.management.base import BaseCommand
+
+from api.reorder import ORDER_GAP, rebalance_order
+from apps.bookshelves.models import Bookshelf
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+
+
+class Command(BaseCommand):
+    help = (
+        f"Re-space sibling order keys {ORDER_GAP} apart, keeping the current order. "
+        "Reorders do this themselves for a list whose gaps run out; run this off-peak "
+        "to restore room everywhere at once."
+    )
+
+    def handle(self, *args, **options):
+        rewritten = {Library: rebalance_order(Library), Bookshelf: 0, Shelf: 0}
+        for library_id in Library.objects.values_list('id', flat=True):
+            rewritten[Bookshelf] += rebalance_order(Bookshelf, 'library_id', library_id)
+        for bookshelf_id in Bookshelf.objects.values_list('id', flat=True):
+            rewritten[Shelf] += rebalance_order(Shelf, 'bookshelf_id', bookshelf_id)
+        for model, count in rewritten.items():
+            self.stdout.write(f"{model.__name__}: {count} rows rewritten")
+        self.stdout.write(self.style.SUCCESS("Order keys re-spaced"))
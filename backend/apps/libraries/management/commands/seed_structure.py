@@ -0,0 +1,229 @@
+"""Create or update the library / bookshelf / shelf structure from a layout file."""
+import json
+from collections import defaultdict, deque
+from functools import partial
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.reorder import ORDER_GAP
+from apps.bookshelves.models import Bookshelf
+from apps.changes.models import emit_events, mark_changed
+from apps.libraries.models import Library
+from apps.shelves.models import Shelf
+
+# Rows per INSERT / UPDATE statement
+SEED_BATCH_SIZE = 1000
+
+LIBRARY_FIELDS = ('address', 'phone', 'email', 'short_description', 'long_description', 'description')
+BOOKSHELF_FIELDS = ('location', 'short_description', 'long_description')
+SHELF_FIELDS = ('short_description', 'long_description', 'description')
+
+
+def load_layout(path):
+    """Read a YAML or JSON layout file."""
+    try:
+        text = Path(path).read_text()
+    except OSError as e:
+        raise CommandError(f"Cannot read {path}: {e}")
+    if Path(path).suffix.lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise CommandError("PyYAML is required for YAML layouts; use JSON or pip install PyYAML")
+        try:
+            return yaml.safe_load(text) or {}
+        except yaml.YAMLError as e:
+            raise CommandError(f"Invalid YAML in {path}: {e}")
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise CommandError(f"Invalid JSON in {path}: {e}")
+
+
+def _entries(value, where, expand):
+    """Return a list of entry dicts; an integer is expanded with expand(number)."""
+    if isinstance(value, bool) or not isinstance(value, (int, list)):
+        raise CommandError(f"{where}: expected a list or a count")
+    if isinstance(value, int):
+        return [expand(number) for number in range(1, value + 1)]
+    return value
+
+
+def _check(entry, where, fields, children=None, name_required=True):
+    if not isinstance(entry, dict):
+        raise CommandError(f"{where}: expected a mapping")
+    unknown = set(entry) - {'name', *fields, *([children] if children else [])}
+    if unknown:
+        raise CommandError(f"{where}: unknown keys {sorted(unknown)}")
+    if name_required and not entry.get('name'):
+        raise CommandError(f"{where}: name is required")
+    for field in fields:
+        if field in entry and not isinstance(entry[field], str):
+            raise CommandError(f"{where}.{field}: expected a string")
+
+
+def parse_layout(layout):
+    """Validate a layout and expand count shorthands into explicit entries.
+
+    A bookshelf count N creates "Bookshelf 1".."Bookshelf N", each with one
+    unnamed shelf; a shelf count N creates N unnamed shelves.
+    """
+    if not isinstance(layout, dict) or set(layout) - {'libraries'}:
+        raise CommandError("Layout must be a mapping with a 'libraries' list")
+    libraries = layout.get('libraries') or []
+    if not isinstance(libraries, list):
+        raise CommandError("libraries: expected a list")
+    names = set()
+    for i, library in enumerate(libraries):
+        where = f"libraries[{i}]"
+        _check(library, where, LIBRARY_FIELDS, 'bookshelves')
+        if library['name'] in names:
+            raise CommandError(f"{where}: duplicate library name '{library['name']}'")
+        names.add(library['name'])
+        library['bookshelves'] = _entries(
+            library.get('bookshelves', []), f"{where}.bookshelves",
+            lambda number: {'name': f"Bookshelf {number}", 'location': f"Section {number}", 'shelves': 1},
+        )
+        for j, bookshelf in enumerate(library['bookshelves']):
+            _check(bookshelf, f"{where}.bookshelves[{j}]", BOOKSHELF_FIELDS, 'shelves')
+            bookshelf['shelves'] = _entries(
+                bookshelf.get('shelves', []), f"{where}.bookshelves[{j}].shelves", lambda number: {},
+            )
+            for k, shelf in enumerate(bookshelf['shelves']):
+                _check(shelf, f"{where}.bookshelves[{j}].shelves[{k}]", SHELF_FIELDS, name_required=False)
+    return libraries
+
+
+def _name_key(name):
+    return name or ''
+
+
+class _Plan:
+    """Rows to create and update for one model."""
+
+    def __init__(self, model, now):
+        self.model = model
+        self.now = now
+        self.created = []
+        self.updated = {}
+        self.fields = {'updated_at'}
+
+    def set(self, obj, **values):
+        """Assign values to an existing row, recording it only if something changed."""
+        changed = [field for field, value in values.items() if getattr(obj, field) != value]
+        if changed:
+            for field in changed:
+                setattr(obj, field, values[field])
+            obj.updated_at = self.now
+            self.fields.update(changed)
+            self.updated[obj.pk] = obj
+
+    def apply(self):
+        self.model.objects.bulk_create(self.created, batch_size=SEED_BATCH_SIZE)
+        self.model.objects.bulk_update(
+            list(self.updated.values()), sorted(self.fields), batch_size=SEED_BATCH_SIZE
+        )
+
+    def summary(self):
+        return f"{self.model.__name__}: {len(self.created)} created, {len(self.updated)} updated"
+
+
+def _match(existing, entries, plan, fields, make):
+    """Pair layout entries with existing rows by name, in order, and renumber.
+
+    Listed rows take the layout positions, ORDER_GAP apart; rows missing from
+    the layout keep their relative order after them. Returns the (row, entry) pairs.
+    """
+    by_name = defaultdict(deque)
+    for row in existing:
+        by_name[_name_key(row.name)].append(row)
+    pairs, matched = [], set()
+    for position, entry in enumerate(entries):
+        values = {field: entry[field] for field in fields if field in entry}
+        queue = by_name.get(_name_key(entry.get('name')))
+        if queue:
+            row = queue.popleft()
+            matched.add(row.pk)
+            plan.set(row, order=(position + 1) * ORDER_GAP, **values)
+        else:
+            row = make(name=entry.get('name'), order=(position + 1) * ORDER_GAP, **values)
+            plan.created.append(row)
+        pairs.append((row, entry))
+    position = len(entries)
+    for row in existing:
+        if row.pk not in matched:
+            plan.set(row, order=(position + 1) * ORDER_GAP)
+            position += 1
+    return pairs
+
+
+def seed_structure(libraries):
+    """Apply parsed library entries and return the Library, Bookshelf and Shelf plans."""
+    now = timezone.now()
+    library_plan, bookshelf_plan, shelf_plan = _Plan(Library, now), _Plan(Bookshelf, now), _Plan(Shelf, now)
+
+    library_pairs = _match(
+        list(Library.objects.order_by('order', 'created_at', 'id')), libraries, library_plan, LIBRARY_FIELDS, Library,
+    )
+    library_plan.apply()
+
+    existing_bookshelves = defaultdict(list)
+    for bookshelf in Bookshelf.objects.filter(
+        library__in=[row.pk for row, _ in library_pairs]
+    ).order_by('library', 'order', 'created_at', 'id'):
+        existing_bookshelves[bookshelf.library_id].append(bookshelf)
+    bookshelf_pairs = []
+    for library, entry in library_pairs:
+        bookshelf_pairs += _match(
+            existing_bookshelves[library.pk], entry['bookshelves'], bookshelf_plan, BOOKSHELF_FIELDS,
+            partial(Bookshelf, library=library),
+        )
+    bookshelf_plan.apply()
+
+    existing_shelves = defaultdict(list)
+    for shelf in Shelf.objects.filter(
+        bookshelf__in=[row.pk for row, _ in bookshelf_pairs]
+    ).order_by('bookshelf', 'order', 'created_at', 'id'):
+        existing_shelves[shelf.bookshelf_id].append(shelf)
+    for bookshelf, entry in bookshelf_pairs:
+        _match(
+            existing_shelves[bookshelf.pk], entry['shelves'], shelf_plan, SHELF_FIELDS,
+            partial(Shelf, bookshelf=bookshelf),
+        )
+    shelf_plan.apply()
+
+    plans = (library_plan, bookshelf_plan, shelf_plan)
+    changed = [plan.model for plan in plans if plan.created or plan.updated]
+    if changed:
+        mark_changed(*changed)
+    emit_events(Shelf, 'created', [row.pk for row in shelf_plan.created])
+    emit_events(Shelf, 'updated', list(shelf_plan.updated))
+    return plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update libraries, bookshelves and shelves from a YAML or JSON layout "
+        "in one transaction. Rows are matched by name, so re-running is idempotent; "
+        "order follows the layout and unlisted rows are renumbered after listed ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('layout', help="Path to a .yaml/.yml or .json layout file")
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without saving them")
+
+    def handle(self, *args, **options):
+        libraries = parse_layout(load_layout(options['layout']))
+        with transaction.atomic():
+            plans = seed_structure(libraries)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        for plan in plans:
+            self.stdout.write(plan.summary())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run: nothing was saved"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Structure seeded"))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='library',
+            index=models.Index(fields=['order', 'created_at', 'id'], name='library_listing_order_idx'),
+        ),
+    ]
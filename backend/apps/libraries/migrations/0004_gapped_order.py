@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+# Matches api.reorder.ORDER_GAP when this migration was written
+ORDER_GAP = 1024
+
+
+def space_order_keys(apps, schema_editor):
+    """Space library order keys ORDER_GAP apart, keeping their order."""
+    Library = apps.get_model('libraries', 'Library')
+    rows = list(Library.objects.order_by('order', 'created_at', 'id').only('id', 'order'))
+    for position, row in enumerate(rows, 1):
+        row.order = position * ORDER_GAP
+    Library.objects.bulk_update(rows, ['order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0003_book_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='library',
+            name='order',
+            field=models.PositiveIntegerField(default=0, help_text='Sort key for display; siblings are spaced apart so a move rewrites one row'),
+        ),
+        migrations.RunPython(space_order_keys, migrations.RunPython.noop),
+    ]
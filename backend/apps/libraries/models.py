@@ -1,8 +1,39 @@
 """Models for libraries app."""
 from django.db import models
 
+# Statuses counted on containers: books on their shelves and books lent from them
+COUNTED_STATUSES = ('library', 'borrowed')
+BOOK_COUNT_FIELDS = ('book_count', *(f'{status}_book_count' for status in COUNTED_STATUSES))
 
-class Library(models.Model):
+
+class BookCounts(models.Model):
+    """Book counts of a library, bookshelf or shelf, by status.
+    
+    A book on loan stays counted on the shelf it was checked out from
+    (Book.borrowed_from_shelf); books in storage belong to no container.
+    Maintained with F() increments wherever a book's shelf or status changes
+    (see apps/books/models.py); rebuild with `manage.py reconcile_book_counters`.
+    Ordinary saves never write these columns, so they cannot overwrite a
+    concurrent increment with a stale value.
+    """
+    
+    book_count = models.IntegerField(default=0, editable=False)
+    library_book_count = models.IntegerField(default=0, editable=False)
+    borrowed_book_count = models.IntegerField(default=0, editable=False)
+    
+    class Meta:
+        abstract = True
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in BOOK_COUNT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class Library(BookCounts):
     """Model for library."""
     
     name = models.CharField(max_length=255, unique=True)
@@ -12,12 +43,15 @@ class Library(models.Model):
     address = models.CharField(max_length=255)
     phone = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
-    order = models.PositiveIntegerField(default=0, help_text="Order for display")
+    order = models.PositiveIntegerField(default=0, help_text="Sort key for display; siblings are spaced apart so a move rewrites one row")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['order', 'created_at']
+        indexes = [
+            models.Index(fields=['order', 'created_at', 'id'], name='library_listing_order_idx'),
+        ]
         verbose_name_plural = "Libraries"
     
     def __str__(self):
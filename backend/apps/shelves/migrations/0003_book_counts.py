@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-17 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelf',
+            name='book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shelf',
+            name='borrowed_book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shelf',
+            name='library_book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shelf',
+            name='storage_book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,9 +1,10 @@
 """Models for shelves app."""
 from django.db import models
 from apps.bookshelves.models import Bookshelf
+from apps.libraries.models import BookCounts
 
 
-class Shelf(models.Model):
+class Shelf(BookCounts):
     """Model for shelf."""
     
     bookshelf = models.ForeignKey(Bookshelf, on_delete=models.CASCADE, related_name='shelves')
@@ -11,12 +12,15 @@ class Shelf(models.Model):
     short_description = models.CharField(max_length=255, blank=True, help_text="Brief description shown on cards")
     long_description = models.TextField(blank=True, help_text="Detailed description shown in detail view")
     description = models.TextField(blank=True)
-    order = models.PositiveIntegerField(default=0, help_text="Order for display")
+    order = models.PositiveIntegerField(default=0, help_text="Sort key for display; siblings are spaced apart so a move rewrites one row")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['bookshelf', 'order', 'created_at']
+        indexes = [
+            models.Index(fields=['bookshelf', 'order', 'id'], name='shelf_listing_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.bookshelf.name} - {self.name}"
@@ -37,6 +37,9 @@ class User(models.Model):
     
     class Meta:
         ordering = ['full_name']
+        indexes = [
+            models.Index(fields=['full_name', 'id'], name='user_listing_order_idx'),
+        ]
     
     def __str__(self):
         return self.full_name
@@ -0,0 +1,23 @@
+"""
+PostgreSQL backend that checks connections out of a psycopg 3 pool.
+
+Select it with ENGINE 'library_monitor.db_pool' (DB_POOL=True, the default
+under SERVER_PROFILE=asgi).
+"""
+
+from django.db import connections
+
+
+def database_stats():
+    """Return connection settings and, for pooled aliases, pool usage of this worker process."""
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        wrapper = connections[alias]
+        stats[alias] = {
+            "engine": settings_dict['ENGINE'],
+            "conn_max_age": settings_dict['CONN_MAX_AGE'],
+            "conn_health_checks": settings_dict['CONN_HEALTH_CHECKS'],
+            "pool": wrapper.pool_stats() if hasattr(wrapper, 'pool_stats') else None,
+        }
+    return stats
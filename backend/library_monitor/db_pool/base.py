@@ -0,0 +1,94 @@
+"""
+PostgreSQL DatabaseWrapper backed by psycopg_pool.ConnectionPool.
+
+Django opens a connection at the start of a request and "closes" it at the
+end (CONN_MAX_AGE must be 0); here that checks a connection out of and
+back into a per-process pool, so requests skip the TCP and auth handshake
+and the number of server connections is capped at max_size per worker.
+Pool options come from OPTIONS['pool']: min_size, max_size and timeout
+(seconds to wait for a free connection before failing the request).
+"""
+
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+try:
+    from psycopg import IsolationLevel
+    from psycopg_pool import ConnectionPool
+except ImportError as e:
+    raise ImproperlyConfigured(
+        "DB_POOL requires psycopg 3 and psycopg_pool: pip install 'psycopg[binary,pool]'"
+    ) from e
+
+# One pool per database alias, shared by every thread of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+POOL_DEFAULTS = {
+    'min_size': 2,
+    'max_size': 10,
+    'timeout': 10,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, alias=None):
+        super().__init__(settings_dict, alias)
+        if settings_dict.get('CONN_MAX_AGE'):
+            raise ImproperlyConfigured(
+                "Pooled connections require CONN_MAX_AGE = 0; the pool keeps them open."
+            )
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @property
+    def pool(self):
+        pool = _pools.get(self.alias)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(self.alias)
+                if pool is None:
+                    options = {**POOL_DEFAULTS, **self.settings_dict['OPTIONS'].get('pool', {})}
+                    pool = ConnectionPool(
+                        kwargs=self.get_connection_params(),
+                        min_size=options['min_size'],
+                        max_size=options['max_size'],
+                        timeout=options['timeout'],
+                        name=self.alias,
+                        # Test each connection on checkout when health checks are on
+                        check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                        open=True,
+                    )
+                    _pools[self.alias] = pool
+        return pool
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is None:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            try:
+                self.isolation_level = IsolationLevel(isolation_level)
+            except ValueError:
+                raise ImproperlyConfigured(
+                    f"Invalid transaction isolation level {isolation_level} specified."
+                )
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # The pool rolls back any open transaction before reuse
+                self.pool.putconn(self.connection)
+
+    def pool_stats(self):
+        """Return pool usage counters (size, available, waiting requests, timeouts, ...)."""
+        pool = _pools.get(self.alias)
+        return pool.get_stats() if pool is not None else {}
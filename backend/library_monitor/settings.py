@@ -32,9 +32,11 @@ INSTALLED_APPS = [
     'apps.books',
     'apps.borrowings',
     'apps.users',
+    'apps.changes',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -43,6 +45,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.conditional.VersionStampMiddleware',
+    'api.cache.ResponseCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'library_monitor.urls'
@@ -66,17 +70,66 @@ TEMPLATES = [
 WSGI_APPLICATION = 'library_monitor.wsgi.application'
 
 # Database
+# Connection lifecycle. Under SERVER_PROFILE=wsgi connections persist for
+# DB_CONN_MAX_AGE seconds and are health-checked before reuse. Persistent
+# connections are per thread, which under ASGI means per request, so
+# SERVER_PROFILE=asgi checks connections out of a psycopg 3 pool instead
+# (DB_POOL, see library_monitor/db_pool), which also caps them under burst
+# load. DB_POOL=False there falls back to one connection per request.
+SERVER_PROFILE = config('SERVER_PROFILE', default='wsgi')
+DB_POOL = config('DB_POOL', default=SERVER_PROFILE == 'asgi', cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'library_monitor.db_pool' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': config('DB_NAME', default='library_monitor'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config(
+            'DB_CONN_MAX_AGE', default=0 if SERVER_PROFILE == 'asgi' else 60, cast=int
+        ),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            **({'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            }} if DB_POOL else {}),
+        },
     }
 }
 
+# Cache
+# LocMemCache is per process; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) for multi-worker setups.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='library-monitor'),
+    }
+}
+
+# Response cache for read endpoints (see api/cache.py)
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Per-month borrowing aggregates (see api/analytics.py); entries are keyed by
+# version, so this only bounds how long unused months stay in the cache
+ANALYTICS_CACHE_TIMEOUT = config('ANALYTICS_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Request metrics (see api/metrics.py). Each worker writes its own file in
+# METRICS_DIR and /api/metrics sums them; empty keeps per-process memory only.
+METRICS_DIR = config('METRICS_DIR', default='')
+
+# Change events for the /events/ stream (see apps/changes). Every write then
+# inserts an event row after commit, so leave this off until a client consumes
+# the stream; it needs SERVER_PROFILE=asgi to be served.
+CHANGE_EVENTS_ENABLED = config('CHANGE_EVENTS_ENABLED', default=False, cast=bool)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,168 @@
+"""
+Load test for the read endpoints: requests/sec and latency percentiles
+at a fixed number of concurrent keep-alive connections.
+
+Start the servers to compare, e.g.
+
+    SERVER_PROFILE=wsgi GUNICORN_BIND=0.0.0.0:8001 gunicorn -c gunicorn.conf.py
+    SERVER_PROFILE=asgi GUNICORN_BIND=0.0.0.0:8002 gunicorn -c gunicorn.conf.py
+
+then run
+
+    python loadtest.py --target wsgi=http://localhost:8001 --target asgi=http://localhost:8002
+
+Uses only the standard library so it can run from any machine with Python.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    '/api/libraries/',
+    '/api/bookshelves/',
+    '/api/shelves/',
+    '/api/books/stats/',
+    '/api/books/?limit=50',
+    '/api/books/by-status/?limit=20',
+    '/api/users/',
+    '/api/tree/',
+]
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response; return (status, keep_alive)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status not in (204, 304):
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _client(host, port, paths, deadline, latencies, errors):
+    """Issue requests back to back over one keep-alive connection until the deadline."""
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            path = random.choice(paths)
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n"
+            started = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            elapsed = time.perf_counter() - started
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            else:
+                latencies.append(elapsed)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_target(url, paths, connections, duration, warmup):
+    """Load one server and return its summary."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    if warmup:
+        await asyncio.gather(*[
+            _client(host, port, paths, time.monotonic() + warmup, [], {})
+            for _ in range(min(connections, 50))
+        ])
+    latencies, errors = [], {}
+    started = time.monotonic()
+    await asyncio.gather(*[
+        _client(host, port, paths, started + duration, latencies, errors)
+        for _ in range(connections)
+    ])
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "url": url,
+        "connections": connections,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(_percentile(latencies, 0.50)),
+        "p90_ms": ms(_percentile(latencies, 0.90)),
+        "p99_ms": ms(_percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def _print_table(results):
+    columns = ['requests_per_s', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'requests']
+    print(f"{'target':<12}" + ''.join(f"{column:>16}" for column in columns) + f"{'errors':>10}")
+    for name, result in results.items():
+        errors = sum(result['errors'].values())
+        print(f"{name:<12}" + ''.join(f"{str(result[column]):>16}" for column in columns) + f"{errors:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help="Server to load, e.g. asgi=http://localhost:8002 (repeatable)")
+    parser.add_argument('--path', action='append', dest='paths', metavar='PATH',
+                        help="Endpoint to request (repeatable, defaults to the main read endpoints)")
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of measured load per target")
+    parser.add_argument('--warmup', type=float, default=3, help="Seconds of unmeasured load per target")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.target:
+        name, _, url = target.partition('=')
+        if not url:
+            name, url = urlsplit(target).netloc, target
+        results[name] = asyncio.run(run_target(
+            url.rstrip('/'), args.paths or DEFAULT_PATHS, args.connections, args.duration, args.warmup
+        ))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == '__main__':
+    main()
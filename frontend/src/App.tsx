@@ -3,6 +3,7 @@ import React, { useState, useEffect } from 'react'
 import { DndContext, closestCenter, KeyboardSensor, PointerSensor, useSensor, useSensors } from '@dnd-kit/core'
 import { arrayMove, SortableContext, sortableKeyboardCoordinates, rectSortingStrategy } from '@dnd-kit/sortable'
 import type { Library, Bookshelf, Shelf, Book, User } from '@/types'
+import { shelfNumber } from '@/utils/shelves'
 import DashboardClickable from '@/components/DashboardClickable'
 import { useBorrowings } from '@/hooks'
 import { LanguageProvider, useLanguage } from '@/contexts/LanguageContext'
@@ -1534,7 +1535,7 @@ function AppContent() {
                                               }}
                                               className="w-full flex items-center gap-2 px-2 py-1 text-xs text-gray-600 hover:bg-gray-100 rounded transition text-left"
                                             >
-                                              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /><span>{shelf.name || `#${shelf.order}`}</span>
+                                              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /><span>{shelf.name || `#${shelfNumber(shelf, bookshelfShelves)}`}</span>
                                             </button>
                                           ))}
                                         </div>
@@ -1612,6 +1613,7 @@ function AppContent() {
                             <DraggableShelfCard
                               key={shelf.id}
                               shelf={shelf}
+                              position={shelfNumber(shelf, shelves)}
                               books={shelfBooks}
                               onShelfClick={() => {
                                 setShelfDetailPopup(shelf)
@@ -1836,7 +1838,7 @@ function AppContent() {
                 <div className="flex justify-between items-start mb-4">
                   <div className="flex-1">
                     <h2 className="text-2xl font-bold text-gray-900 flex items-center gap-2">
-                      <img src="/shelf.png" alt="Shelf" className="w-6 h-6" /> #{shelfDetailPopup.order}{shelfDetailPopup.name ? `: ${shelfDetailPopup.name}` : ''}
+                      <img src="/shelf.png" alt="Shelf" className="w-6 h-6" /> #{shelfNumber(shelfDetailPopup, allShelves)}{shelfDetailPopup.name ? `: ${shelfDetailPopup.name}` : ''}
                     </h2>
                     {shelfDetailPopup.short_description && (
                       <p className="text-sm text-gray-600 mt-2">{shelfDetailPopup.short_description}</p>
@@ -2294,7 +2296,7 @@ function AppContent() {
                                               }}
                                               className="w-full flex items-center gap-2 px-2 py-1 text-xs text-gray-600 hover:bg-gray-100 rounded transition text-left"
                                             >
-                                              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /><span>{shelf.name || `#${shelf.order}`}</span>
+                                              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /><span>{shelf.name || `#${shelfNumber(shelf, bookshelfShelves)}`}</span>
                                             </button>
                                           ))}
                                         </div>
@@ -3413,7 +3415,7 @@ function AppContent() {
                         {allShelves
                           .filter((s) => s.bookshelf_id === parseInt(selectedBookshelfForBook))
                           .map((s) => (
-                            <option key={s.id} value={s.id}>#{s.order}{s.name ? `: ${s.name}` : ''}</option>
+                            <option key={s.id} value={s.id}>#{shelfNumber(s, allShelves)}{s.name ? `: ${s.name}` : ''}</option>
                           ))}
                       </select>
                     </div>
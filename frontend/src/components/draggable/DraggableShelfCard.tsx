@@ -5,6 +5,7 @@ import type { Shelf, Book } from '@/types'
 
 interface DraggableShelfCardProps {
   shelf: Shelf
+  position: number
   books: Book[]
   onShelfClick: (shelf: Shelf) => void
   onAddBook: (shelf: Shelf) => void
@@ -14,6 +15,7 @@ interface DraggableShelfCardProps {
 
 export const DraggableShelfCard: React.FC<DraggableShelfCardProps> = ({
   shelf,
+  position,
   books,
   onShelfClick,
   onAddBook,
@@ -57,7 +59,7 @@ export const DraggableShelfCard: React.FC<DraggableShelfCardProps> = ({
             className="w-full text-left border-t-4 border-amber-800 relative hover:bg-amber-50 transition-colors p-2 rounded-t"
           >
             <div className="absolute -top-3 left-0 bg-gray-100 px-2 py-1 text-sm font-semibold text-gray-700 hover:bg-gray-200 flex items-center gap-1">
-              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /> #{shelf.order}
+              <img src="/shelf.png" alt="Shelf" className="w-4 h-4" /> #{position}
               {shelf.name ? `: ${shelf.name}` : ''} • 📚 Books: {books.length}
             </div>
           </button>
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import type { Book, Library, Bookshelf, Shelf } from '@/types'
 import { useLanguage } from '@/contexts/LanguageContext'
+import { shelfNumber } from '@/utils/shelves'
 
 interface MoveBookModalProps {
   book: Book | null
@@ -155,7 +156,7 @@ export const MoveBookModal: React.FC<MoveBookModalProps> = ({
                 <option value="">{t('chooseAShelf')}</option>
                 {filteredShelves.map((shelf) => (
                   <option key={shelf.id} value={shelf.id}>
-                    #{shelf.order}{shelf.name ? `: ${shelf.name}` : ''}
+                    #{shelfNumber(shelf, filteredShelves)}{shelf.name ? `: ${shelf.name}` : ''}
                   </option>
                 ))}
               </select>
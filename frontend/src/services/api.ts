@@ -11,6 +11,7 @@ import type {
   Customer, CustomerRequest,
   Borrowing, BorrowingRequest,
   ReorderItem,
+  BatchRequest, BatchResponse,
 } from '../types'
 
 const API_BASE_URL = '/api'
@@ -49,6 +50,7 @@ export const bookshelfService = {
 export const shelfService = {
   getAll: (bookshelfId?: number) => api.get<Shelf[]>('/shelves/', { params: { bookshelf_id: bookshelfId } }),
   getById: (id: number) => api.get<Shelf>(`/shelves/${id}/`),
+  getByIds: (ids: number[]) => api.get<Shelf[]>('/shelves/', { params: { ids: ids.join(',') } }),
   create: (data: Partial<ShelfRequest>) => api.post<Shelf>('/shelves/', data),
   update: (id: number, data: Partial<ShelfRequest>) => api.put<Shelf>(`/shelves/${id}/`, data),
   delete: (id: number) => api.delete(`/shelves/${id}/`),
@@ -61,6 +63,7 @@ export const bookService = {
   getAll: (shelfId?: number, isAvailable?: boolean) =>
     api.get<Book[]>('/books/', { params: { shelf_id: shelfId, is_available: isAvailable } }),
   getById: (id: number) => api.get<Book>(`/books/${id}/`),
+  getByIds: (ids: number[]) => api.get<Book[]>('/books/', { params: { ids: ids.join(',') } }),
   create: (data: Partial<BookRequest>) => api.post<Book>('/books/', data),
   update: (id: number, data: Partial<BookRequest>) => api.put<Book>(`/books/${id}/`, data),
   delete: (id: number) => api.delete(`/books/${id}/`),
@@ -82,6 +85,7 @@ export const borrowingService = {
   getAll: (userId?: number, isReturned?: boolean) =>
     api.get<Borrowing[]>('/borrowings/', { params: { user_id: userId, is_returned: isReturned } }),
   getById: (id: number) => api.get<Borrowing>(`/borrowings/${id}/`),
+  getByIds: (ids: number[]) => api.get<Borrowing[]>('/borrowings/', { params: { ids: ids.join(',') } }),
   create: (data: Partial<BorrowingRequest>) => api.post<Borrowing>('/borrowings/', data),
   update: (id: number, data: Partial<BorrowingRequest>) => api.put<Borrowing>(`/borrowings/${id}/`, data),
   delete: (id: number) => api.delete(`/borrowings/${id}/`),
@@ -97,4 +101,14 @@ export const borrowingService = {
   },
 }
 
+// ============= BATCH SERVICES =============
+
+export const batchService = {
+  // Paths are relative to the API root, like the other services
+  run: (requests: BatchRequest[]) =>
+    api.post<{ responses: BatchResponse[] }>('/batch/', {
+      requests: requests.map((request) => ({ ...request, path: `${API_BASE_URL}${request.path}` })),
+    }),
+}
+
 export default api
@@ -149,3 +149,15 @@ export interface ReorderItem {
   id: number
   order: number
 }
+
+export interface BatchRequest {
+  path: string
+  method?: 'GET'
+  headers?: Record<string, string>
+}
+
+export interface BatchResponse<T = unknown> {
+  status: number
+  body: T
+  etag?: string
+}
@@ -0,0 +1,16 @@
+/**
+ * Shelf display helpers
+ */
+
+import type { Shelf } from '@/types'
+
+/**
+ * 1-based position of a shelf within its bookshelf. Shelf.order is a sparse
+ * sort key (spaced apart by the backend), so it is not shown directly.
+ */
+export const shelfNumber = (shelf: Shelf, shelves: Shelf[]): number =>
+  shelves.filter(
+    (s) =>
+      s.bookshelf_id === shelf.bookshelf_id &&
+      (s.order < shelf.order || (s.order === shelf.order && s.id < shelf.id))
+  ).length + 1
@@ -4,6 +4,7 @@ import { arrayMove, SortableContext, sortableKeyboardCoordinates, rectSortingStr
 import { DraggableLibraryCard } from '@/components/draggable'
 import { useLanguage } from '@/contexts/LanguageContext'
 import type { Library, Bookshelf, Shelf, Book } from '@/types'
+import { shelfNumber } from '@/utils/shelves'
 
 interface DetailPopup {
   type: 'library' | 'bookshelf' | 'shelf' | 'book'
@@ -185,7 +186,7 @@ export function LibrariesView({
                                             className="w-full flex items-center gap-2 px-2 py-1 text-xs text-gray-600 hover:bg-gray-100 rounded transition text-left"
                                           >
                                             <img src="/shelf.png" alt="Shelf" className="w-4 h-4" />
-                                            <span>{shelf.name || `#${shelf.order}`}</span>
+                                            <span>{shelf.name || `#${shelfNumber(shelf, bookshelfShelves)}`}</span>
                                           </button>
                                         ))}
                                       </div>
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { Book, Library, Bookshelf, Shelf, User, Borrowing } from '@/types'
 import { useLanguage } from '@/contexts/LanguageContext'
+import { shelfNumber } from '@/utils/shelves'
 
 /**
  * Format a date string (YYYY-MM-DD) as dd/mm/yyyy
@@ -563,7 +564,7 @@ export function ManageBooksView({
                             }}
                             className={`block w-full text-left px-4 py-2 text-sm transition ${selectedShelf === shelf.id ? 'bg-blue-50 text-blue-700 font-medium' : 'hover:bg-gray-50'}`}
                           >
-                            #{shelf.order} {shelf.name ? `: ${shelf.name}` : ''}
+                            #{shelfNumber(shelf, allShelves)} {shelf.name ? `: ${shelf.name}` : ''}
                           </button>
                         ))}
                       </div>
@@ -910,7 +911,10 @@ export function ManageBooksView({
                   )}
                   {selectedShelf && (
                     <div className="flex items-center gap-2 bg-blue-50 text-blue-700 px-3 py-1 rounded-full text-xs">
-                      <span>🗂️ #{allShelves.find(s => s.id === selectedShelf)?.order} {allShelves.find(s => s.id === selectedShelf)?.name}</span>
+                      {(() => {
+                        const shelf = allShelves.find(s => s.id === selectedShelf)
+                        return <span>🗂️ #{shelf ? shelfNumber(shelf, allShelves) : ''} {shelf?.name}</span>
+                      })()}
                       <button
                         onClick={() => setSelectedShelf(null)}
                         className="hover:text-blue-900 font-bold"
@@ -1159,7 +1163,7 @@ export function ManageBooksView({
                                                 className="block w-full text-left px-2 py-1 hover:bg-amber-50 rounded text-amber-600 font-medium transition-colors flex items-center gap-2"
                                               >
                                                 <img src="/shelf.png" alt="Shelf" className="w-4 h-4" />
-                                                #{shelf.order}
+                                                #{shelfNumber(shelf, allShelves)}
                                               </button>
                                             )}
                                           </div>